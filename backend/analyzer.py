@@ -11,8 +11,9 @@ def analisar(logs):
     if not logs:
         return {"erro": "sem dados"}
 
-    temps = [float(l["temperatura"]) for l in logs]
-    umis = [float(l["umidade"]) for l in logs]
+    # As linhas já chegam tipadas (converter_registro / process_initial_data)
+    temps = [l["temperatura"] for l in logs]
+    umis = [l["umidade"] for l in logs]
     tstats = _stats(temps)
     ustats = _stats(umis)
 
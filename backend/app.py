@@ -1,7 +1,10 @@
+import atexit
 import os
+import signal
+import sys
 import threading
 import time
-from flask import Flask, jsonify, send_file, request, send_from_directory
+from flask import Flask, Response, g, jsonify, send_file, request, send_from_directory
 from flask_cors import CORS
 import analyzer
 import requests
@@ -9,9 +12,23 @@ import json
 import base64
 import uuid
 from datetime import datetime, timedelta
-import random
 import concurrent.futures
+import functools
 from concurrent.futures import ThreadPoolExecutor
+from conversation_store import ConversationStore, PersistenciaSQLite
+import shared_state
+from saude import CircuitBreaker, MonitorSaude, FECHADO
+from metricas import Registro, TIPO_CONTEUDO
+from rastreamento import rastreador, propagar
+import diagnostico
+from http_cache import CacheRespostas
+from serializacao import (CacheSerializacao, resposta_json, resposta_binaria,
+                          colunas_de_linhas, partes_binarias)
+from graus_dia import AcumuladorGrausDia, epoch_registro, MAX_INTERVALO_S
+from relatorios import FilaRelatorios, PENDENTE, EXECUTANDO, CONCLUIDO
+from parametros import get_estufa_parameters
+from colheita import (RegistroPlantios, MotorPredicao, CULTURAS, TALHAO_PADRAO,
+                      calcular_estagio_maturidade, gerar_recomendacoes_colheita)
 
 executor = ThreadPoolExecutor(max_workers=2)
 
@@ -20,7 +37,7 @@ executor = ThreadPoolExecutor(max_workers=2)
 # =========================
 
 # Configurações do servidor externo (onde estão os dados da estufa)
-EXTERNAL_SERVER_URL = "http://192.168.68.111:5000"
+EXTERNAL_SERVER_URL = os.getenv("EXTERNAL_SERVER_URL", "http://192.168.68.111:5000")
 USERNAME = "admin"
 PASSWORD = "12345"
 
@@ -31,104 +48,112 @@ AUTH_HEADER = {"Authorization": f"Basic {credentials}"}
 # URL do Ollama
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://ollama:11434/api/chat")
 
+# Modo multi-worker (gunicorn -c gunicorn.conf.py app:app): um único worker
+# busca os dados no servidor externo e os demais leem o snapshot compartilhado
+MULTIWORKER = os.getenv("ESTUFA_MULTIWORKER", "0") == "1"
+ESTADO_DIR = os.getenv("ESTADO_DIR", "/tmp/estufa")
+INGESTAO_INTERVALO = float(os.getenv("INGESTAO_INTERVALO", 5))
+INGESTAO_LIMITE = int(os.getenv("INGESTAO_LIMITE", 100))
+# Quantos registros pedir ao servidor externo para reconstruir os graus-dia
+GRAUS_DIA_BACKFILL_LIMITE = int(os.getenv("GRAUS_DIA_BACKFILL_LIMITE", 1000000))
+# Último snapshot gravado em disco (periodicamente e ao desligar) para o warm start
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", os.path.join(ESTADO_DIR, "ultimo_snapshot.json"))
+SNAPSHOT_SALVAR_INTERVALO = float(os.getenv("SNAPSHOT_SALVAR_INTERVALO", 30))
+
+# Disjuntores das dependências externas: com a dependência fora do ar, as
+# chamadas falham na hora em vez de segurar a thread até o timeout
+disjuntor_pi = CircuitBreaker(
+    "servidor_externo",
+    limite_falhas=int(os.getenv("DISJUNTOR_LIMITE_FALHAS", 3)),
+    abertura_inicial=float(os.getenv("DISJUNTOR_ABERTURA_INICIAL", 2)),
+    abertura_max=float(os.getenv("DISJUNTOR_ABERTURA_MAX", 120))
+)
+disjuntor_ollama = CircuitBreaker(
+    "ollama",
+    limite_falhas=int(os.getenv("DISJUNTOR_LIMITE_FALHAS", 3)),
+    abertura_inicial=float(os.getenv("DISJUNTOR_ABERTURA_INICIAL", 2)),
+    abertura_max=float(os.getenv("DISJUNTOR_ABERTURA_MAX", 120))
+)
+monitor_saude = MonitorSaude(intervalo=float(os.getenv("SAUDE_INTERVALO", 15)))
+
+# =========================
+# MÉTRICAS (/metrics)
+# =========================
+
+metricas = Registro()
+metrica_requisicoes = metricas.histograma(
+    "estufa_http_requisicao_segundos", "Latência das rotas HTTP", ("metodo", "rota", "status"))
+metrica_upstream = metricas.histograma(
+    "estufa_upstream_segundos", "Duração das chamadas ao servidor externo", ("endpoint",))
+metrica_upstream_erros = metricas.contador(
+    "estufa_upstream_erros_total", "Chamadas ao servidor externo sem sucesso", ("endpoint", "motivo"))
+metrica_ollama_ttft = metricas.histograma(
+    "estufa_ollama_primeiro_token_segundos", "Tempo até o primeiro token do Ollama")
+metrica_ollama = metricas.histograma(
+    "estufa_ollama_segundos", "Duração total das chamadas ao Ollama", ("resultado",))
+
 # =========================
 # ESTADO EM MEMÓRIA
 # =========================
 
-# Dicionário para armazenar históricos de conversa
-conversation_histories = {}
+# Armazém de conversas (limite de memória, LRU + TTL, persistência opcional)
+# CONVERSAS_DB=/app/data/conversas.db ativa a persistência em SQLite
+CONVERSAS_DB = os.getenv("CONVERSAS_DB")
+if MULTIWORKER and not CONVERSAS_DB:
+    # Sem banco comum, cada worker teria suas próprias sessões
+    CONVERSAS_DB = os.path.join(ESTADO_DIR, "conversas.db")
+conversation_store = ConversationStore(
+    ttl=int(os.getenv("CONVERSAS_TTL", 3600)),
+    max_sessoes=int(os.getenv("CONVERSAS_MAX_SESSOES", 1000)),
+    max_mensagens=20,
+    max_bytes=int(os.getenv("CONVERSAS_MAX_BYTES", 8 * 1024 * 1024)),
+    persistencia=PersistenciaSQLite(CONVERSAS_DB) if CONVERSAS_DB else None,
+    cache_local=not MULTIWORKER
+)
 
 # Cache de dados numéricos
+# 'brutos' guarda os últimos registros do servidor externo como vieram;
+# 'versao' muda a cada ingestão e 'ingerido_em' marca quando ela ocorreu;
+# 'restaurado' indica dados vindos do disco, ainda não revalidados
 data_cache = {
     'last_update': 0,
     'dados': [],
     'series': {'time': [], 'temperatura': [], 'umidade': []},
-    'analise': {}
+    'analise': {},
+    'brutos': [],
+    'versao': 0,
+    'ingerido_em': 0,
+    'restaurado': False
 }
 
 # Flag do sistema
 system_ready = False
 
+# Posse da ingestão (modo multi-worker)
+snapshot_compartilhado = None
+lock_lideranca = None
+eh_dono_ingestao = False
+ultima_sincronizacao = 0
+
 # =========================
 # PARÂMETROS AGRONÔMICOS (TOMATE CEREJA)
 # =========================
 
-def get_estufa_parameters():
-    """Parâmetros ideais e limiares para controle da estufa (tomate cereja)."""
-    return {
-        "temperatura": {
-            "ideal_min": 18,
-            "ideal_max": 25,
-            "limiar_inferior": 15,
-            "limiar_superior": 28,
-            "acao_inferior": "Ligar aquecedor",
-            "acao_superior": "Ativar ventilação/exaustor"
-        },
-        "umidade": {
-            "ideal_min": 60,
-            "ideal_max": 80,
-            "limiar_inferior": 50,
-            "limiar_superior": 85,
-            "acao_inferior": "Ligar umidificador",
-            "acao_superior": "Ventilação forçada"
-        },
-        "co2": {
-            "ideal_min": 800,
-            "ideal_max": 1200,
-            "limiar_inferior": 800,
-            "limiar_superior": 1200,
-            "acao_inferior": "Injetar CO₂ (se disponível)",
-            "acao_superior": "Ventilar"
-        },
-        "luminosidade": {
-            "ideal_min": 200,
-            "ideal_max": 400,
-            "limiar_inferior": 200,
-            "limiar_superior": 600,
-            "acao_inferior": "Ligar LEDs",
-            "acao_superior": "Sombrear plantas"
-        },
-        "umidade_solo": {
-            "ideal_min": 20,
-            "ideal_max": 30,
-            "limiar_inferior": 20,
-            "limiar_superior": 35,
-            "acao_inferior": "Acionar irrigação",
-            "acao_superior": "Parar irrigação"
-        },
-        "ph_solo": {
-            "ideal_min": 5.5,
-            "ideal_max": 6.5,
-            "limiar_inferior": 5.5,
-            "limiar_superior": 6.8,
-            "acao_inferior": "Aplicar calcário",
-            "acao_superior": "Adicionar enxofre"
-        },
-        "ec_solo": {
-            "ideal_min": 1.5,
-            "ideal_max": 3.5,
-            "limiar_inferior": 1.5,
-            "limiar_superior": 3.5,
-            "acao_inferior": "Adubar",
-            "acao_superior": "Lavar solo com água"
-        }
-    }
+# get_estufa_parameters() fica em parametros.py (usado também pela sintonia offline)
 
 # =========================
 # SISTEMA PREDITIVO DE COLHEITA
 # =========================
 
-def calcular_maturidade_planta(dados_estufa, dias_plantio=0):
+def calcular_maturidade_planta(dados_estufa, dias_plantio=0, ciclo_base=90):
     """
     Calcula a maturidade da planta baseado nas condições ambientais.
     Retorna dias restantes estimados para colheita.
+    `ciclo_base` é o ciclo da cultura em condições ideais (90 dias no tomate cereja).
     """
     if not dados_estufa or not dados_estufa.get("mediaTemperatura"):
         return None
     
-    # Parâmetros base para tomate cereja
-    ciclo_base = 90  # dias para colheita em condições ideais
-    
     # Calcular índice de qualidade atual
     avaliacao, indice_qualidade = avaliar_variaveis_ambiente(dados_estufa)
     
@@ -202,77 +227,58 @@ def calcular_maturidade_planta(dados_estufa, dias_plantio=0):
         'ciclo_total_estimado': int(ciclo_ajustado),
         'indice_qualidade': indice_qualidade,
         'fatores_ajuste': fatores_ajuste,
+        'fator_total': fator_total,
         'estagio_maturidade': calcular_estagio_maturidade(dias_plantio, ciclo_ajustado),
         'recomendacoes': gerar_recomendacoes_colheita(fatores_ajuste, dias_restantes)
     }
 
-def calcular_estagio_maturidade(dias_plantio, ciclo_total):
-    """Calcula o estágio de maturidade da planta."""
-    if dias_plantio == 0:
-        return "Plantio recente"
-    
-    percentual = (dias_plantio / ciclo_total) * 100
-    
-    if percentual < 25:
-        return "Estágio inicial - Crescimento vegetativo"
-    elif percentual < 50:
-        return "Estágio intermediário - Desenvolvimento"
-    elif percentual < 75:
-        return "Estágio avançado - Floração e frutificação"
-    elif percentual < 90:
-        return "Maturação - Frutos em desenvolvimento"
-    else:
-        return "Pronto para colheita"
-
-def gerar_recomendacoes_colheita(fatores_ajuste, dias_restantes):
-    """Gera recomendações baseadas nos fatores de ajuste."""
-    recomendacoes = []
-    
-    if fatores_ajuste['temperatura'] > 1.1:
-        recomendacoes.append("Ajustar temperatura para acelerar crescimento")
-    elif fatores_ajuste['temperatura'] < 0.95:
-        recomendacoes.append("Temperatura ideal mantida")
-    
-    if fatores_ajuste['umidade'] > 1.1:
-        recomendacoes.append("Otimizar umidade para melhor desenvolvimento")
-    elif fatores_ajuste['umidade'] < 0.95:
-        recomendacoes.append("Umidade em nível excelente")
-    
-    if fatores_ajuste['luminosidade'] > 1.1:
-        recomendacoes.append("Ajustar iluminação para otimizar fotossíntese")
-    elif fatores_ajuste['luminosidade'] < 0.95:
-        recomendacoes.append("Luminosidade adequada")
-    
-    if dias_restantes <= 7:
-        recomendacoes.append("Preparar para colheita iminente")
-    elif dias_restantes <= 14:
-        recomendacoes.append("Monitorar frutos diariamente")
-    
-    return recomendacoes
+# Registro de plantios (talhão, cultura, data de plantio) e motor de predição
+registro_plantios = RegistroPlantios(os.getenv("PLANTIOS_PATH", os.path.join(ESTADO_DIR, "plantios.json")))
+# Graus-dia e integral de luz acumulados ao longo de todo o histórico
+acumulador_graus_dia = AcumuladorGrausDia(os.path.join(ESTADO_DIR, "graus_dia.json"))
+motor_predicao = MotorPredicao(registro_plantios, calcular_maturidade_planta, acumulador_graus_dia)
 
-def gerar_analise_preditiva_colheita(dados_estufa):
+@rastreador.rastrear()
+def gerar_analise_preditiva_colheita(dados_estufa, talhao=TALHAO_PADRAO):
     """
     Gera análise preditiva completa para colheita.
+    Os dias desde o plantio vêm do registro de plantios do talhão.
     """
     if not dados_estufa:
         return "Não tenho dados suficientes para análise preditiva."
     
-    # Simular dias de plantio (em produção real, isso viria de um banco de dados)
-    dias_plantio = random.randint(30, 60)
+    if registro_plantios.vazio():
+        return ("Nenhum plantio cadastrado. Cadastre o talhão, a cultura e a data de plantio "
+                "(POST /plantios) para ver a previsão de colheita.")
+    if registro_plantios.obter(talhao) is None:
+        return f"Talhão '{talhao}' não cadastrado no registro de plantios."
     
-    predicao = calcular_maturidade_planta(dados_estufa, dias_plantio)
+    predicao = motor_predicao.prever(dados_estufa, talhao)
     
     if not predicao:
         return "Erro ao calcular predição de colheita."
     
+    dias_plantio = predicao['dias_plantio']
+    
     analise = []
     analise.append("🌱 **ANÁLISE PREDITIVA DE COLHEITA**")
     analise.append("")
+    analise.append(f"🪴 **Talhão:** {talhao} ({CULTURAS[predicao['cultura']]['nome']})")
     analise.append(f"📅 **Dias desde o plantio:** {dias_plantio} dias")
     analise.append(f"🎯 **Estágio atual:** {predicao['estagio_maturidade']}")
     analise.append(f"⏱️ **Dias restantes estimados:** {predicao['dias_restantes']} dias")
     analise.append(f"📊 **Ciclo total previsto:** {predicao['ciclo_total_estimado']} dias")
     analise.append(f"⭐ **Índice de qualidade:** {predicao['indice_qualidade']*10:.1f}/10")
+    
+    termico = predicao.get('termico')
+    if termico:
+        analise.append(f"🔥 **Graus-dia desde o plantio:** {termico['graus_dia']:.0f} de "
+                       f"{termico['graus_dia_colheita']} ({termico['progresso_termico']*100:.0f}%)")
+        analise.append(f"🔆 **Luz média diária:** {termico['dli_medio']:.1f} mol/m²")
+        if termico['dias_restantes_termico'] is not None:
+            analise.append(f"🌡️ **Estimativa térmica:** {termico['dias_restantes_termico']} dias no ritmo atual")
+        if not termico['cobre_ciclo_inteiro']:
+            analise.append(f"ℹ️ Histórico de sensores disponível apenas desde {termico['historico_desde']}")
     analise.append("")
     
     # Fatores de influência
@@ -318,6 +324,7 @@ def gerar_analise_preditiva_colheita(dados_estufa):
 # INTEGRAÇÃO OLLAMA
 # =========================
 
+@rastreador.rastrear()
 def chamar_ollama(mensagem_usuario, dados_estufa=None, historico_conversa=None):
     """
     Integração real com Ollama para gerar respostas inteligentes.
@@ -326,13 +333,17 @@ def chamar_ollama(mensagem_usuario, dados_estufa=None, historico_conversa=None):
         # Preparar o contexto com dados da estufa
         contexto_estufa = ""
         if dados_estufa and dados_estufa.get("mediaTemperatura"):
+            def v(chave):
+                # Grandeza sem leitura (ex.: umidade do solo) não pode derrubar a chamada
+                valor = dados_estufa.get(chave)
+                return f"{valor:.1f}" if isinstance(valor, (int, float)) else "N/A"
             contexto_estufa = f"""
 Dados atuais da estufa:
-- Temperatura: {dados_estufa.get('mediaTemperatura', 'N/A'):.1f}°C (min: {dados_estufa.get('minTemperatura', 'N/A'):.1f}°C, max: {dados_estufa.get('maxTemperatura', 'N/A'):.1f}°C)
-- Umidade: {dados_estufa.get('mediaUmidade', 'N/A'):.1f}% (min: {dados_estufa.get('minUmidade', 'N/A'):.1f}%, max: {dados_estufa.get('maxUmidade', 'N/A'):.1f}%)
-- Luminosidade: {dados_estufa.get('mediaLuminosidade', 'N/A'):.1f} lux
-- Umidade do solo: {dados_estufa.get('mediaUmidadeSolo', 'N/A'):.1f}%
-- Nível de água: {dados_estufa.get('mediaNivelAgua', 'N/A'):.1f}%
+- Temperatura: {v('mediaTemperatura')}°C (min: {v('minTemperatura')}°C, max: {v('maxTemperatura')}°C)
+- Umidade: {v('mediaUmidade')}% (min: {v('minUmidade')}%, max: {v('maxUmidade')}%)
+- Luminosidade: {v('mediaLuminosidade')} lux
+- Umidade do solo: {v('mediaUmidadeSolo')}%
+- Nível de água: {v('mediaNivelAgua')}%
 """
         
         # Preparar histórico de conversa
@@ -363,7 +374,8 @@ Seja útil, técnico mas acessível, e sempre baseie suas respostas nos dados di
                     "content": mensagem_completa
                 }
             ],
-            "stream": False,
+            # Em streaming para medir o tempo até o primeiro token
+            "stream": True,
             "options": {
                 "temperature": 0.7,
                 "top_p": 0.9,
@@ -371,18 +383,47 @@ Seja útil, técnico mas acessível, e sempre baseie suas respostas nos dados di
             }
         }
         
-        response = requests.post(
-            OLLAMA_URL,
-            json=payload,
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            resultado = response.json()
-            return resultado['message']['content'].strip()
-        else:
-            print(f"Erro Ollama: {response.status_code} - {response.text}")
+        if not disjuntor_ollama.permitir():
+            # Ollama fora do ar: o chamador cai direto nas regras locais
+            metrica_ollama.observar(0, resultado="recusado")
             return None
+
+        inicio = time.perf_counter()
+        try:
+            with requests.post(OLLAMA_URL, json=payload, timeout=30, stream=True) as response:
+                if response.status_code != 200:
+                    registrar_resposta(disjuntor_ollama, response.status_code)
+                    metrica_ollama.observar(time.perf_counter() - inicio, resultado="http")
+                    print(f"Erro Ollama: {response.status_code} - {response.text}")
+                    return None
+                partes = []
+                for linha in response.iter_lines():
+                    if not linha:
+                        continue
+                    pedaco = json.loads(linha)
+                    conteudo = pedaco.get('message', {}).get('content', '')
+                    if conteudo and not partes:
+                        ttft = time.perf_counter() - inicio
+                        metrica_ollama_ttft.observar(ttft)
+                        rastreador.atual().atributo(primeiro_token_ms=round(ttft * 1000, 1))
+                    if conteudo:
+                        partes.append(conteudo)
+                    if pedaco.get('done'):
+                        break
+        except requests.RequestException as e:
+            disjuntor_ollama.falha(e)
+            metrica_ollama.observar(time.perf_counter() - inicio, resultado="excecao")
+            raise
+        except (ValueError, AttributeError) as e:
+            # Linha NDJSON quebrada ou fora do formato: também é falha do Ollama,
+            # senão o teste do disjuntor meio aberto fica esperando o timeout_teste
+            disjuntor_ollama.falha(e)
+            metrica_ollama.observar(time.perf_counter() - inicio, resultado="invalido")
+            raise
+
+        disjuntor_ollama.sucesso()
+        metrica_ollama.observar(time.perf_counter() - inicio, resultado="ok")
+        return "".join(partes).strip()
             
     except Exception as e:
         print(f"Exceção ao chamar Ollama: {e}")
@@ -391,27 +432,107 @@ Seja útil, técnico mas acessível, e sempre baseie suas respostas nos dados di
 # =========================
 # FUNÇÕES DE INICIALIZAÇÃO
 # =========================
-def fetch_external_data(endpoint="/registros", params=None):
+def registrar_resposta(disjuntor, status_code):
+    """Erros 5xx contam como falha da dependência; 4xx mostram que ela está de pé."""
+    if status_code >= 500:
+        disjuntor.falha(f"HTTP {status_code}")
+    else:
+        disjuntor.sucesso()
+
+@rastreador.rastrear()
+def fetch_external_data(endpoint="/registros", params=None, timeout=10):
     """Busca dados no servidor externo com autenticação."""
+    if not disjuntor_pi.permitir():
+        metrica_upstream_erros.inc(endpoint=endpoint, motivo="recusado")
+        return None
+    inicio = time.perf_counter()
     try:
         url = f"{EXTERNAL_SERVER_URL}{endpoint}"
         response = requests.get(
             url,
             headers=AUTH_HEADER,
             params=params,
-            timeout=10
+            timeout=timeout
         )
+        registrar_resposta(disjuntor_pi, response.status_code)
         if response.status_code == 200:
             return response.json()
         else:
+            metrica_upstream_erros.inc(endpoint=endpoint, motivo="http")
             print(f"DEBUG: Erro HTTP ao buscar {endpoint}: {response.status_code}")
             return None
+    except requests.RequestException as e:
+        disjuntor_pi.falha(e)
+        metrica_upstream_erros.inc(endpoint=endpoint, motivo="excecao")
+        print(f"DEBUG: Exceção ao buscar dados em {endpoint}: {e}")
+        return None
     except Exception as e:
+        metrica_upstream_erros.inc(endpoint=endpoint, motivo="excecao")
         print(f"DEBUG: Exceção ao buscar dados em {endpoint}: {e}")
         return None
+    finally:
+        metrica_upstream.observar(time.perf_counter() - inicio, endpoint=endpoint)
+
+def sondar_servidor_externo():
+    """Sonda barata do servidor externo (estado atual, sem histórico)."""
+    response = requests.get(f"{EXTERNAL_SERVER_URL}/estado", headers=AUTH_HEADER, timeout=3)
+    return response.status_code < 500
+
+def sondar_ollama():
+    response = requests.get(OLLAMA_URL.replace('/api/chat', '/api/tags'), timeout=3)
+    return response.status_code == 200
+
+monitor_saude.registrar("servidor_externo", disjuntor_pi, sondar_servidor_externo)
+monitor_saude.registrar("ollama", disjuntor_ollama, sondar_ollama)
 
 app = Flask(__name__)
-CORS(app, origins=["*"], methods=["GET", "POST"], allow_headers=["Content-Type"])
+# max_age: o preflight do If-None-Match fica em cache no navegador
+CORS(app, origins=["*"], methods=["GET", "POST", "DELETE"], allow_headers=["Content-Type", "If-None-Match", "X-Rastrear"],
+     expose_headers=["ETag", "X-Dados-Desatualizados", "X-Idade-Dados", "X-Trace-Id"], max_age=600)
+
+@app.before_request
+def antes_da_requisicao():
+    g.inicio_requisicao = time.perf_counter()
+    rota = request.url_rule.rule if request.url_rule else "sem_rota"
+    raiz = rastreador.iniciar(f"{request.method} {rota}",
+                              forcar=request.headers.get("X-Rastrear") == "1",
+                              url=request.full_path.rstrip("?"))
+    if raiz is not None:
+        g.span_raiz = raiz.__enter__()
+    if MULTIWORKER:
+        sincronizar_cache()
+
+@app.after_request
+def medir_latencia(response):
+    inicio = g.pop('inicio_requisicao', None)
+    if inicio is not None:
+        # Padrão da rota (não a URL) para não criar uma série por parâmetro
+        rota = request.url_rule.rule if request.url_rule else "sem_rota"
+        metrica_requisicoes.observar(time.perf_counter() - inicio, metodo=request.method,
+                                     rota=rota, status=response.status_code)
+    return response
+
+@app.after_request
+def marcar_idade_dados(response):
+    # O frontend usa estes cabeçalhos para avisar quando mostra dados antigos
+    if data_cache['ingerido_em']:
+        response.headers['X-Dados-Desatualizados'] = '1' if dados_desatualizados() else '0'
+        response.headers['X-Idade-Dados'] = str(int(time.time() - data_cache['ingerido_em']))
+    return response
+
+@app.after_request
+def marcar_trace(response):
+    raiz = g.get('span_raiz')
+    if raiz is not None:
+        raiz.atributo(status=response.status_code)
+        response.headers['X-Trace-Id'] = raiz.trace.id
+    return response
+
+@app.teardown_request
+def encerrar_trace(erro=None):
+    raiz = g.pop('span_raiz', None)
+    if raiz is not None:
+        raiz.__exit__(type(erro) if erro else None, erro, None)
 
 def process_initial_data(data):
     """Processa dados iniciais e popula o cache."""
@@ -437,6 +558,7 @@ def process_initial_data(data):
             continue
 
     data_cache['dados'] = processed_data
+    data_cache['brutos'] = data[-INGESTAO_LIMITE:]
 
     if data:
         data_sorted = sorted(data, key=lambda x: x.get("timestamp", ""), reverse=True)
@@ -479,22 +601,21 @@ def process_initial_data(data):
 
     data_cache['last_update'] = time.time()
 
-def initialize_system():
+def initialize_system(max_retries=30):
     """Inicializa o sistema carregando dados reais do servidor externo."""
     global system_ready
 
     print(" Inicializando sistema...")
     print(" Aguardando dados reais do servidor externo...")
 
-    max_retries = 30
-
     for attempt in range(max_retries):
         try:
             print(f"Tentativa {attempt + 1}/{max_retries} - buscando dados iniciais...")
-            initial_data = fetch_external_data("/registros", {"limit": 20})
+            initial_data = fetch_external_data("/registros", {"limit": INGESTAO_LIMITE})
 
             if initial_data:
                 process_initial_data(initial_data)
+                data_cache['restaurado'] = False
                 system_ready = True
                 print(" Sistema inicializado com sucesso!")
                 print(f" Carregados {len(initial_data)} registros reais (não precisa ser exatamente 20)")
@@ -508,9 +629,251 @@ def initialize_system():
         if attempt < max_retries - 1:
             time.sleep(3)
 
-    if not system_ready:
+    if data_cache['restaurado']:
+        print("Servindo snapshot restaurado do disco enquanto o servidor externo não responde.")
+    elif not system_ready:
         print("Sistema NÃO inicializado completamente, mas seguirá tentando em tempo real.")
 
+# =========================
+# INGESTÃO E ESTADO COMPARTILHADO
+# =========================
+
+def payload_snapshot():
+    return {
+        'system_ready': system_ready,
+        'ingerido_em': data_cache['ingerido_em'],
+        'dados': data_cache['dados'],
+        'series': data_cache['series'],
+        'analise': data_cache['analise'],
+        'brutos': data_cache['brutos'],
+    }
+
+def publicar_snapshot():
+    """Grava o cache atual no snapshot compartilhado (apenas o dono da ingestão)."""
+    if snapshot_compartilhado is None:
+        return
+    try:
+        # A versão do banco é a mesma que os outros workers vão ler (e base dos ETags)
+        data_cache['versao'] = snapshot_compartilhado.publicar(payload_snapshot())
+    except Exception as e:
+        print(f"DEBUG: Erro ao publicar snapshot compartilhado: {e}")
+
+def salvar_snapshot_disco():
+    """Grava o último snapshot em disco (apenas o dono da ingestão e só com dados revalidados)."""
+    if not eh_dono_ingestao or not data_cache['ingerido_em'] or data_cache['restaurado']:
+        return
+    try:
+        shared_state.salvar_json_atomico(SNAPSHOT_PATH, dict(payload_snapshot(), salvo_em=time.time()))
+    except Exception as e:
+        print(f"DEBUG: Erro ao salvar snapshot em disco: {e}")
+
+def restaurar_snapshot_disco():
+    """
+    Warm start: carrega o último snapshot salvo para servir imediatamente,
+    marcado como desatualizado até a primeira ingestão bem-sucedida.
+    """
+    global system_ready
+    if data_cache['ingerido_em']:
+        return False
+    payload = shared_state.carregar_json(SNAPSHOT_PATH)
+    if not payload or not payload.get('system_ready'):
+        return False
+    data_cache.update({
+        'dados': payload['dados'],
+        'series': payload['series'],
+        'analise': payload['analise'],
+        'brutos': payload['brutos'],
+        'ingerido_em': payload['ingerido_em'],
+        'last_update': payload.get('salvo_em', payload['ingerido_em']),
+        'restaurado': True
+    })
+    system_ready = True
+    print(f" Snapshot restaurado de {SNAPSHOT_PATH} (dados de {time.time() - payload['ingerido_em']:.0f}s atrás)")
+    return True
+
+def dados_desatualizados():
+    """Dados restaurados do disco ou sem ingestão bem-sucedida há mais de 3 intervalos."""
+    return data_cache['restaurado'] or time.time() - data_cache['ingerido_em'] > 3 * INGESTAO_INTERVALO
+
+def encerrar():
+    """Grava o estado em disco ao desligar o processo."""
+    salvar_snapshot_disco()
+    if eh_dono_ingestao:
+        acumulador_graus_dia.salvar()
+
+atexit.register(encerrar)
+
+def sincronizar_cache():
+    """Atualiza o cache local a partir do snapshot publicado pelo dono da ingestão."""
+    global system_ready, ultima_sincronizacao
+    if snapshot_compartilhado is None or eh_dono_ingestao:
+        return
+    now = time.time()
+    if now - ultima_sincronizacao < 0.5:
+        return
+    ultima_sincronizacao = now
+    try:
+        novo = snapshot_compartilhado.ler_se_mais_novo(data_cache['versao'])
+    except Exception as e:
+        print(f"DEBUG: Erro ao ler snapshot compartilhado: {e}")
+        return
+    if not novo:
+        return
+    versao, atualizado_em, payload = novo
+    acumulador_graus_dia.recarregar_se_mudou()
+    data_cache.update({
+        'dados': payload['dados'],
+        'series': payload['series'],
+        'analise': payload['analise'],
+        'brutos': payload['brutos'],
+        'ingerido_em': payload['ingerido_em'],
+        'last_update': atualizado_em,
+        'versao': versao,
+        'restaurado': False
+    })
+    system_ready = payload['system_ready']
+
+def ingerir_uma_vez():
+    """Busca os registros mais recentes e atualiza o cache; retorna True se houve dados."""
+    global system_ready
+    data = fetch_external_data("/registros", {"limit": INGESTAO_LIMITE})
+    if not data:
+        return False
+    process_initial_data(data)
+    acumulador_graus_dia.adicionar_registros(data)
+    data_cache['ingerido_em'] = time.time()
+    data_cache['restaurado'] = False
+    data_cache['versao'] += 1
+    system_ready = True
+    publicar_snapshot()
+    return True
+
+def reconstruir_graus_dia():
+    """Reconstrói o acumulador de graus-dia a partir de todo o histórico do servidor externo."""
+    historico = fetch_external_data("/registros", {"limit": GRAUS_DIA_BACKFILL_LIMITE})
+    if not historico:
+        print("DEBUG: Histórico indisponível para reconstruir graus-dia")
+        return
+    inicio = time.time()
+    n = acumulador_graus_dia.reconstruir(historico)
+    acumulador_graus_dia.salvar()
+    print(f" Graus-dia reconstruídos a partir de {n} leituras em {time.time() - inicio:.2f}s")
+
+def loop_ingestao():
+    """Laço do dono da ingestão: inicializa e depois mantém o cache atualizado."""
+    # Com snapshot restaurado já há o que servir: uma tentativa só e o laço revalida
+    initialize_system(max_retries=1 if data_cache['restaurado'] else 30)
+    if system_ready and not data_cache['restaurado']:
+        data_cache['ingerido_em'] = time.time()
+        data_cache['versao'] += 1
+        publicar_snapshot()
+    # Sem estado salvo, ou com um buraco maior que o que a ingestão cobre: reconstrói
+    try:
+        ultimo = epoch_registro(data_cache['brutos'][-1]['timestamp']) if data_cache['brutos'] else None
+    except (KeyError, ValueError, TypeError):
+        ultimo = None
+    if (acumulador_graus_dia.ultimo_ts is None or
+            (ultimo is not None and ultimo - acumulador_graus_dia.ultimo_ts > MAX_INTERVALO_S)):
+        try:
+            reconstruir_graus_dia()
+        except Exception as e:
+            # Sem a reconstrução o acumulado segue incremental; a ingestão não pode parar
+            print(f"DEBUG: Erro ao reconstruir graus-dia: {e}")
+    ultimo_salvamento = ultimo_snapshot_disco = time.time()
+    salvar_snapshot_disco()
+    while True:
+        time.sleep(INGESTAO_INTERVALO)
+        try:
+            ingerir_uma_vez()
+            if time.time() - ultimo_salvamento > 60:
+                acumulador_graus_dia.salvar()
+                ultimo_salvamento = time.time()
+            if time.time() - ultimo_snapshot_disco > SNAPSHOT_SALVAR_INTERVALO:
+                salvar_snapshot_disco()
+                ultimo_snapshot_disco = time.time()
+        except Exception as e:
+            print(f"DEBUG: Erro no laço de ingestão: {e}")
+
+def tentar_lideranca():
+    """Workers não-donos tentam assumir a ingestão caso o dono atual morra."""
+    global lock_lideranca, eh_dono_ingestao
+    while not eh_dono_ingestao:
+        lock_lideranca = shared_state.adquirir_lideranca(os.path.join(ESTADO_DIR, "ingestao.lock"))
+        if lock_lideranca is not None:
+            eh_dono_ingestao = True
+            print(f" Worker {os.getpid()} assumiu a ingestão de dados")
+            loop_ingestao()
+            return
+        time.sleep(10)
+
+def iniciar_worker():
+    """
+    Inicia a ingestão do processo. Em modo simples o processo é sempre o dono;
+    em modo multi-worker apenas quem obtiver o lock busca dados no servidor externo.
+    """
+    global snapshot_compartilhado, eh_dono_ingestao
+    restaurar_snapshot_disco()
+    monitor_saude.iniciar()
+    if MULTIWORKER:
+        snapshot_compartilhado = shared_state.SnapshotCompartilhado(os.path.join(ESTADO_DIR, "estado.db"))
+        threading.Thread(target=tentar_lideranca, daemon=True).start()
+    else:
+        eh_dono_ingestao = True
+        threading.Thread(target=loop_ingestao, daemon=True).start()
+
+def registros_do_snapshot(limit):
+    """
+    True se o snapshot da ingestão cobre o limite pedido e deve ser usado:
+    recente, ou antigo (restaurado do disco / servidor externo fora), caso em
+    que é servido na hora enquanto a ingestão revalida em segundo plano.
+    """
+    brutos = data_cache['brutos']
+    if not brutos or limit > len(brutos):
+        return False
+    return (time.time() - data_cache['ingerido_em'] < 2 * INGESTAO_INTERVALO
+            or data_cache['restaurado'] or not disjuntor_pi.disponivel())
+
+@rastreador.rastrear()
+def buscar_registros(limit):
+    """
+    Registros brutos para as rotas: usa o snapshot da ingestão quando possível
+    (ver registros_do_snapshot); caso contrário, consulta o servidor externo.
+    """
+    brutos = data_cache['brutos']
+    if registros_do_snapshot(limit):
+        return brutos[-limit:]
+    data = fetch_external_data("/registros", {"limit": limit})
+    if not data and brutos:
+        return brutos[-limit:]
+    return data
+
+def versao_snapshot():
+    """Identifica o conteúdo do snapshot; é a mesma em todos os workers que o leram."""
+    return f"{data_cache['versao']}.{int(data_cache['ingerido_em'] * 1000)}"
+
+# Corpos das rotas de dados por versão do snapshot (ETag/304 + gzip/br)
+cache_respostas = CacheRespostas()
+# Linhas convertidas e JSON codificado por versão do snapshot
+serializador = CacheSerializacao()
+
+def resposta_do_snapshot(view):
+    """
+    Para rotas cuja resposta depende só do snapshot e da URL: responde 304
+    ao If-None-Match com o ETag da versão atual e reaproveita o corpo já
+    serializado e comprimido. Fora do snapshot, executa a rota normalmente.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            limit = int(request.args.get("limit", 20))
+        except ValueError:
+            return view(*args, **kwargs)
+        if not system_ready or not registros_do_snapshot(limit):
+            return view(*args, **kwargs)
+        chave = (request.path, request.query_string)
+        return cache_respostas.responder(versao_snapshot(), chave, lambda: view(*args, **kwargs))
+    return wrapper
+
 
 # =========================
 # GERENCIAMENTO DE CONVERSAS
@@ -518,44 +881,22 @@ def initialize_system():
 
 def get_or_create_session(session_id=None):
     """Obtém ou cria uma sessão de conversa."""
-    if session_id and session_id in conversation_histories:
-        conversation_histories[session_id]['last_activity'] = datetime.now()
-        return session_id, conversation_histories[session_id]['history']
-    else:
-        new_session_id = str(uuid.uuid4())
-        conversation_histories[new_session_id] = {
-            'history': [],
-            'last_activity': datetime.now(),
-            'created_at': datetime.now()
-        }
-        return new_session_id, []
+    return conversation_store.get_or_create(session_id, novo_id=lambda: str(uuid.uuid4()))
 
 def add_to_history(session_id, role, content):
     """Adiciona uma mensagem ao histórico da sessão."""
-    if session_id in conversation_histories:
-        conversation_histories[session_id]['history'].append({
-            'role': role,
-            'content': content,
-            'timestamp': datetime.now()
-        })
-        if len(conversation_histories[session_id]['history']) > 20:
-            conversation_histories[session_id]['history'] = conversation_histories[session_id]['history'][-10:]
-        conversation_histories[session_id]['last_activity'] = datetime.now()
+    conversation_store.append(session_id, role, content)
 
 def cleanup_old_conversations():
-    """Remove conversas com mais de 1 hora."""
-    now = datetime.now()
-    expired_sessions = [
-        sid for sid, data in conversation_histories.items()
-        if now - data['last_activity'] > timedelta(hours=1)
-    ]
-    for sid in expired_sessions:
-        del conversation_histories[sid]
-    print(f"DEBUG: Limpas {len(expired_sessions)} conversas expiradas")
+    """Remove conversas sem atividade há mais que o TTL."""
+    removidas = conversation_store.remove_expired()
+    if removidas:
+        print(f"DEBUG: Limpas {removidas} conversas expiradas")
 
 def schedule_cleanup():
+    # A varredura só olha o topo do heap de vencimentos, então pode rodar com frequência
     while True:
-        threading.Event().wait(1800)
+        threading.Event().wait(60)
         cleanup_old_conversations()
 
 cleanup_thread = threading.Thread(target=schedule_cleanup, daemon=True)
@@ -566,6 +907,7 @@ cleanup_thread.start()
 # =========================
 
    
+@rastreador.rastrear()
 def obter_dados_estufa_atual(limit=50):
     """
     Busca dados recentes da estufa para o chat de forma RÁPIDA:
@@ -581,9 +923,9 @@ def obter_dados_estufa_atual(limit=50):
         base_dados = data_cache['dados'][-limit:]
 
     else:
-        # 2) Se cache estiver vazio ou velho, tenta buscar do servidor externo
+        # 2) Se cache estiver vazio ou velho, tenta o snapshot da ingestão / servidor externo
         try:
-            data = fetch_external_data("/registros", {"limit": limit})
+            data = buscar_registros(limit)
         except Exception as e:
             print(f"DEBUG: exceção ao buscar dados recentes em obter_dados_estufa_atual: {e}")
             data = None
@@ -598,10 +940,11 @@ def obter_dados_estufa_atual(limit=50):
             # 4) Não tem nada pra trabalhar
             return {}
 
-    # ==========================
-    # AGREGAÇÃO (igual você já fazia, só usando base_dados)
-    # ==========================
+    return agregar_dados_estufa(base_dados)
+
 
+def agregar_dados_estufa(base_dados):
+    """Médias, mínimos e máximos por grandeza (mediaTemperatura, minUmidade, ...)."""
     agregados = {
         "temperatura": [],
         "umidade": [],
@@ -930,6 +1273,7 @@ def gerar_resposta_analitica_completa(dados_estufa):
 
     return "\n".join(resposta)
 
+@rastreador.rastrear()
 def gerar_resposta_especifica(mensagem_lower, dados_estufa):
     """Gera resposta específica baseada no que foi perguntado."""
     
@@ -995,6 +1339,7 @@ def gerar_texto_colheita_tomate(indice_qualidade):
     
     return "\n".join(texto)
 
+@rastreador.rastrear()
 def gerar_resposta_inteligente(mensagem, dados_estufa=None, historico_conversa=None):
     """
     Agente principal de resposta ATUALIZADO:
@@ -1061,24 +1406,16 @@ def gerar_resposta_inteligente(mensagem, dados_estufa=None, historico_conversa=N
 
 @app.route("/health")
 def health():
-    try:
-        test_response = fetch_external_data("/registros", {"limit": 1})
-        conexao_externa = test_response is not None
-        
-        # Testar conexão com Ollama também
-        test_ollama = requests.get(OLLAMA_URL.replace('/api/chat', '/api/tags'), timeout=5)
-        ollama_ok = test_ollama.status_code == 200
-        
-    except:
-        conexao_externa = False
-        ollama_ok = False
-
+    # Estado mantido pelo monitor em segundo plano: nenhuma chamada de rede aqui
     status = {
         "ok": system_ready,
         "msg": "Sistema pronto" if system_ready else "Sistema inicializando",
         "dados_carregados": len(data_cache['dados']) if system_ready else 0,
-        "conexao_externa": conexao_externa,
-        "ollama_conectado": ollama_ok,
+        "dados_desatualizados": bool(data_cache['ingerido_em']) and dados_desatualizados(),
+        "idade_dados_s": round(time.time() - data_cache['ingerido_em'], 1) if data_cache['ingerido_em'] else None,
+        # null até a primeira sonda (ou chamada real) de cada dependência
+        "conexao_externa": monitor_saude.disponivel("servidor_externo"),
+        "ollama_conectado": monitor_saude.disponivel("ollama"),
         "modo_ia": True
     }
     return jsonify(status)
@@ -1096,161 +1433,293 @@ def init_status():
 
 @app.route("/debug")
 def debug():
-    data = fetch_external_data("/registros", {"limit": 5})
-    
-    # Testar Ollama
-    ollama_status = "desconhecido"
-    try:
-        test = requests.get(OLLAMA_URL.replace('/api/chat', '/api/tags'), timeout=5)
-        ollama_status = "conectado" if test.status_code == 200 else f"erro {test.status_code}"
-    except Exception as e:
-        ollama_status = f"erro: {str(e)}"
-    
+    data = buscar_registros(5)
+
+    dependencias = monitor_saude.estado()
+    ollama = dependencias["ollama"]
+    if ollama["disponivel"]:
+        ollama_status = "conectado"
+    elif ollama["disjuntor"]["ultimo_erro"]:
+        ollama_status = f"erro: {ollama['disjuntor']['ultimo_erro']}"
+    else:
+        ollama_status = "desconhecido"
+
     return jsonify({
         "dados_brutos": data,
         "quantidade": len(data) if data else 0,
         "system_ready": system_ready,
         "cache_size": len(data_cache['dados']),
         "ollama_status": ollama_status,
-        "conversations_active": len(conversation_histories)
+        "dependencias": dependencias,
+        "conversations_active": len(conversation_store),
+        "conversations": conversation_store.estatisticas(),
+        "predicao_memo": motor_predicao.estatisticas(),
+        "graus_dia": acumulador_graus_dia.estatisticas(),
+        "relatorios": fila_relatorios.estatisticas(),
+        "http_cache": cache_respostas.estatisticas(),
+        "serializacao": serializador.estatisticas(),
+        "rastreamento": rastreador.estatisticas()
     })
 
+@app.route("/debug/traces")
+def debug_traces():
+    """Traces recentes (amostrados); ?formato=chrome para abrir no Perfetto/chrome://tracing."""
+    limit = int(request.args.get("limit", 20))
+    if request.args.get("formato") == "chrome":
+        return resposta_json(rastreador.eventos_chrome(limit))
+    return resposta_json({"rastreamento": rastreador.estatisticas(), "traces": rastreador.recentes(limit)})
+
+def requer_autenticacao(view):
+    """Basic Auth com as mesmas credenciais do servidor da estufa."""
+    @functools.wraps(view)
+    def protegida(*args, **kwargs):
+        if not diagnostico.autorizado(request.headers.get("Authorization"), USERNAME, PASSWORD):
+            return Response("Acesso restrito. Informe usuário e senha.", 401,
+                            {"WWW-Authenticate": 'Basic realm="Estufa IoT"'})
+        return view(*args, **kwargs)
+    return protegida
+
+@app.route("/debug/profile")
+@requer_autenticacao
+def debug_profile():
+    """
+    Amostra as pilhas de todas as threads por ?seconds=N (máx. 60).
+    Devolve pilhas colapsadas (flamegraph.pl/speedscope) ou, com
+    ?formato=json, as funções com mais amostras.
+    """
+    try:
+        segundos, intervalo = diagnostico.parametros_perfil(request.args)
+    except ValueError:
+        return jsonify({"erro": "seconds e intervalo_ms devem ser números"}), 400
+    try:
+        contagem = diagnostico.amostrar_pilhas(segundos, intervalo)
+    except RuntimeError as e:
+        return jsonify({"erro": str(e)}), 409
+    if request.args.get("formato") == "json":
+        return jsonify(diagnostico.resumo_pilhas(contagem))
+    return Response(diagnostico.texto_collapsed(contagem), mimetype="text/plain")
+
+@app.route("/debug/memory")
+@requer_autenticacao
+def debug_memory():
+    """Top-N do tracemalloc e diferença para a chamada anterior (a primeira liga o tracemalloc)."""
+    try:
+        top = int(request.args.get("top", 20))
+    except ValueError:
+        return jsonify({"erro": "top deve ser um inteiro"}), 400
+    return jsonify(diagnostico.memoria(top=top,
+                                       agrupar=request.args.get("agrupar", "lineno"),
+                                       parar=request.args.get("parar") == "1"))
+
+def consultas_cache():
+    http = cache_respostas.estatisticas()
+    serial = serializador.estatisticas()
+    predicao = motor_predicao.estatisticas()
+    return {
+        ("http", "acerto"): http["acertos"] + http["nao_modificado_304"],
+        ("http", "falta"): http["faltas"],
+        ("serializacao", "acerto"): serial["acertos"],
+        ("serializacao", "falta"): serial["codificacoes"],
+        ("predicao", "acerto"): predicao["acertos"],
+        ("predicao", "falta"): predicao["faltas"],
+    }
+
+metricas.coletor("estufa_cache_consultas_total", "counter",
+                 "Consultas aos caches internos (acerto/falta)", ("cache", "resultado"), consultas_cache)
+metricas.coletor("estufa_http_nao_modificado_total", "counter",
+                 "Respostas 304 das rotas de dados", (), lambda: cache_respostas.nao_modificado)
+metricas.medidor("estufa_conversas_sessoes", "Sessões de conversa em memória",
+                 funcao=lambda: len(conversation_store))
+metricas.medidor("estufa_conversas_bytes", "Bytes das conversas em memória",
+                 funcao=lambda: conversation_store.estatisticas()["bytes"])
+metricas.medidor("estufa_executor_fila", "Tarefas do chat aguardando o executor",
+                 funcao=lambda: executor._work_queue.qsize())
+metricas.medidor("estufa_relatorios_fila", "Relatórios aguardando geração",
+                 funcao=lambda: fila_relatorios.fila())
+metricas.medidor("estufa_disjuntor_aberto", "Disjuntor aberto ou em teste (1) ou fechado (0)",
+                 ("dependencia",),
+                 funcao=lambda: {(d.nome,): int(d.estatisticas()["estado"] != FECHADO)
+                                 for d in (disjuntor_pi, disjuntor_ollama)})
+metricas.medidor("estufa_idade_dados_segundos", "Tempo desde a última ingestão do snapshot",
+                 funcao=lambda: time.time() - data_cache['ingerido_em'] if data_cache['ingerido_em'] else None)
+
+@app.route("/metrics")
+def metrics():
+    # Formato de texto do Prometheus; em modo multi-worker, cada coleta vem de um worker
+    return Response(metricas.texto(), content_type=TIPO_CONTEUDO)
+
 # =========================
 # ROTAS DE DADOS / CSV
 # =========================
 
+SERIES_VAZIA = {'time': [], 'temperatura': [], 'umidade': []}
+
+def converter_registro(item):
+    """Registro do servidor externo -> linha tipada das rotas de dados (None se inválido)."""
+    try:
+        return {
+            "timestamp": item.get("timestamp", ""),
+            "temperatura": float(item.get("temperatura", 0)),
+            "umidade": float(item.get("umidade", 0)),
+            "luminosidade": float(item.get("luminosidade", 0)),
+            "nivel_reservatorio": 100.0 if item.get("nivel_alto") else 0.0
+        }
+    except (ValueError, TypeError):
+        return None
+
+def linhas_validas(linhas):
+    return [l for l in linhas if l is not None]
+
+def linhas_do_snapshot(limit):
+    """Últimas `limit` linhas tipadas do snapshot; a conversão é feita uma vez por versão."""
+    todas = serializador.memo(versao_snapshot(), "linhas",
+                              lambda: [converter_registro(i) for i in data_cache['brutos']])
+    return todas[-limit:]
+
+def montar_series(linhas, limit):
+    """Séries do gráfico, em ordem cronológica, a partir de linhas tipadas."""
+    linhas = sorted(linhas_validas(linhas), key=lambda l: l["timestamp"])[-limit:]
+    return {
+        "time": [l["timestamp"][11:16] if len(l["timestamp"]) > 16 else l["timestamp"] for l in linhas],
+        "temperatura": [l["temperatura"] for l in linhas],
+        "umidade": [l["umidade"] for l in linhas],
+    }
+
+def montar_analise(linhas):
+    """Estatísticas do analyzer; None com menos de 20 pontos válidos."""
+    pts = linhas_validas(linhas)
+    return analyzer.analisar(pts) if len(pts) >= 20 else None
+
 @app.route("/registros")
+@resposta_do_snapshot
 def registros():
     """Rota para o frontend - retorna dados dos sensores (online + fallback)."""
     limit = int(request.args.get("limit", 20))
     try:
-        processed_data = []
+        # 1) Snapshot da ingestão: montado e codificado uma vez por versão
+        if registros_do_snapshot(limit):
+            return serializador.resposta(versao_snapshot(), ("registros", limit),
+                                         lambda: linhas_validas(linhas_do_snapshot(limit)))
 
-        # 1) Tenta sempre buscar do servidor externo
-        data = fetch_external_data("/registros", {"limit": limit})
+        # 2) Sem snapshot que cubra o limite: servidor externo
+        data = buscar_registros(limit)
+        processed_data = linhas_validas(converter_registro(i) for i in data) if data else []
 
-        if data:
-            for item in data:
-                try:
-                    temp = float(item.get("temperatura", 0))
-                    umid = float(item.get("umidade", 0))
-                    lum = float(item.get("luminosidade", 0))
-                    nivel_agua = 100.0 if item.get("nivel_alto") else 0.0
-
-                    processed_data.append({
-                        "timestamp": item.get("timestamp", ""),
-                        "temperatura": temp,
-                        "umidade": umid,
-                        "luminosidade": lum,
-                        "nivel_reservatorio": nivel_agua
-                    })
-                except (ValueError, TypeError):
-                    continue
-
-        # 2) Se veio dado novo, atualiza cache e retorna
+        # 3) Se veio dado novo, atualiza cache e retorna
         if processed_data:
             data_cache['dados'] = processed_data
             data_cache['last_update'] = time.time()
-            return jsonify(processed_data)
+            return resposta_json(processed_data)
 
-        # 3) Se não veio nada do servidor externo, tenta usar cache
+        # 4) Se não veio nada do servidor externo, tenta usar cache
         if data_cache['dados']:
-            return jsonify(data_cache['dados'][-limit:])
+            return resposta_json(data_cache['dados'][-limit:])
 
-        # 4) Último caso: realmente não tem nada ainda
-        return jsonify([])
+        # 5) Último caso: realmente não tem nada ainda
+        return resposta_json([])
 
     except Exception as e:
         print(f"DEBUG: Erro em /registros: {e}")
 
         # Em caso de erro, ainda assim tenta servir do cache
         if data_cache['dados']:
-            return jsonify(data_cache['dados'][-limit:])
+            return resposta_json(data_cache['dados'][-limit:])
 
-        return jsonify([])
+        return resposta_json([])
 
 
 @app.route("/series")
+@resposta_do_snapshot
 def series():
     limit = int(request.args.get("limit", 20))
     try:
         if not system_ready:
-            return jsonify({'time': [], 'temperatura': [], 'umidade': []})
+            return resposta_json(SERIES_VAZIA)
 
-        data = fetch_external_data("/registros", {"limit": limit})
+        if registros_do_snapshot(limit):
+            return serializador.resposta(versao_snapshot(), ("series", limit),
+                                         lambda: montar_series(linhas_do_snapshot(limit), limit))
+
+        data = buscar_registros(limit)
         if data:
-            data_sorted = sorted(data, key=lambda x: x.get("timestamp", ""), reverse=True)
-            if limit and len(data_sorted) > limit:
-                data_sorted = data_sorted[:limit]
-            data_sorted.reverse()
-
-            times, temps, umids = [], [], []
-            for item in data_sorted:
-                timestamp = item.get("timestamp", "")
-                if len(timestamp) > 16:
-                    times.append(timestamp[11:16])
-                else:
-                    times.append(timestamp)
-                try:
-                    temps.append(float(item.get("temperatura", 0)))
-                    umids.append(float(item.get("umidade", 0)))
-                except (ValueError, TypeError):
-                    continue
-
-            series_data = {
-                "time": times,
-                "temperatura": temps,
-                "umidade": umids,
-            }
+            series_data = montar_series([converter_registro(i) for i in data], limit)
 
-            if len(temps) >= 20 and len(umids) >= 20:
+            if len(series_data['temperatura']) >= 20:
                 data_cache['series'] = series_data
                 data_cache['last_update'] = time.time()
 
-            return jsonify(series_data)
+            return resposta_json(series_data)
 
         if len(data_cache['series']['temperatura']) >= 20:
-            return jsonify(data_cache['series'])
+            return resposta_json(data_cache['series'])
         else:
-            return jsonify({'time': [], 'temperatura': [], 'umidade': []})
+            return resposta_json(SERIES_VAZIA)
 
     except Exception as e:
         print(f"DEBUG: Erro em /series: {e}")
-        return jsonify({'time': [], 'temperatura': [], 'umidade': []})
+        return resposta_json(SERIES_VAZIA)
+
+CAMPOS_SERIES_BIN = ("temperatura", "umidade", "luminosidade", "nivel_reservatorio")
+SERIES_BIN_MAX = int(os.getenv("SERIES_BIN_MAX", 100000))
+
+@app.route("/series.bin")
+@resposta_do_snapshot
+def series_bin():
+    """
+    Séries do gráfico em formato binário colunar (ver serializacao.py):
+    epoch int32 + colunas float32, lidas no navegador com typed arrays.
+    """
+    try:
+        limit = max(1, min(int(request.args.get("limit", 20)), SERIES_BIN_MAX))
+    except ValueError:
+        return jsonify({"erro": "limit deve ser um inteiro"}), 400
+    versao = versao_snapshot()
+    if registros_do_snapshot(limit):
+        # Colunas montadas uma vez por versão; cada limite é uma fatia delas
+        colunas = serializador.memo(versao, "colunas",
+                                    lambda: colunas_de_linhas(linhas_do_snapshot(len(data_cache['brutos'])),
+                                                              CAMPOS_SERIES_BIN))
+    else:
+        # Histórico maior que o snapshot: busca uma vez por versão e limite
+        def montar():
+            data = buscar_registros(limit)
+            if not data:
+                return None
+            return colunas_de_linhas([converter_registro(i) for i in data], CAMPOS_SERIES_BIN)
+        colunas = (serializador.memo(versao, ("colunas", limit), montar)
+                   or colunas_de_linhas([], CAMPOS_SERIES_BIN))
+    return resposta_binaria(partes_binarias(colunas, limit))
 
 @app.route("/analise")
+@resposta_do_snapshot
 def analise():
     limit = int(request.args.get("limit", 20))
     try:
         if not system_ready:
-            return jsonify([])
-
-        data = fetch_external_data("/registros", {"limit": limit})
-        if data:
-            pts = []
-            for item in data:
-                try:
-                    pts.append({
-                        "temperatura": float(item.get("temperatura", 0)),
-                        "umidade": float(item.get("umidade", 0))
-                    })
-                except (ValueError, TypeError):
-                    continue
-
-            if pts and len(pts) >= 20:
-                result = analyzer.analisar(pts)
+            return resposta_json([])
+
+        if registros_do_snapshot(limit):
+            versao = versao_snapshot()
+            result = serializador.memo(versao, ("analise", limit),
+                                       lambda: montar_analise(linhas_do_snapshot(limit)))
+            if result:
+                return serializador.resposta(versao, ("analise", limit), lambda: result)
+        else:
+            data = buscar_registros(limit)
+            result = montar_analise([converter_registro(i) for i in data]) if data else None
+            if result:
                 data_cache['analise'] = result
                 data_cache['last_update'] = time.time()
-                return jsonify(result)
+                return resposta_json(result)
 
         if data_cache['analise'] and data_cache['analise'].get('temperatura', {}).get('media', 0) > 0:
-            return jsonify(data_cache['analise'])
+            return resposta_json(data_cache['analise'])
         else:
-            return jsonify([])
+            return resposta_json([])
 
     except Exception as e:
         print(f"DEBUG: Erro em /analise: {e}")
-        return jsonify([])
+        return resposta_json([])
 
 @app.route("/dados_completos")
 def dados_completos():
@@ -1322,39 +1791,27 @@ def chat():
         if not raw_msg:
             return jsonify({"erro": "mensagem vazia"}), 400
 
-        # Verificar se é solicitação de relatório
+        # Verificar se é solicitação de relatório (gerado em segundo plano)
         mensagem_lower = raw_msg.lower()
-        if any(p in mensagem_lower for p in ['download', 'baixar', 'relatório', 'relatorio', 'exportar', 'csv', 'planilha']):
-            # Gerar relatório
-            resultado_relatorio = gerar_relatorio()
-            if resultado_relatorio.status_code == 200:
-                dados_relatorio = resultado_relatorio.get_json()
-                
-                # Adicionar ao histórico
-                session_id, conversation_history = get_or_create_session(session_id)
-                add_to_history(session_id, "user", raw_msg)
-                add_to_history(session_id, "assistant", 
-                              f"📊 Relatório gerado com sucesso! \n\n"
-                              f"📁 Arquivo: {dados_relatorio['arquivo']}\n"
-                              f"📈 Contém: Dados atuais + análise completa + histórico de sensores\n\n"
-                              f"⬇️ [Baixar Relatório]({dados_relatorio['caminho']})")
-                
-                return jsonify({
-                    "resposta": f"📊 Relatório gerado com sucesso! \n\n"
-                               f"📁 Arquivo: {dados_relatorio['arquivo']}\n"
-                               f"📈 Contém: Dados atuais + análise completa + histórico de sensores\n\n"
-                               f"⬇️ [Baixar Relatório]({dados_relatorio['caminho']})",
-                    "session_id": session_id,
-                    "modo_ia": True,
-                    "tem_relatorio": True,
-                    "url_download": dados_relatorio['caminho']
-                })
-            else:
-                return jsonify({
-                    "resposta": "❌ Desculpe, não consegui gerar o relatório no momento. Tente novamente mais tarde.",
-                    "session_id": session_id,
-                    "modo_ia": False
-                })
+        if any(p in mensagem_lower for p in PALAVRAS_RELATORIO):
+            job = submeter_relatorio()
+            url_download = f"/relatorios/{job.id}/download"
+            texto = (f"📊 Relatório em geração! \n\n"
+                     f"📈 Contém: Dados atuais + análise completa + histórico de sensores\n\n"
+                     f"⬇️ [Baixar Relatório]({url_download})")
+            
+            session_id, conversation_history = get_or_create_session(session_id)
+            add_to_history(session_id, "user", raw_msg)
+            add_to_history(session_id, "assistant", texto)
+            
+            return jsonify({
+                "resposta": texto,
+                "session_id": session_id,
+                "modo_ia": True,
+                "tem_relatorio": True,
+                "job_id": job.id,
+                "url_download": url_download
+            })
 
         # Sessão normal
         session_id, conversation_history = get_or_create_session(session_id)
@@ -1369,7 +1826,7 @@ def chat():
         # Gera resposta INTELIGENTE com tratamento de erro
         try:
             future = executor.submit(
-                gerar_resposta_inteligente,
+                propagar(gerar_resposta_inteligente),
                 raw_msg, 
                 dados_estufa, 
                 conversation_history
@@ -1448,19 +1905,143 @@ def test_ollama():
 @app.route("/conversations")
 def list_conversations():
     """Lista conversas ativas (debug)."""
-    active_sessions = {}
-    for session_id, data in conversation_histories.items():
-        active_sessions[session_id] = {
-            'message_count': len(data['history']),
-            'last_activity': data['last_activity'].isoformat(),
-            'created_at': data['created_at'].isoformat(),
-            'last_messages': [msg['content'][:50] + '...' for msg in data['history'][-3:]]
-        }
-    return jsonify(active_sessions)
+    return jsonify(conversation_store.listar())
+
+# =========================
+# RELATÓRIOS (FILA EM SEGUNDO PLANO)
+# =========================
+
+PALAVRAS_RELATORIO = ['download', 'baixar', 'relatório', 'relatorio', 'exportar', 'csv', 'planilha']
+EXPORT_DIR = os.getenv("EXPORT_DIR", "/app/exports")
+
+def gerar_arquivo_relatorio(params, export_dir):
+    """Gera o CSV do relatório (executado pelos workers da fila)."""
+    # Uma única busca: os agregados saem dos mesmos registros do relatório
+    dados_completos = buscar_registros(100)
+    if not dados_completos:
+        raise RuntimeError("Não foi possível obter dados para o relatório")
+    dados_estufa = agregar_dados_estufa(dados_completos)
+    
+    # Gerar análise da IA
+    analise_ia = gerar_resposta_analitica_completa(dados_estufa)
+    
+    # Nome do arquivo pelo id do job: qualquer worker encontra o arquivo
+    filepath = os.path.join(export_dir, f"relatorio_estufa_{params['job_id']}.csv")
+    
+    # Gerar CSV
+    import csv
+    with open(filepath, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        
+        # Cabeçalho
+        writer.writerow(["RELATÓRIO DA ESTUFA INTELIGENTE"])
+        writer.writerow([f"Data de geração: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}"])
+        writer.writerow([])
+        
+        # Dados resumidos atuais
+        writer.writerow(["DADOS ATUAIS DA ESTUFA"])
+        if dados_estufa.get("mediaTemperatura"):
+            writer.writerow(["Temperatura média:", f"{dados_estufa['mediaTemperatura']:.1f}°C"])
+        if dados_estufa.get("mediaUmidade"):
+            writer.writerow(["Umidade média:", f"{dados_estufa['mediaUmidade']:.1f}%"])
+        if dados_estufa.get("mediaLuminosidade"):
+            writer.writerow(["Luminosidade média:", f"{dados_estufa['mediaLuminosidade']:.1f} lux"])
+        if dados_estufa.get("mediaNivelAgua"):
+            writer.writerow(["Nível de água médio:", f"{dados_estufa['mediaNivelAgua']:.1f}%"])
+        writer.writerow([])
+        
+        # Análise da IA
+        writer.writerow(["ANÁLISE DO ASSISTENTE INTELIGENTE"])
+        for linha in analise_ia.split('\n'):
+            if linha.strip():
+                writer.writerow([linha.strip()])
+        writer.writerow([])
+        
+        # Dados completos
+        writer.writerow(["DADOS COMPLETOS DOS SENSORES"])
+        writer.writerow(["Timestamp", "Temperatura", "Umidade", "Luminosidade", "Nível Água", "Bomba", "Válvula", "Luminária", "Ventilador", "Exaustor", "Emergência"])
+        
+        for registro in dados_completos:
+            writer.writerow([
+                registro.get("timestamp", ""),
+                registro.get("temperatura", ""),
+                registro.get("umidade", ""),
+                registro.get("luminosidade", ""),
+                100.0 if registro.get("nivel_alto") else 0.0,
+                registro.get("bomba", ""),
+                registro.get("valvula", ""),
+                registro.get("luminaria", ""),
+                registro.get("ventilador", ""),
+                registro.get("exaustor", ""),
+                registro.get("emergencia", "")
+            ])
+    
+    return filepath
+
+fila_relatorios = FilaRelatorios(
+    os.path.join(EXPORT_DIR, "relatorios"),
+    gerar_arquivo_relatorio,
+    max_workers=int(os.getenv("RELATORIOS_WORKERS", 2)),
+    max_bytes=int(os.getenv("RELATORIOS_MAX_BYTES", 50 * 1024 * 1024))
+)
+
+def submeter_relatorio():
+    """Enfileira o relatório da versão atual dos dados (pedidos iguais compartilham o job)."""
+    versao = data_cache['versao']
+    if not versao:
+        # Sem ingestão ativa: agrupa pedidos numa janela de 30 s
+        versao = f"t{int(time.time() // 30)}"
+    return fila_relatorios.submeter(("csv", versao), {"versao": versao})
+
+def resposta_job_relatorio(job):
+    dados = job.to_dict()
+    dados.update({
+        "url_status": f"/relatorios/{job.id}",
+        "url_download": f"/relatorios/{job.id}/download"
+    })
+    return dados
+
+@app.route("/relatorios", methods=["POST"])
+def criar_relatorio():
+    """Enfileira um relatório e devolve o id do job (202)."""
+    job = submeter_relatorio()
+    return jsonify(resposta_job_relatorio(job)), 202
+
+@app.route("/relatorios/<job_id>")
+def status_relatorio(job_id):
+    job = fila_relatorios.obter(job_id)
+    if job is None:
+        return jsonify({"erro": "Job não encontrado"}), 404
+    return jsonify(resposta_job_relatorio(job))
+
+@app.route("/relatorios/<job_id>/download")
+def download_job_relatorio(job_id):
+    """Baixa o relatório; espera alguns segundos se o job ainda estiver rodando."""
+    job = fila_relatorios.aguardar(job_id, timeout=10)
+    if job is None:
+        # Job criado por outro worker: o arquivo leva o id (aleatório) do próprio job
+        caminho = os.path.join(fila_relatorios.diretorio, f"relatorio_estufa_{os.path.basename(job_id)}.csv")
+        if os.path.exists(caminho):
+            gerado_em = datetime.fromtimestamp(os.path.getmtime(caminho))
+            return send_file(caminho, mimetype="text/csv", as_attachment=True,
+                             download_name=f"relatorio_estufa_{gerado_em.strftime('%Y%m%d_%H%M%S')}.csv")
+        return jsonify({"erro": "Job não encontrado"}), 404
+    if job.status in (PENDENTE, EXECUTANDO):
+        resposta = jsonify(resposta_job_relatorio(job))
+        resposta.headers["Retry-After"] = "2"
+        return resposta, 202
+    if job.status != CONCLUIDO:
+        return jsonify({"erro": f"Relatório indisponível ({job.status})", "detalhe": job.erro}), 410
+    return send_file(
+        job.arquivo,
+        mimetype="text/csv",
+        as_attachment=True,
+        download_name=f"relatorio_estufa_{datetime.fromtimestamp(job.concluido_em).strftime('%Y%m%d_%H%M%S')}.csv"
+    )
 
 @app.route("/gerar-relatorio", methods=["POST"])
 def gerar_relatorio():
-    """Gera um relatório CSV com dados atuais e análise da IA."""
+    """Enfileira um relatório CSV com dados atuais e análise da IA."""
     try:
         data = request.get_json(force=True)
         mensagem = data.get("mensagem", "").lower().strip()
@@ -1470,83 +2051,18 @@ def gerar_relatorio():
         if not any(p in mensagem for p in ['download', 'baixar', 'relatório', 'relatorio', 'exportar', 'csv']):
             return jsonify({"erro": "Não é uma solicitação de relatório"}), 400
         
-        # Buscar dados atuais
-        dados_estufa = obter_dados_estufa_atual(limit=100)
-        dados_completos = fetch_external_data("/registros", {"limit": 100})
-        
-        if not dados_completos:
-            return jsonify({"erro": "Não foi possível obter dados para o relatório"}), 500
-        
-        # Gerar análise da IA
-        analise_ia = gerar_resposta_analitica_completa(dados_estufa)
-        
-        # Criar diretório de exports se não existir
-        export_dir = "/app/exports"
-        os.makedirs(export_dir, exist_ok=True)
-        
-        # Nome do arquivo com timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"relatorio_estufa_{timestamp}.csv"
-        filepath = os.path.join(export_dir, filename)
-        
-        # Gerar CSV
-        import csv
-        with open(filepath, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            
-            # Cabeçalho
-            writer.writerow(["RELATÓRIO DA ESTUFA INTELIGENTE"])
-            writer.writerow([f"Data de geração: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}"])
-            writer.writerow([])
-            
-            # Dados resumidos atuais
-            writer.writerow(["DADOS ATUAIS DA ESTUFA"])
-            if dados_estufa.get("mediaTemperatura"):
-                writer.writerow(["Temperatura média:", f"{dados_estufa['mediaTemperatura']:.1f}°C"])
-            if dados_estufa.get("mediaUmidade"):
-                writer.writerow(["Umidade média:", f"{dados_estufa['mediaUmidade']:.1f}%"])
-            if dados_estufa.get("mediaLuminosidade"):
-                writer.writerow(["Luminosidade média:", f"{dados_estufa['mediaLuminosidade']:.1f} lux"])
-            if dados_estufa.get("mediaNivelAgua"):
-                writer.writerow(["Nível de água médio:", f"{dados_estufa['mediaNivelAgua']:.1f}%"])
-            writer.writerow([])
-            
-            # Análise da IA
-            writer.writerow(["ANÁLISE DO ASSISTENTE INTELIGENTE"])
-            for linha in analise_ia.split('\n'):
-                if linha.strip():
-                    writer.writerow([linha.strip()])
-            writer.writerow([])
-            
-            # Dados completos
-            writer.writerow(["DADOS COMPLETOS DOS SENSORES"])
-            writer.writerow(["Timestamp", "Temperatura", "Umidade", "Luminosidade", "Nível Água", "Bomba", "Válvula", "Luminária", "Ventilador", "Exaustor", "Emergência"])
-            
-            for registro in dados_completos:
-                writer.writerow([
-                    registro.get("timestamp", ""),
-                    registro.get("temperatura", ""),
-                    registro.get("umidade", ""),
-                    registro.get("luminosidade", ""),
-                    100.0 if registro.get("nivel_alto") else 0.0,
-                    registro.get("bomba", ""),
-                    registro.get("valvula", ""),
-                    registro.get("luminaria", ""),
-                    registro.get("ventilador", ""),
-                    registro.get("exaustor", ""),
-                    registro.get("emergencia", "")
-                ])
+        job = submeter_relatorio()
         
         # Adicionar ao histórico do chat se houver sessão
-        if session_id and session_id in conversation_histories:
-            mensagem_relatorio = f"Relatório gerado com sucesso! Arquivo: {filename}"
-            add_to_history(session_id, "system", mensagem_relatorio)
+        if session_id and session_id in conversation_store:
+            add_to_history(session_id, "system", f"Relatório solicitado (job {job.id})")
         
-        return jsonify({
-            "mensagem": "Relatório gerado com sucesso!",
-            "arquivo": filename,
-            "caminho": f"/download-relatorio/{filename}"
+        resposta = resposta_job_relatorio(job)
+        resposta.update({
+            "mensagem": "Relatório em geração",
+            "caminho": resposta["url_download"]
         })
+        return jsonify(resposta), 202
         
     except Exception as e:
         print(f"Erro ao gerar relatório: {e}")
@@ -1554,10 +2070,10 @@ def gerar_relatorio():
 
 @app.route("/download-relatorio/<filename>")
 def download_relatorio(filename):
-    """Faz download do relatório gerado."""
+    """Faz download de um relatório gerado anteriormente."""
     try:
         return send_file(
-            f"/app/exports/{filename}",
+            os.path.join(EXPORT_DIR, os.path.basename(filename)),
             mimetype="text/csv",
             as_attachment=True,
             download_name=filename
@@ -1567,13 +2083,15 @@ def download_relatorio(filename):
 
 @app.route("/analise-preditiva", methods=["GET"])
 def analise_preditiva():
-    """Rota específica para análise preditiva de colheita."""
+    """Rota específica para análise preditiva de colheita (?talhao=...)."""
     try:
+        talhao = request.args.get("talhao", TALHAO_PADRAO)
         dados_estufa = obter_dados_estufa_atual(limit=50)
-        analise = gerar_analise_preditiva_colheita(dados_estufa)
+        analise = gerar_analise_preditiva_colheita(dados_estufa, talhao)
         
         return jsonify({
             "analise": analise,
+            "talhao": talhao,
             "timestamp": datetime.now().isoformat()
         })
         
@@ -1582,6 +2100,46 @@ def analise_preditiva():
             "erro": f"Falha ao gerar análise preditiva: {str(e)}"
         }), 500
 
+@app.route("/analise-preditiva/lote", methods=["GET"])
+def analise_preditiva_lote():
+    """Predição de colheita de todos os talhões cadastrados."""
+    try:
+        if registro_plantios.vazio():
+            return jsonify({
+                "talhoes": [],
+                "mensagem": "Nenhum plantio cadastrado",
+                "timestamp": datetime.now().isoformat()
+            })
+        dados_estufa = obter_dados_estufa_atual(limit=50)
+        return jsonify({
+            "talhoes": motor_predicao.prever_lote(dados_estufa),
+            "timestamp": datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({"erro": f"Falha ao gerar predição em lote: {str(e)}"}), 500
+
+@app.route("/plantios", methods=["GET", "POST"])
+def plantios():
+    """Lista ou cadastra talhões: {"talhao", "cultura", "data_plantio": "AAAA-MM-DD"}."""
+    if request.method == "GET":
+        return jsonify({"plantios": registro_plantios.listar(), "culturas": list(CULTURAS)})
+    try:
+        data = request.get_json(force=True)
+        plantio = registro_plantios.registrar(
+            data.get("talhao", TALHAO_PADRAO),
+            data.get("cultura", "tomate_cereja"),
+            data.get("data_plantio", "")
+        )
+        return jsonify(plantio), 201
+    except (ValueError, AttributeError, TypeError) as e:
+        return jsonify({"erro": f"Plantio inválido: {str(e)}"}), 400
+
+@app.route("/plantios/<talhao>", methods=["DELETE"])
+def remover_plantio(talhao):
+    if not registro_plantios.remover(talhao):
+        return jsonify({"erro": "Talhão não encontrado"}), 404
+    return jsonify({"removido": talhao})
+
 # Servir frontend estático
 @app.route("/")
 def index():
@@ -1600,4 +2158,9 @@ if __name__ == "__main__":
     print(f"Ollama URL: {OLLAMA_URL}")
     print("Sistema de inicialização ativado...")
     print(" Modo: Respostas específicas por variável + Análise Preditiva")
+    # Com o reloader do modo debug, só o processo filho (que atende) faz ingestão
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        iniciar_worker()
+        # docker stop manda SIGTERM: sair pelo caminho normal para o atexit gravar o snapshot
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
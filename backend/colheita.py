@@ -0,0 +1,308 @@
+"""
+Registro de plantios e motor de predição de colheita.
+
+O registro guarda, por talhão, a cultura e a data de plantio (persistido em
+JSON). O motor memoriza a predição de cada talhão enquanto as condições
+agregadas da estufa não mudam, e oferece uma predição em lote que calcula
+todos os talhões de uma vez com numpy.
+"""
+
+import bisect
+import json
+import os
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+# Ciclo (dias até a colheita em condições ideais) e graus-dia (base 10 °C)
+# necessários do plantio à colheita, por cultura
+CULTURAS = {
+    "tomate_cereja": {"nome": "Tomate cereja", "ciclo_base": 90, "graus_dia_colheita": 1100},
+    "tomate": {"nome": "Tomate", "ciclo_base": 110, "graus_dia_colheita": 1300},
+    "pimentao": {"nome": "Pimentão", "ciclo_base": 120, "graus_dia_colheita": 1400},
+    "morango": {"nome": "Morango", "ciclo_base": 80, "graus_dia_colheita": 900},
+    "alface": {"nome": "Alface", "ciclo_base": 45, "graus_dia_colheita": 550},
+}
+
+# Estágios por percentual do ciclo: limites superiores (exclusivos) e nomes
+LIMITES_ESTAGIO = [25, 50, 75, 90]
+ESTAGIOS = [
+    "Estágio inicial - Crescimento vegetativo",
+    "Estágio intermediário - Desenvolvimento",
+    "Estágio avançado - Floração e frutificação",
+    "Maturação - Frutos em desenvolvimento",
+    "Pronto para colheita",
+]
+ESTAGIO_PLANTIO_RECENTE = "Plantio recente"
+
+TALHAO_PADRAO = "principal"
+
+
+def calcular_estagio_maturidade(dias_plantio, ciclo_total):
+    """Calcula o estágio de maturidade da planta."""
+    if dias_plantio == 0:
+        return ESTAGIO_PLANTIO_RECENTE
+    percentual = (dias_plantio / ciclo_total) * 100
+    return ESTAGIOS[bisect.bisect_right(LIMITES_ESTAGIO, percentual)]
+
+
+def gerar_recomendacoes_colheita(fatores_ajuste, dias_restantes):
+    """Gera recomendações baseadas nos fatores de ajuste."""
+    recomendacoes = []
+
+    if fatores_ajuste['temperatura'] > 1.1:
+        recomendacoes.append("Ajustar temperatura para acelerar crescimento")
+    elif fatores_ajuste['temperatura'] < 0.95:
+        recomendacoes.append("Temperatura ideal mantida")
+
+    if fatores_ajuste['umidade'] > 1.1:
+        recomendacoes.append("Otimizar umidade para melhor desenvolvimento")
+    elif fatores_ajuste['umidade'] < 0.95:
+        recomendacoes.append("Umidade em nível excelente")
+
+    if fatores_ajuste['luminosidade'] > 1.1:
+        recomendacoes.append("Ajustar iluminação para otimizar fotossíntese")
+    elif fatores_ajuste['luminosidade'] < 0.95:
+        recomendacoes.append("Luminosidade adequada")
+
+    if dias_restantes <= 7:
+        recomendacoes.append("Preparar para colheita iminente")
+    elif dias_restantes <= 14:
+        recomendacoes.append("Monitorar frutos diariamente")
+
+    return recomendacoes
+
+
+class RegistroPlantios:
+    """
+    Talhões cadastrados (cultura + data de plantio), persistidos em JSON.
+    O arquivo é relido quando muda no disco (outro worker pode tê-lo gravado).
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.versao = 0
+        self._plantios = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._carregar()
+
+    def _mtime_arquivo(self):
+        try:
+            return os.stat(self.caminho).st_mtime_ns
+        except OSError:
+            return None
+
+    def _recarregar_se_mudou(self):
+        if self._mtime_arquivo() != self._mtime:
+            self._carregar()
+            self.versao += 1
+
+    def _carregar(self):
+        try:
+            with open(self.caminho, "r", encoding="utf-8") as f:
+                itens = json.load(f)
+            self._plantios = {p["talhao"]: p for p in itens}
+        except FileNotFoundError:
+            self._plantios = {}
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"DEBUG: Registro de plantios inválido em {self.caminho}: {e}")
+            self._plantios = {}
+        # Registro vazio fica vazio: sem data de plantio real não há predição
+        self._mtime = self._mtime_arquivo()
+
+    def _salvar(self):
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        tmp = f"{self.caminho}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(list(self._plantios.values()), f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.caminho)
+        self._mtime = self._mtime_arquivo()
+
+    def listar(self):
+        with self._lock:
+            self._recarregar_se_mudou()
+            return [dict(p) for p in self._plantios.values()]
+
+    def obter(self, talhao):
+        with self._lock:
+            self._recarregar_se_mudou()
+            p = self._plantios.get(talhao)
+            return dict(p) if p else None
+
+    def vazio(self):
+        with self._lock:
+            self._recarregar_se_mudou()
+            return not self._plantios
+
+    def registrar(self, talhao, cultura, data_plantio):
+        """Cadastra ou atualiza um talhão. `data_plantio` no formato AAAA-MM-DD."""
+        if not isinstance(talhao, str) or not talhao.strip():
+            raise ValueError("talhão deve ser um texto não vazio")
+        talhao = talhao.strip()
+        if cultura not in CULTURAS:
+            raise ValueError(f"Cultura desconhecida: {cultura}")
+        data_plantio = date.fromisoformat(data_plantio).isoformat()
+        with self._lock:
+            self._plantios[talhao] = {"talhao": talhao, "cultura": cultura, "data_plantio": data_plantio}
+            self._salvar()
+            self.versao += 1
+            return dict(self._plantios[talhao])
+
+    def remover(self, talhao):
+        with self._lock:
+            if self._plantios.pop(talhao, None) is None:
+                return False
+            self._salvar()
+            self.versao += 1
+            return True
+
+
+def dias_desde_plantio(plantio, hoje=None):
+    hoje = hoje or date.today()
+    return max(0, (hoje - date.fromisoformat(plantio["data_plantio"])).days)
+
+
+def chave_condicoes(dados_estufa):
+    """Impressão digital das condições agregadas que influenciam a predição."""
+    return tuple(
+        round(dados_estufa[k], 1) if dados_estufa.get(k) is not None else None
+        for k in ("mediaTemperatura", "mediaUmidade", "mediaLuminosidade",
+                  "mediaUmidadeSolo", "mediaPHSolo")
+    )
+
+
+class MotorPredicao:
+    """
+    Predição de colheita memorizada por talhão.
+
+    `calcular_maturidade(dados_estufa, dias_plantio, ciclo_base)` é a função
+    de cálculo individual (em app.py); o resultado é reaproveitado enquanto
+    as condições agregadas, o registro e o dia não mudarem. Com um
+    `acumulador` de graus-dia, cada predição ganha o progresso térmico desde
+    o plantio (consulta O(1), feita fora da memória para estar sempre atual).
+    """
+
+    def __init__(self, registro, calcular_maturidade, acumulador=None, max_entradas=256):
+        self.registro = registro
+        self.calcular_maturidade = calcular_maturidade
+        self.acumulador = acumulador
+        self.max_entradas = max_entradas
+        self._memo = {}
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+
+    def _memorizado(self, chave, calcular):
+        with self._lock:
+            if chave in self._memo:
+                self.acertos += 1
+                return self._memo[chave]
+        resultado = calcular()
+        with self._lock:
+            self.faltas += 1
+            if len(self._memo) >= self.max_entradas:
+                self._memo.clear()
+            self._memo[chave] = resultado
+        return resultado
+
+    def _termico(self, plantio):
+        """Progresso térmico do talhão desde o plantio, a partir do acumulador."""
+        if self.acumulador is None:
+            return None
+        info = self.acumulador.consultar(plantio["data_plantio"])
+        if info is None:
+            return None
+        alvo = CULTURAS[plantio["cultura"]]["graus_dia_colheita"]
+        faltam = max(0.0, alvo - info["graus_dia"])
+        ritmo = info["graus_dia_por_dia"]
+        info.update({
+            "graus_dia_colheita": alvo,
+            "progresso_termico": min(1.0, info["graus_dia"] / alvo),
+            "dias_restantes_termico": int(round(faltam / ritmo)) if ritmo else None,
+        })
+        return info
+
+    def prever(self, dados_estufa, talhao=TALHAO_PADRAO):
+        """Predição de um talhão; None se não houver dados ou talhão."""
+        if not dados_estufa or not dados_estufa.get("mediaTemperatura"):
+            return None
+        plantio = self.registro.obter(talhao)
+        if plantio is None:
+            return None
+        hoje = date.today()
+        chave = (talhao, chave_condicoes(dados_estufa), hoje, self.registro.versao)
+
+        def calcular():
+            dias_plantio = dias_desde_plantio(plantio, hoje)
+            ciclo_base = CULTURAS[plantio["cultura"]]["ciclo_base"]
+            predicao = self.calcular_maturidade(dados_estufa, dias_plantio, ciclo_base)
+            if predicao:
+                predicao.update({
+                    "talhao": talhao,
+                    "cultura": plantio["cultura"],
+                    "data_plantio": plantio["data_plantio"],
+                    "dias_plantio": dias_plantio,
+                })
+            return predicao
+
+        predicao = self._memorizado(chave, calcular)
+        if predicao and self.acumulador is not None:
+            predicao = dict(predicao, termico=self._termico(plantio))
+        return predicao
+
+    def prever_lote(self, dados_estufa):
+        """
+        Predição de todos os talhões numa só passada vetorizada: os fatores
+        ambientais são calculados uma vez e aplicados aos ciclos de cada cultura.
+        """
+        if not dados_estufa or not dados_estufa.get("mediaTemperatura"):
+            return []
+        plantios = self.registro.listar()
+        if not plantios:
+            return []
+        hoje = date.today()
+        chave = ("*lote*", chave_condicoes(dados_estufa), hoje, self.registro.versao)
+        resultados = self._memorizado(chave, lambda: self._calcular_lote(dados_estufa, plantios, hoje))
+        if self.acumulador is not None:
+            resultados = [dict(r, termico=self._termico(p)) for r, p in zip(resultados, plantios)]
+        return resultados
+
+    def _calcular_lote(self, dados_estufa, plantios, hoje):
+        base = self.calcular_maturidade(dados_estufa, 0, 1)
+        if not base:
+            return []
+        fator_total = base["fator_total"]
+
+        ciclos_base = np.array([CULTURAS[p["cultura"]]["ciclo_base"] for p in plantios], dtype=np.float64)
+        dias = np.array([dias_desde_plantio(p, hoje) for p in plantios], dtype=np.float64)
+        ciclos = ciclos_base * fator_total
+        restantes = np.maximum(0.0, ciclos - dias)
+        percentual = dias / ciclos * 100
+        idx_estagio = np.searchsorted(LIMITES_ESTAGIO, percentual, side="right")
+
+        resultados = []
+        for i, p in enumerate(plantios):
+            dias_restantes = int(restantes[i])
+            estagio = ESTAGIO_PLANTIO_RECENTE if dias[i] == 0 else ESTAGIOS[idx_estagio[i]]
+            resultados.append({
+                "talhao": p["talhao"],
+                "cultura": p["cultura"],
+                "data_plantio": p["data_plantio"],
+                "dias_plantio": int(dias[i]),
+                "dias_restantes": dias_restantes,
+                "ciclo_total_estimado": int(ciclos[i]),
+                "indice_qualidade": base["indice_qualidade"],
+                "fatores_ajuste": base["fatores_ajuste"],
+                "estagio_maturidade": estagio,
+                "recomendacoes": gerar_recomendacoes_colheita(base["fatores_ajuste"], dias_restantes),
+                "previsao_colheita": (hoje + timedelta(days=dias_restantes)).isoformat(),
+            })
+        return resultados
+
+    def estatisticas(self):
+        with self._lock:
+            return {"entradas": len(self._memo), "acertos": self.acertos, "faltas": self.faltas}
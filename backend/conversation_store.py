@@ -0,0 +1,342 @@
+"""
+Armazenamento de conversas do chat.
+
+Mantém as sessões em memória com limite rígido (quantidade de sessões e
+bytes UTF-8 das mensagens), expulsão LRU, expiração por TTL guiada
+por um heap de vencimentos e histórico em buffer circular por sessão.
+Opcionalmente grava tudo em SQLite (modo WAL) para sobreviver a reinícios.
+"""
+
+import heapq
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+
+
+class _Sessao:
+    __slots__ = ("history", "created_at", "last_activity", "bytes")
+
+    def __init__(self, max_mensagens, created_at, last_activity):
+        self.history = deque(maxlen=max_mensagens)
+        self.created_at = created_at
+        self.last_activity = last_activity
+        self.bytes = 0
+
+
+def _tamanho(msg):
+    """Tamanho em bytes (UTF-8) do conteúdo e do papel de uma mensagem."""
+    return len(msg["content"].encode("utf-8")) + len(msg["role"].encode("utf-8"))
+
+
+class PersistenciaSQLite:
+    """Backend de persistência das conversas em SQLite (WAL)."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessoes (
+                id TEXT PRIMARY KEY,
+                created_at REAL NOT NULL,
+                last_activity REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS mensagens (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                timestamp REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_mensagens_sessao ON mensagens(session_id, id);
+            CREATE INDEX IF NOT EXISTS idx_sessoes_atividade ON sessoes(last_activity);
+        """)
+
+    def _conn(self):
+        # Uma conexão por thread; o SQLite em WAL permite leitores concorrentes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def salvar_sessao(self, session_id, created_at, last_activity):
+        self._conn().execute(
+            "INSERT INTO sessoes (id, created_at, last_activity) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET last_activity = excluded.last_activity",
+            (session_id, created_at, last_activity)
+        )
+
+    def adicionar_mensagem(self, session_id, msg, last_activity, max_mensagens):
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            conn.execute(
+                "INSERT INTO mensagens (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+                (session_id, msg["role"], msg["content"], msg["timestamp"])
+            )
+            conn.execute("UPDATE sessoes SET last_activity = ? WHERE id = ?", (last_activity, session_id))
+            # Mantém no disco o mesmo buffer circular da memória
+            conn.execute(
+                "DELETE FROM mensagens WHERE session_id = ? AND id <= ("
+                "SELECT id FROM mensagens WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (session_id, session_id, max_mensagens)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def carregar(self, session_id, max_mensagens):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT created_at, last_activity FROM sessoes WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        msgs = conn.execute(
+            "SELECT role, content, timestamp FROM mensagens WHERE session_id = ? "
+            "ORDER BY id DESC LIMIT ?",
+            (session_id, max_mensagens)
+        ).fetchall()
+        history = [{"role": r, "content": c, "timestamp": t} for r, c, t in reversed(msgs)]
+        return row[0], row[1], history
+
+    def remover_expiradas(self, limite_atividade):
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            conn.execute(
+                "DELETE FROM mensagens WHERE session_id IN "
+                "(SELECT id FROM sessoes WHERE last_activity < ?)",
+                (limite_atividade,)
+            )
+            cur = conn.execute("DELETE FROM sessoes WHERE last_activity < ?", (limite_atividade,))
+            conn.execute("COMMIT")
+            return cur.rowcount
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def contar(self):
+        return self._conn().execute("SELECT COUNT(*) FROM sessoes").fetchone()[0]
+
+
+class ConversationStore:
+    """
+    Armazém de conversas thread-safe.
+
+    - `max_sessoes` e `max_bytes` (UTF-8 do texto das mensagens) formam o
+      teto de memória; ao estourar, a sessão menos usada recentemente é
+      expulsa (LRU). Uma mensagem maior que `max_bytes` é recusada, e uma
+      sessão que sozinha passa do teto perde as próprias mensagens mais
+      antigas, em vez de expulsar as outras.
+    - Sessões sem atividade por `ttl` segundos expiram; o heap de
+      vencimentos permite varrer só o que venceu, sem percorrer tudo.
+    - Com `persistencia`, as sessões expulsas da memória continuam no disco
+      e são recarregadas sob demanda (read-through).
+    - Com `cache_local=False` (vários processos no mesmo banco), toda leitura
+      vai ao disco, para enxergar mensagens gravadas por outros workers.
+    """
+
+    def __init__(self, ttl=3600, max_sessoes=1000, max_mensagens=20,
+                 max_bytes=8 * 1024 * 1024, persistencia=None, cache_local=True):
+        self.ttl = ttl
+        self.max_sessoes = max_sessoes
+        self.max_mensagens = max_mensagens
+        self.max_bytes = max_bytes
+        self.persistencia = persistencia
+        self.cache_local = cache_local or persistencia is None
+        self._sessoes = OrderedDict()
+        self._vencimentos = []
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    # ---------- internos (chamados com o lock adquirido) ----------
+
+    def _agendar(self, session_id, last_activity):
+        heapq.heappush(self._vencimentos, (last_activity + self.ttl, session_id))
+        # Entradas antigas ficam no heap (remoção preguiçosa); compacta se crescer demais
+        if len(self._vencimentos) > 2 * len(self._sessoes) + 64:
+            self._vencimentos = [
+                (s.last_activity + self.ttl, sid) for sid, s in self._sessoes.items()
+            ]
+            heapq.heapify(self._vencimentos)
+
+    def _remover_memoria(self, session_id):
+        sessao = self._sessoes.pop(session_id, None)
+        if sessao is not None:
+            self._bytes -= sessao.bytes
+        return sessao
+
+    def _aplicar_limites(self):
+        while self._sessoes and (len(self._sessoes) > self.max_sessoes or self._bytes > self.max_bytes):
+            sid, sessao = self._sessoes.popitem(last=False)
+            self._bytes -= sessao.bytes
+
+    def _carregar(self, session_id, now):
+        if self.persistencia is None:
+            return None
+        try:
+            carregado = self.persistencia.carregar(session_id, self.max_mensagens)
+        except sqlite3.Error as e:
+            print(f"DEBUG: Erro ao carregar sessão {session_id}: {e}")
+            return None
+        if carregado is None:
+            return None
+        created_at, last_activity, history = carregado
+        if now - last_activity > self.ttl:
+            return None
+        sessao = _Sessao(self.max_mensagens, created_at, last_activity)
+        for msg in history:
+            sessao.history.append(msg)
+            sessao.bytes += _tamanho(msg)
+        # Mesmo teto por sessão do append(): o disco guarda por quantidade, não por bytes
+        while sessao.bytes > self.max_bytes:
+            sessao.bytes -= _tamanho(sessao.history.popleft())
+        self._sessoes[session_id] = sessao
+        self._bytes += sessao.bytes
+        return sessao
+
+    def _obter(self, session_id, now):
+        if not self.cache_local:
+            self._remover_memoria(session_id)
+        sessao = self._sessoes.get(session_id)
+        if sessao is not None and now - sessao.last_activity > self.ttl:
+            self._remover_memoria(session_id)
+            sessao = None
+        if sessao is None:
+            sessao = self._carregar(session_id, now)
+        return sessao
+
+    def _tocar(self, session_id, sessao, now):
+        sessao.last_activity = now
+        self._sessoes.move_to_end(session_id)
+        self._agendar(session_id, now)
+
+    # ---------- API pública ----------
+
+    def get_or_create(self, session_id=None, novo_id=None):
+        """Retorna (session_id, cópia do histórico), criando a sessão se preciso."""
+        now = time.time()
+        with self._lock:
+            if session_id:
+                sessao = self._obter(session_id, now)
+                if sessao is not None:
+                    self._tocar(session_id, sessao, now)
+                    self._aplicar_limites()
+                    return session_id, list(sessao.history)
+
+            session_id = novo_id() if novo_id else str(now)
+            sessao = _Sessao(self.max_mensagens, now, now)
+            self._sessoes[session_id] = sessao
+            self._agendar(session_id, now)
+            self._aplicar_limites()
+
+        if self.persistencia is not None:
+            try:
+                self.persistencia.salvar_sessao(session_id, now, now)
+            except sqlite3.Error as e:
+                print(f"DEBUG: Erro ao salvar sessão {session_id}: {e}")
+        return session_id, []
+
+    def append(self, session_id, role, content):
+        """
+        Adiciona uma mensagem ao buffer circular da sessão; False se a sessão
+        não existe ou se a mensagem sozinha passa de `max_bytes`.
+        """
+        now = time.time()
+        msg = {"role": role, "content": content, "timestamp": now}
+        tamanho = _tamanho(msg)
+        if tamanho > self.max_bytes:
+            print(f"DEBUG: Mensagem de {tamanho} bytes recusada na sessão {session_id} "
+                  f"(max_bytes={self.max_bytes})")
+            return False
+        with self._lock:
+            sessao = self._obter(session_id, now)
+            if sessao is None:
+                return False
+            if len(sessao.history) == sessao.history.maxlen:
+                descartada = _tamanho(sessao.history[0])
+                sessao.bytes -= descartada
+                self._bytes -= descartada
+            sessao.history.append(msg)
+            sessao.bytes += tamanho
+            self._bytes += tamanho
+            # A sessão sozinha não pode passar do teto (o LRU a expulsaria
+            # por inteiro, com a mensagem nova): saem as mais antigas dela
+            while sessao.bytes > self.max_bytes:
+                descartada = _tamanho(sessao.history.popleft())
+                sessao.bytes -= descartada
+                self._bytes -= descartada
+            self._tocar(session_id, sessao, now)
+            self._aplicar_limites()
+
+        if self.persistencia is not None:
+            try:
+                self.persistencia.adicionar_mensagem(session_id, msg, now, self.max_mensagens)
+            except sqlite3.Error as e:
+                print(f"DEBUG: Erro ao persistir mensagem da sessão {session_id}: {e}")
+        return True
+
+    def remove_expired(self):
+        """Remove sessões vencidas; custo proporcional apenas ao que expirou."""
+        now = time.time()
+        removidas = 0
+        with self._lock:
+            while self._vencimentos and self._vencimentos[0][0] <= now:
+                expira_em, sid = heapq.heappop(self._vencimentos)
+                sessao = self._sessoes.get(sid)
+                # Entrada obsoleta: a sessão foi tocada depois deste agendamento
+                if sessao is None or sessao.last_activity + self.ttl != expira_em:
+                    continue
+                self._remover_memoria(sid)
+                removidas += 1
+
+        if self.persistencia is not None:
+            try:
+                removidas = max(removidas, self.persistencia.remover_expiradas(now - self.ttl))
+            except sqlite3.Error as e:
+                print(f"DEBUG: Erro ao limpar sessões persistidas: {e}")
+        return removidas
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return self._obter(session_id, time.time()) is not None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessoes)
+
+    def listar(self):
+        """Resumo das sessões em memória (rota de debug)."""
+        with self._lock:
+            itens = [(sid, s.created_at, s.last_activity, list(s.history)) for sid, s in self._sessoes.items()]
+        ativas = {}
+        for sid, created_at, last_activity, history in itens:
+            ativas[sid] = {
+                'message_count': len(history),
+                'last_activity': datetime.fromtimestamp(last_activity).isoformat(),
+                'created_at': datetime.fromtimestamp(created_at).isoformat(),
+                'last_messages': [msg['content'][:50] + '...' for msg in history[-3:]]
+            }
+        return ativas
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "sessoes": len(self._sessoes),
+                "bytes": self._bytes,
+                "max_sessoes": self.max_sessoes,
+                "max_bytes": self.max_bytes,
+                "vencimentos_agendados": len(self._vencimentos),
+                "persistencia": self.persistencia.caminho if self.persistencia else None,
+            }
@@ -0,0 +1,276 @@
+"""
+Acumulador de graus-dia (GDD) e integral de luz desde o início do histórico.
+
+Cada leitura nova soma a contribuição do intervalo desde a anterior
+(trapézio), e a cada virada de dia é gravado um checkpoint com o acumulado.
+Assim, "quanto calor/luz a planta recebeu desde o plantio" é só a diferença
+entre o acumulado atual e o checkpoint da véspera do plantio: custo O(1).
+`reconstruir()` refaz tudo a partir do histórico completo com numpy.
+"""
+
+import json
+import os
+import threading
+from datetime import date, datetime, timezone
+
+import numpy as np
+
+# Tomate: temperatura base de 10 °C e teto de 30 °C (acima disso não acelera)
+TEMP_BASE = 10.0
+TEMP_TETO = 30.0
+# Conversão aproximada de lux (luz solar) para PPFD em µmol/m²/s
+LUX_PARA_PPFD = 0.0185
+# Intervalos maiores que isso são falhas de coleta e não são integrados
+MAX_INTERVALO_S = 2 * 3600
+SEGUNDOS_DIA = 86400
+_EPOCH = date(1970, 1, 1)
+
+
+def epoch_registro(timestamp):
+    """Segundos desde 1970 de um timestamp 'AAAA-MM-DD HH:MM:SS' (horário local, sem fuso)."""
+    return datetime.fromisoformat(timestamp[:19]).replace(tzinfo=timezone.utc).timestamp()
+
+
+def dia_de(epoch):
+    return int(epoch // SEGUNDOS_DIA)
+
+
+def dia_da_data(data):
+    if isinstance(data, str):
+        data = date.fromisoformat(data[:10])
+    return (data - _EPOCH).days
+
+
+class AcumuladorGrausDia:
+    """Acumulado incremental de graus-dia e luz (mol/m²) com checkpoints diários."""
+
+    def __init__(self, caminho=None, temp_base=TEMP_BASE, temp_teto=TEMP_TETO):
+        self.caminho = caminho
+        self.temp_base = temp_base
+        self.temp_teto = temp_teto
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._zerar()
+        if caminho:
+            self._carregar()
+
+    def _zerar(self):
+        self.ultimo_ts = None
+        self.ultima_temp = None
+        self.ultima_luz = None
+        self.graus_dia = 0.0
+        self.luz_mol = 0.0
+        self.primeiro_dia = None
+        # dia (desde 1970) -> (graus_dia, luz_mol) acumulados ao fim do dia
+        self.checkpoints = {}
+        self._alterado = False
+
+    # ---------- persistência ----------
+
+    def _mtime_arquivo(self):
+        try:
+            return os.stat(self.caminho).st_mtime_ns
+        except OSError:
+            return None
+
+    def recarregar_se_mudou(self):
+        """Relê o arquivo se outro processo (o dono da ingestão) o regravou."""
+        if self.caminho and self._mtime_arquivo() != self._mtime:
+            with self._lock:
+                self._carregar()
+
+    def _carregar(self):
+        self._mtime = self._mtime_arquivo()
+        try:
+            with open(self.caminho, "r", encoding="utf-8") as f:
+                estado = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            print(f"DEBUG: Acumulador de graus-dia inválido em {self.caminho}: {e}")
+            return
+        self.ultimo_ts = estado["ultimo_ts"]
+        self.ultima_temp = estado["ultima_temp"]
+        self.ultima_luz = estado["ultima_luz"]
+        self.graus_dia = estado["graus_dia"]
+        self.luz_mol = estado["luz_mol"]
+        self.primeiro_dia = estado["primeiro_dia"]
+        self.checkpoints = {int(d): tuple(v) for d, v in estado["checkpoints"].items()}
+
+    def salvar(self):
+        """Grava o estado em disco se houve alteração desde a última gravação."""
+        if not self.caminho:
+            return
+        with self._lock:
+            if not self._alterado:
+                return
+            estado = {
+                "ultimo_ts": self.ultimo_ts,
+                "ultima_temp": self.ultima_temp,
+                "ultima_luz": self.ultima_luz,
+                "graus_dia": self.graus_dia,
+                "luz_mol": self.luz_mol,
+                "primeiro_dia": self.primeiro_dia,
+                "checkpoints": {str(d): v for d, v in self.checkpoints.items()},
+            }
+            self._alterado = False
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        tmp = f"{self.caminho}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(estado, f)
+        os.replace(tmp, self.caminho)
+        self._mtime = self._mtime_arquivo()
+
+    # ---------- atualização incremental ----------
+
+    def _contribuicao(self, t0, t1, luz0, luz1, dt):
+        temp_media = min((t0 + t1) / 2.0, self.temp_teto)
+        gdd = max(0.0, temp_media - self.temp_base) * dt / SEGUNDOS_DIA
+        luz = (luz0 + luz1) / 2.0 * LUX_PARA_PPFD * dt / 1e6
+        return gdd, luz
+
+    def adicionar(self, ts, temperatura, luminosidade=0.0):
+        """Soma uma leitura (ts em segundos). Leituras antigas ou repetidas são ignoradas."""
+        if temperatura is None:
+            return False
+        luminosidade = luminosidade or 0.0
+        with self._lock:
+            if self.ultimo_ts is not None and ts <= self.ultimo_ts:
+                return False
+            dia = dia_de(ts)
+            if self.ultimo_ts is None:
+                self.primeiro_dia = dia
+            else:
+                dia_anterior = dia_de(self.ultimo_ts)
+                # Virada de dia: checkpoint do(s) dia(s) que terminaram
+                for d in range(dia_anterior, dia):
+                    self.checkpoints[d] = (self.graus_dia, self.luz_mol)
+                dt = ts - self.ultimo_ts
+                if dt <= MAX_INTERVALO_S:
+                    gdd, luz = self._contribuicao(self.ultima_temp, temperatura,
+                                                  self.ultima_luz, luminosidade, dt)
+                    self.graus_dia += gdd
+                    self.luz_mol += luz
+            self.ultimo_ts = ts
+            self.ultima_temp = temperatura
+            self.ultima_luz = luminosidade
+            self._alterado = True
+            return True
+
+    def adicionar_registros(self, registros):
+        """Alimenta com registros do servidor externo (apenas os mais novos que o último visto)."""
+        novos = 0
+        for r in registros:
+            try:
+                ts = epoch_registro(r["timestamp"])
+                temp = r.get("temperatura")
+                if temp is None:
+                    continue
+                if self.adicionar(ts, float(temp), float(r.get("luminosidade") or 0.0)):
+                    novos += 1
+            except (KeyError, ValueError, TypeError):
+                continue
+        return novos
+
+    # ---------- reconstrução vetorizada ----------
+
+    def reconstruir(self, registros):
+        """Refaz o acumulado a partir de todo o histórico, de forma vetorizada."""
+        ts, temps, luzes = [], [], []
+        for r in registros:
+            try:
+                temp = r.get("temperatura")
+                if temp is None:
+                    continue
+                # Mesma regra do adicionar_registros: timestamp inválido descarta só o registro
+                epoch = epoch_registro(r["timestamp"])
+                leitura = (float(temp), float(r.get("luminosidade") or 0.0))
+            except (KeyError, ValueError, TypeError, AttributeError):
+                continue
+            ts.append(epoch)
+            temps.append(leitura[0])
+            luzes.append(leitura[1])
+        if not ts:
+            return 0
+
+        t = np.array(ts, dtype=np.float64)
+        temp = np.array(temps, dtype=np.float64)
+        luz = np.array(luzes, dtype=np.float64)
+        ordem = np.argsort(t, kind="stable")
+        t, temp, luz = t[ordem], temp[ordem], luz[ordem]
+        # Remove timestamps repetidos (mantém a primeira leitura)
+        unicos = np.concatenate(([True], np.diff(t) > 0))
+        t, temp, luz = t[unicos], temp[unicos], luz[unicos]
+
+        dt = np.diff(t)
+        valido = dt <= MAX_INTERVALO_S
+        temp_media = np.minimum((temp[:-1] + temp[1:]) / 2.0, self.temp_teto)
+        gdd = np.where(valido, np.maximum(0.0, temp_media - self.temp_base) * dt / SEGUNDOS_DIA, 0.0)
+        luz_int = np.where(valido, (luz[:-1] + luz[1:]) / 2.0 * LUX_PARA_PPFD * dt / 1e6, 0.0)
+        gdd_acum = np.concatenate(([0.0], np.cumsum(gdd)))
+        luz_acum = np.concatenate(([0.0], np.cumsum(luz_int)))
+
+        # Acumulado ao fim de cada dia = valor na última leitura do dia
+        dias = (t // SEGUNDOS_DIA).astype(np.int64)
+        primeiro, ultimo = int(dias[0]), int(dias[-1])
+        todos_dias = np.arange(primeiro, ultimo, dtype=np.int64)
+        idx_fim = np.searchsorted(dias, todos_dias, side="right") - 1
+        checkpoints = {
+            int(d): (float(gdd_acum[i]), float(luz_acum[i]))
+            for d, i in zip(todos_dias, idx_fim)
+        }
+
+        with self._lock:
+            self._zerar()
+            self.primeiro_dia = primeiro
+            self.checkpoints = checkpoints
+            self.ultimo_ts = float(t[-1])
+            self.ultima_temp = float(temp[-1])
+            self.ultima_luz = float(luz[-1])
+            self.graus_dia = float(gdd_acum[-1])
+            self.luz_mol = float(luz_acum[-1])
+            self._alterado = True
+        return len(t)
+
+    # ---------- consultas O(1) ----------
+
+    def _acumulado_ate(self, dia):
+        """Acumulado ao fim do dia `dia` (0 se antes do início do histórico)."""
+        if self.primeiro_dia is None or dia < self.primeiro_dia:
+            return 0.0, 0.0
+        if dia in self.checkpoints:
+            return self.checkpoints[dia]
+        return self.graus_dia, self.luz_mol
+
+    def consultar(self, data_inicio):
+        """Graus-dia e luz acumulados desde o início de `data_inicio` (date ou 'AAAA-MM-DD')."""
+        dia_inicio = dia_da_data(data_inicio)
+        with self._lock:
+            if self.ultimo_ts is None:
+                return None
+            gdd0, luz0 = self._acumulado_ate(dia_inicio - 1)
+            dias = max(1, dia_de(self.ultimo_ts) - max(dia_inicio, self.primeiro_dia) + 1)
+            # Ritmo recente (últimos 7 dias completos) para projetar o restante do ciclo
+            hoje = dia_de(self.ultimo_ts)
+            gdd_7a, _ = self._acumulado_ate(hoje - 8)
+            gdd_ontem, _ = self._acumulado_ate(hoje - 1)
+            dias_ritmo = min(7, max(0, hoje - 1 - max(self.primeiro_dia - 1, hoje - 8)))
+            return {
+                "graus_dia": self.graus_dia - gdd0,
+                "integral_luz_mol": self.luz_mol - luz0,
+                "dli_medio": (self.luz_mol - luz0) / dias,
+                "graus_dia_por_dia": (gdd_ontem - gdd_7a) / dias_ritmo if dias_ritmo else None,
+                "historico_desde": date.fromordinal(_EPOCH.toordinal() + self.primeiro_dia).isoformat(),
+                "cobre_ciclo_inteiro": self.primeiro_dia <= dia_inicio,
+            }
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "graus_dia_total": self.graus_dia,
+                "luz_mol_total": self.luz_mol,
+                "checkpoints": len(self.checkpoints),
+                "ultimo_ts": self.ultimo_ts,
+            }
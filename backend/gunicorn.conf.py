@@ -0,0 +1,27 @@
+# gunicorn.conf.py
+# Modo de produção com vários workers (prefork):
+#   cd backend && gunicorn -c gunicorn.conf.py app:app
+# Um único worker fica com a ingestão de dados do servidor externo; os demais
+# leem o snapshot e as conversas do estado compartilhado em ESTADO_DIR.
+import multiprocessing
+import os
+
+os.environ.setdefault("ESTUFA_MULTIWORKER", "1")
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+# O chat pode esperar o Ollama; não deixar o gunicorn matar o worker antes
+timeout = 60
+preload_app = False
+
+
+def post_worker_init(worker):
+    import app as estufa_app
+    estufa_app.iniciar_worker()
+
+
+def worker_exit(server, worker):
+    import app as estufa_app
+    estufa_app.encerrar()
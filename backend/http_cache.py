@@ -0,0 +1,156 @@
+"""
+Cache HTTP das rotas de dados (GET condicional + compressão).
+
+Enquanto o snapshot da ingestão não muda, /registros, /series e /analise
+devolvem exatamente os mesmos bytes. Cada resposta recebe um ETag derivado
+da versão do snapshot e da URL; se o cliente manda o mesmo ETag em
+If-None-Match, responde 304 sem executar a rota. Os corpos já codificados
+(identidade, gzip e, se o pacote `brotli` estiver instalado, br) ficam em
+cache por versão, então cada combinação é serializada e comprimida uma vez.
+"""
+
+import gzip
+import threading
+import time
+import zlib
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # opcional: sem o pacote, negocia só gzip
+    brotli = None
+
+
+def _qualidades(accept_encoding):
+    """{codificação: q} a partir do cabeçalho Accept-Encoding."""
+    qualidades = {}
+    for parte in accept_encoding.split(","):
+        nome, _, params = parte.partition(";")
+        nome = nome.strip().lower()
+        if not nome:
+            continue
+        params = params.strip()
+        try:
+            qualidades[nome] = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            qualidades[nome] = 0.0
+    return qualidades
+
+
+def negociar(accept_encoding):
+    qualidades = _qualidades(accept_encoding)
+    candidatas = ("br", "gzip") if brotli is not None else ("gzip",)
+    for codificacao in candidatas:
+        if qualidades.get(codificacao, qualidades.get("*", 0.0)) > 0:
+            return codificacao
+    return "identity"
+
+
+def comprimir(corpo, codificacao):
+    if codificacao == "br":
+        return brotli.compress(corpo, quality=5)
+    if codificacao == "gzip":
+        return gzip.compress(corpo, compresslevel=6, mtime=0)
+    return corpo
+
+
+def _etags_da_requisicao():
+    valor = request.headers.get("If-None-Match", "")
+    return {e.strip() for e in valor.split(",") if e.strip()}
+
+
+class CacheRespostas:
+    """
+    Corpos de resposta por (versão do snapshot, chave), em todas as
+    codificações pedidas. Entradas de versões antigas são descartadas
+    quando a versão muda.
+    """
+
+    def __init__(self, max_entradas=128, min_bytes=512):
+        self.max_entradas = max_entradas
+        # Abaixo disso a compressão não compensa o custo
+        self.min_bytes = min_bytes
+        self._versao = None
+        self._entradas = {}
+        self._lock = threading.Lock()
+        self.nao_modificado = 0
+        self.acertos = 0
+        self.faltas = 0
+        self.bytes_enviados = 0
+        self.bytes_sem_cache = 0
+        self.tempo_compressao = 0.0
+
+    def etag(self, versao, chave):
+        return f'W/"{versao}-{zlib.crc32(repr(chave).encode()):08x}"'
+
+    def responder(self, versao, chave, gerar):
+        """
+        Responde a requisição atual a partir do cache; `gerar()` produz a
+        resposta original (Flask) só quando ela ainda não está em cache.
+        """
+        etag = self.etag(versao, chave)
+        cabecalhos = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+
+        pedidas = _etags_da_requisicao()
+        if etag in pedidas or "*" in pedidas:
+            with self._lock:
+                self.nao_modificado += 1
+                entrada = self._entradas.get(chave) if self._versao == versao else None
+                if entrada is not None:
+                    self.bytes_sem_cache += len(entrada["identity"])
+            return Response(status=304, headers=cabecalhos)
+
+        codificacao = negociar(request.headers.get("Accept-Encoding", ""))
+        with self._lock:
+            if self._versao != versao:
+                self._versao = versao
+                self._entradas = {}
+            entrada = self._entradas.get(chave)
+            corpo = entrada.get(codificacao) if entrada else None
+
+        if entrada is None:
+            resposta = gerar()
+            if resposta.status_code != 200 or resposta.direct_passthrough:
+                return resposta
+            entrada = {"mimetype": resposta.mimetype, "identity": resposta.get_data()}
+            with self._lock:
+                self.faltas += 1
+        elif corpo is not None:
+            with self._lock:
+                self.acertos += 1
+
+        if corpo is None:
+            bruto = entrada["identity"]
+            if codificacao != "identity" and len(bruto) >= self.min_bytes:
+                inicio = time.perf_counter()
+                corpo = comprimir(bruto, codificacao)
+                self.tempo_compressao += time.perf_counter() - inicio
+            else:
+                codificacao, corpo = "identity", bruto
+            with self._lock:
+                if self._versao == versao:
+                    if chave not in self._entradas and len(self._entradas) >= self.max_entradas:
+                        self._entradas.pop(next(iter(self._entradas)))
+                    self._entradas.setdefault(chave, entrada)[codificacao] = corpo
+
+        if codificacao != "identity":
+            cabecalhos["Content-Encoding"] = codificacao
+        with self._lock:
+            self.bytes_enviados += len(corpo)
+            self.bytes_sem_cache += len(entrada["identity"])
+        return Response(corpo, mimetype=entrada["mimetype"], headers=cabecalhos)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "versao": self._versao,
+                "entradas": len(self._entradas),
+                "nao_modificado_304": self.nao_modificado,
+                "acertos": self.acertos,
+                "faltas": self.faltas,
+                "bytes_enviados": self.bytes_enviados,
+                "bytes_sem_cache": self.bytes_sem_cache,
+                "tempo_compressao_s": round(self.tempo_compressao, 4),
+                "brotli": brotli is not None,
+            }
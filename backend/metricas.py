@@ -0,0 +1,207 @@
+"""
+Métricas no formato de texto do Prometheus (exposição 0.0.4).
+
+Três tipos, todos seguros entre threads e com rótulos opcionais:
+
+* `Contador`: só cresce (requisições, erros, mensagens);
+* `Medidor`: valor instantâneo; aceita `funcao=` para ser lido só na coleta
+  (tamanho de fila, sessões em memória);
+* `Histograma`: distribuição por baldes cumulativos (latências).
+
+Contadores que já existem em outros objetos (ex.: acertos de cache) entram
+com `Registro.coletor`, que chama uma função a cada coleta em vez de
+duplicar a contagem.
+
+Este arquivo existe igual em backend/ e infraestrutura/, que são
+implantados separadamente (contêiner e Raspberry Pi): mantenha os dois
+iguais (`python verificar_copias.py` na raiz confere). O exportador HTTP
+do bridge fica em infraestrutura/metricas_http.py.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+TIPO_CONTEUDO = "text/plain; version=0.0.4; charset=utf-8"
+
+# Em segundos: de 5 ms (rota em cache) a 30 s (timeout do Ollama)
+BALDES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatar_rotulos(pares):
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}"
+
+
+def _formatar_valor(valor):
+    if valor == math.inf:
+        return "+Inf"
+    if valor == -math.inf:
+        return "-Inf"
+    if isinstance(valor, float) and valor.is_integer() and abs(valor) < 1e15:
+        return str(int(valor))
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = "untyped"
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def _chave(self, rotulos):
+        if set(rotulos) != set(self.rotulos):
+            raise ValueError(f"{self.nome}: rótulos esperados {self.rotulos}, recebidos {tuple(rotulos)}")
+        return tuple(str(rotulos[r]) for r in self.rotulos)
+
+    def _amostras(self):
+        with self._lock:
+            itens = list(self._valores.items())
+        return [(self.nome, tuple(zip(self.rotulos, chave)), valor) for chave, valor in itens]
+
+    def expor(self):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+        for nome, pares, valor in self._amostras():
+            linhas.append(f"{nome}{_formatar_rotulos(pares)} {_formatar_valor(valor)}")
+        return linhas
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def inc(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valor(self, **rotulos):
+        with self._lock:
+            return self._valores.get(self._chave(rotulos), 0)
+
+
+class Medidor(_Metrica):
+    tipo = "gauge"
+
+    def __init__(self, nome, ajuda, rotulos=(), funcao=None):
+        super().__init__(nome, ajuda, rotulos)
+        # funcao() -> número (sem rótulos) ou {tupla de valores dos rótulos: número}
+        self.funcao = funcao
+
+    def set(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = valor
+
+    def inc(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def _amostras(self):
+        if self.funcao is None:
+            return super()._amostras()
+        lido = self.funcao()
+        if not isinstance(lido, dict):
+            lido = {(): lido}
+        return [(self.nome, tuple(zip(self.rotulos, map(str, chave))), valor)
+                for chave, valor in lido.items() if valor is not None]
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, rotulos=(), baldes=BALDES_LATENCIA):
+        super().__init__(nome, ajuda, rotulos)
+        self.baldes = tuple(sorted(baldes))
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            serie = self._valores.get(chave)
+            if serie is None:
+                # [contagem por balde (não cumulativa)..., +Inf], soma
+                serie = self._valores[chave] = [[0] * (len(self.baldes) + 1), 0.0]
+            i = 0
+            while i < len(self.baldes) and valor > self.baldes[i]:
+                i += 1
+            serie[0][i] += 1
+            serie[1] += valor
+
+    @contextmanager
+    def cronometrar(self, **rotulos):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def _amostras(self):
+        with self._lock:
+            itens = [(chave, list(contagens), soma) for chave, (contagens, soma) in self._valores.items()]
+        amostras = []
+        for chave, contagens, soma in itens:
+            pares = tuple(zip(self.rotulos, chave))
+            acumulado = 0
+            for limite, n in zip(self.baldes + (math.inf,), contagens):
+                acumulado += n
+                amostras.append((f"{self.nome}_bucket", pares + (("le", _formatar_valor(float(limite))),), acumulado))
+            amostras.append((f"{self.nome}_sum", pares, soma))
+            amostras.append((f"{self.nome}_count", pares, acumulado))
+        return amostras
+
+
+class _Coletor(Medidor):
+    def __init__(self, nome, tipo, ajuda, rotulos, funcao):
+        super().__init__(nome, ajuda, rotulos, funcao)
+        self.tipo = tipo
+
+
+class Registro:
+    """Conjunto de métricas expostas juntas em /metrics."""
+
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _adicionar(self, metrica):
+        with self._lock:
+            if metrica.nome in self._metricas:
+                raise ValueError(f"métrica duplicada: {metrica.nome}")
+            self._metricas[metrica.nome] = metrica
+        return metrica
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._adicionar(Contador(nome, ajuda, rotulos))
+
+    def medidor(self, nome, ajuda, rotulos=(), funcao=None):
+        return self._adicionar(Medidor(nome, ajuda, rotulos, funcao))
+
+    def histograma(self, nome, ajuda, rotulos=(), baldes=BALDES_LATENCIA):
+        return self._adicionar(Histograma(nome, ajuda, rotulos, baldes))
+
+    def coletor(self, nome, tipo, ajuda, rotulos, funcao):
+        """Métrica lida de `funcao()` a cada coleta (mesmo retorno de `Medidor(funcao=)`)."""
+        return self._adicionar(_Coletor(nome, tipo, ajuda, rotulos, funcao))
+
+    def texto(self):
+        with self._lock:
+            metricas = list(self._metricas.values())
+        linhas = []
+        for metrica in metricas:
+            try:
+                linhas.extend(metrica.expor())
+            except Exception as e:
+                # Um coletor quebrado não derruba a coleta inteira
+                linhas.append(f"# ERRO {metrica.nome}: {_escapar(e)}")
+        return "\n".join(linhas) + "\n"
+
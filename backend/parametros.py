@@ -0,0 +1,68 @@
+"""
+Parâmetros agronômicos da estufa (tomate cereja): faixas ideais e limiares.
+
+Módulo sem dependências para poder ser importado fora do app Flask, como
+na sintonia offline dos setpoints do bridge (infraestrutura/sintonia.py).
+"""
+
+
+def get_estufa_parameters():
+    """Parâmetros ideais e limiares para controle da estufa (tomate cereja)."""
+    return {
+        "temperatura": {
+            "ideal_min": 18,
+            "ideal_max": 25,
+            "limiar_inferior": 15,
+            "limiar_superior": 28,
+            "acao_inferior": "Ligar aquecedor",
+            "acao_superior": "Ativar ventilação/exaustor"
+        },
+        "umidade": {
+            "ideal_min": 60,
+            "ideal_max": 80,
+            "limiar_inferior": 50,
+            "limiar_superior": 85,
+            "acao_inferior": "Ligar umidificador",
+            "acao_superior": "Ventilação forçada"
+        },
+        "co2": {
+            "ideal_min": 800,
+            "ideal_max": 1200,
+            "limiar_inferior": 800,
+            "limiar_superior": 1200,
+            "acao_inferior": "Injetar CO₂ (se disponível)",
+            "acao_superior": "Ventilar"
+        },
+        "luminosidade": {
+            "ideal_min": 200,
+            "ideal_max": 400,
+            "limiar_inferior": 200,
+            "limiar_superior": 600,
+            "acao_inferior": "Ligar LEDs",
+            "acao_superior": "Sombrear plantas"
+        },
+        "umidade_solo": {
+            "ideal_min": 20,
+            "ideal_max": 30,
+            "limiar_inferior": 20,
+            "limiar_superior": 35,
+            "acao_inferior": "Acionar irrigação",
+            "acao_superior": "Parar irrigação"
+        },
+        "ph_solo": {
+            "ideal_min": 5.5,
+            "ideal_max": 6.5,
+            "limiar_inferior": 5.5,
+            "limiar_superior": 6.8,
+            "acao_inferior": "Aplicar calcário",
+            "acao_superior": "Adicionar enxofre"
+        },
+        "ec_solo": {
+            "ideal_min": 1.5,
+            "ideal_max": 3.5,
+            "limiar_inferior": 1.5,
+            "limiar_superior": 3.5,
+            "acao_inferior": "Adubar",
+            "acao_superior": "Lavar solo com água"
+        }
+    }
@@ -0,0 +1,235 @@
+"""
+Rastreamento (tracing) leve dentro do processo.
+
+Cada requisição amostrada vira um trace: um span raiz (a rota) e spans
+filhos em volta das etapas (busca no servidor externo, análise, Ollama,
+serialização). O span atual fica num ContextVar, então os filhos se
+penduram no pai certo mesmo com várias threads; para levar o contexto a
+um executor, submeta `contextvars.copy_context().run` (ver `propagar`).
+
+* `TRACING_AMOSTRAGEM` (0 a 1, padrão 0): fração das requisições rastreadas.
+  O cabeçalho `X-Rastrear: 1` força o rastreamento de uma requisição.
+* `TRACING_MAX` (padrão 200): traces recentes guardados para /debug/traces.
+* `TRACING_ARQUIVO`: se definido, cada span terminado é anexado ao arquivo
+  no formato de eventos do Chrome (abre em chrome://tracing ou no Perfetto).
+
+Sem trace ativo, `span()` devolve um objeto nulo compartilhado: o custo
+é uma leitura de ContextVar.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
+_span_atual = contextvars.ContextVar("span_atual", default=None)
+
+# Converte perf_counter_ns (monotônico) em hora de parede
+_BASE_NS = time.time_ns() - time.perf_counter_ns()
+
+
+class _SpanNulo:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def atributo(self, **atributos):
+        pass
+
+
+SPAN_NULO = _SpanNulo()
+
+
+class Span:
+    __slots__ = ("trace", "nome", "pai", "atributos", "inicio_ns", "fim_ns", "thread", "_token")
+
+    def __init__(self, trace, nome, pai, atributos):
+        self.trace = trace
+        self.nome = nome
+        self.pai = pai
+        self.atributos = atributos
+        self.inicio_ns = 0
+        self.fim_ns = 0
+        self.thread = None
+        self._token = None
+
+    def __enter__(self):
+        self.thread = threading.current_thread().name
+        self._token = _span_atual.set(self)
+        self.inicio_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, tipo, erro, tb):
+        self.fim_ns = time.perf_counter_ns()
+        _span_atual.reset(self._token)
+        if erro is not None:
+            self.atributos["erro"] = repr(erro)
+        self.trace.terminar(self)
+        return False
+
+    def atributo(self, **atributos):
+        self.atributos.update(atributos)
+
+    @property
+    def duracao_ms(self):
+        return (self.fim_ns - self.inicio_ns) / 1e6
+
+    def evento_chrome(self):
+        """Evento completo ("ph": "X") do formato de trace do Chrome, em µs."""
+        return {
+            "name": self.nome,
+            "cat": "estufa",
+            "ph": "X",
+            "ts": (_BASE_NS + self.inicio_ns) / 1000,
+            "dur": (self.fim_ns - self.inicio_ns) / 1000,
+            "pid": os.getpid(),
+            "tid": self.thread,
+            "args": dict(self.atributos, trace=self.trace.id),
+        }
+
+
+class Trace:
+    def __init__(self, rastreador, nome):
+        self.rastreador = rastreador
+        self.id = uuid.uuid4().hex[:16]
+        self.nome = nome
+        self.inicio = time.time()
+        self.raiz = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def terminar(self, span):
+        with self._lock:
+            self.spans.append(span)
+        self.rastreador._span_terminado(self, span)
+
+    def resumo(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.inicio_ns)
+        base = self.raiz.inicio_ns
+        return {
+            "id": self.id,
+            "nome": self.nome,
+            "inicio": self.inicio,
+            "duracao_ms": round(self.raiz.duracao_ms, 3) if self.raiz.fim_ns else None,
+            "spans": [{
+                "nome": s.nome,
+                "pai": s.pai.nome if s.pai else None,
+                "inicio_ms": round((s.inicio_ns - base) / 1e6, 3),
+                "duracao_ms": round(s.duracao_ms, 3),
+                "thread": s.thread,
+                "atributos": s.atributos,
+            } for s in spans],
+        }
+
+
+class Rastreador:
+    def __init__(self, amostragem=0.0, max_traces=200, arquivo=None):
+        self.amostragem = amostragem
+        self.arquivo = arquivo
+        self._recentes = deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+        self._lock_arquivo = threading.Lock()
+        self.iniciados = 0
+
+    def iniciar(self, nome, forcar=False, **atributos):
+        """
+        Span raiz de um novo trace, ou None se a requisição não foi
+        amostrada. O chamador entra e sai do span (with ou __enter__/__exit__).
+        """
+        if not forcar and (not self.amostragem or random.random() >= self.amostragem):
+            return None
+        trace = Trace(self, nome)
+        trace.raiz = Span(trace, nome, None, atributos)
+        with self._lock:
+            self.iniciados += 1
+        return trace.raiz
+
+    def span(self, nome, **atributos):
+        """Span filho do span atual; nulo se não houver trace ativo."""
+        pai = _span_atual.get()
+        if pai is None:
+            return SPAN_NULO
+        return Span(pai.trace, nome, pai, atributos)
+
+    def atual(self):
+        return _span_atual.get() or SPAN_NULO
+
+    def rastrear(self, nome=None):
+        """Decorador: executa a função dentro de um span."""
+        def decorador(funcao):
+            rotulo = nome or funcao.__name__
+
+            @functools.wraps(funcao)
+            def envolvida(*args, **kwargs):
+                pai = _span_atual.get()
+                if pai is None:
+                    return funcao(*args, **kwargs)
+                with Span(pai.trace, rotulo, pai, {}):
+                    return funcao(*args, **kwargs)
+            return envolvida
+        return decorador
+
+    def _span_terminado(self, trace, span):
+        if span is trace.raiz:
+            with self._lock:
+                self._recentes.append(trace)
+        if self.arquivo:
+            self._anexar(span.evento_chrome())
+
+    def _anexar(self, evento):
+        # Formato "JSON Array" do Chrome: o ']' final é opcional, então
+        # cada evento é só anexado ao fim do arquivo
+        linha = json.dumps(evento, ensure_ascii=False, default=str) + ",\n"
+        with self._lock_arquivo:
+            try:
+                novo = not os.path.exists(self.arquivo) or os.path.getsize(self.arquivo) == 0
+                with open(self.arquivo, "a", encoding="utf-8") as f:
+                    f.write(("[\n" if novo else "") + linha)
+            except OSError as e:
+                print(f"DEBUG: falha ao gravar trace em {self.arquivo}: {e}")
+
+    def recentes(self, limit=20):
+        with self._lock:
+            traces = list(self._recentes)[-limit:]
+        return [t.resumo() for t in reversed(traces)]
+
+    def eventos_chrome(self, limit=20):
+        with self._lock:
+            traces = list(self._recentes)[-limit:]
+        eventos = []
+        for t in traces:
+            with t._lock:
+                eventos.extend(s.evento_chrome() for s in t.spans)
+        return {"traceEvents": eventos, "displayTimeUnit": "ms"}
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "amostragem": self.amostragem,
+                "iniciados": self.iniciados,
+                "guardados": len(self._recentes),
+                "arquivo": self.arquivo,
+            }
+
+
+def propagar(funcao):
+    """`funcao` presa ao contexto atual, para rodar em outra thread (executor)."""
+    contexto = contextvars.copy_context()
+    return functools.partial(contexto.run, funcao)
+
+
+rastreador = Rastreador(
+    amostragem=float(os.getenv("TRACING_AMOSTRAGEM", 0)),
+    max_traces=int(os.getenv("TRACING_MAX", 200)),
+    arquivo=os.getenv("TRACING_ARQUIVO") or None
+)
@@ -0,0 +1,185 @@
+"""
+Fila de geração de relatórios em segundo plano.
+
+Cada pedido vira um job com id; workers geram o arquivo fora da thread da
+requisição. Pedidos com a mesma chave (mesma versão dos dados) compartilham
+o mesmo job e o mesmo arquivo, enquanto ele estiver na fila deste processo.
+O id é aleatório, e não derivado da chave: a versão dos dados recomeça a
+cada reinício e não é a mesma entre workers, então um id derivado dela
+voltaria a apontar para um arquivo antigo. Como o arquivo leva o id, outro
+worker ainda consegue localizar o arquivo de um job que não foi ele quem
+criou, e é sempre o desse job.
+Os arquivos prontos ficam em cache com limite de tamanho total: ao estourar,
+os menos acessados recentemente são apagados.
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+PENDENTE = "pendente"
+EXECUTANDO = "executando"
+CONCLUIDO = "concluido"
+ERRO = "erro"
+EXPIRADO = "expirado"
+
+
+def novo_id_job():
+    return uuid.uuid4().hex
+
+
+class JobRelatorio:
+    __slots__ = ("id", "chave", "params", "status", "criado_em", "concluido_em",
+                 "ultimo_acesso", "arquivo", "tamanho", "erro", "pronto")
+
+    def __init__(self, chave, params):
+        self.id = novo_id_job()
+        self.chave = chave
+        self.params = params
+        self.status = PENDENTE
+        self.criado_em = time.time()
+        self.concluido_em = None
+        self.ultimo_acesso = self.criado_em
+        self.arquivo = None
+        self.tamanho = 0
+        self.erro = None
+        self.pronto = threading.Event()
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "criado_em": self.criado_em,
+            "concluido_em": self.concluido_em,
+            "arquivo": os.path.basename(self.arquivo) if self.arquivo else None,
+            "tamanho": self.tamanho,
+            "erro": self.erro,
+        }
+
+
+class FilaRelatorios:
+    """
+    `gerar(params, diretorio)` deve criar o arquivo dentro de `diretorio`
+    e retornar o caminho dele; `params["job_id"]` vem preenchido.
+    """
+
+    def __init__(self, diretorio, gerar, max_workers=2, max_bytes=50 * 1024 * 1024, max_jobs=500):
+        self.diretorio = diretorio
+        self.gerar = gerar
+        self.max_bytes = max_bytes
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="relatorio")
+        self._jobs = OrderedDict()
+        self._por_chave = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.reaproveitados = 0
+
+    def submeter(self, chave, params=None):
+        """Enfileira um relatório; se já existe um job válido com a mesma chave, reaproveita."""
+        with self._lock:
+            job_id = self._por_chave.get(chave)
+            job = self._jobs.get(job_id) if job_id else None
+            if job is not None and job.status in (PENDENTE, EXECUTANDO, CONCLUIDO):
+                job.ultimo_acesso = time.time()
+                self.reaproveitados += 1
+                return job
+            job = JobRelatorio(chave, dict(params or {}))
+            job.params["job_id"] = job.id
+            self._jobs[job.id] = job
+            self._por_chave[chave] = job.id
+            self._limitar_jobs()
+        self._executor.submit(self._executar, job)
+        return job
+
+    def obter(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.ultimo_acesso = time.time()
+            return job
+
+    def aguardar(self, job_id, timeout):
+        """Espera o job terminar por até `timeout` segundos; retorna o job (ou None)."""
+        job = self.obter(job_id)
+        if job is not None:
+            job.pronto.wait(timeout)
+        return job
+
+    def fila(self):
+        return self._executor._work_queue.qsize()
+
+    def _executar(self, job):
+        job.status = EXECUTANDO
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            caminho = self.gerar(job.params, self.diretorio)
+            tamanho = os.path.getsize(caminho)
+            with self._lock:
+                job.arquivo = caminho
+                job.tamanho = tamanho
+                job.concluido_em = time.time()
+                job.status = CONCLUIDO
+                self._bytes += tamanho
+                self._limitar_bytes(manter=job.id)
+        except Exception as e:
+            print(f"Erro ao gerar relatório {job.id}: {e}")
+            with self._lock:
+                job.erro = str(e)
+                job.status = ERRO
+                if self._por_chave.get(job.chave) == job.id:
+                    del self._por_chave[job.chave]
+        finally:
+            job.pronto.set()
+
+    # ---------- limites (chamados com o lock adquirido) ----------
+
+    def _expirar(self, job):
+        if job.arquivo:
+            try:
+                os.remove(job.arquivo)
+            except OSError:
+                pass
+            self._bytes -= job.tamanho
+        job.status = EXPIRADO
+        job.arquivo = None
+        job.tamanho = 0
+        if self._por_chave.get(job.chave) == job.id:
+            del self._por_chave[job.chave]
+
+    def _limitar_bytes(self, manter=None):
+        if self._bytes <= self.max_bytes:
+            return
+        prontos = sorted(
+            (j for j in self._jobs.values() if j.status == CONCLUIDO and j.id != manter),
+            key=lambda j: j.ultimo_acesso
+        )
+        for job in prontos:
+            if self._bytes <= self.max_bytes:
+                break
+            self._expirar(job)
+
+    def _limitar_jobs(self):
+        while len(self._jobs) > self.max_jobs:
+            antigo = next((j for j in self._jobs.values() if j.status not in (PENDENTE, EXECUTANDO)), None)
+            if antigo is None:
+                break
+            if antigo.status == CONCLUIDO:
+                self._expirar(antigo)
+            del self._jobs[antigo.id]
+
+    def estatisticas(self):
+        with self._lock:
+            por_status = {}
+            for j in self._jobs.values():
+                por_status[j.status] = por_status.get(j.status, 0) + 1
+            return {
+                "jobs": por_status,
+                "bytes_em_cache": self._bytes,
+                "max_bytes": self.max_bytes,
+                "reaproveitados": self.reaproveitados,
+                "fila": self.fila(),
+            }
@@ -0,0 +1,191 @@
+"""
+Saúde das dependências externas (servidor da estufa e Ollama).
+
+Cada dependência tem um disjuntor (circuit breaker): depois de algumas
+falhas seguidas ele abre e as chamadas são recusadas na hora, sem esperar
+timeout. Passado o tempo de abertura, o disjuntor fica meio-aberto e deixa
+passar uma única chamada de teste: se ela der certo, fecha; se falhar, abre
+de novo por um tempo que dobra a cada falha (até um teto).
+
+O monitor roda numa thread e sonda cada dependência periodicamente, mas só
+quando ela não foi usada recentemente: o tráfego real já informa o disjuntor.
+As rotas de saúde leem o estado em cache, sem chamadas de rede.
+"""
+
+import threading
+import time
+
+FECHADO = "fechado"
+ABERTO = "aberto"
+MEIO_ABERTO = "meio_aberto"
+
+
+class CircuitBreaker:
+    """Disjuntor thread-safe com abertura exponencial."""
+
+    def __init__(self, nome, limite_falhas=3, abertura_inicial=2.0, abertura_max=120.0,
+                 timeout_teste=60.0):
+        self.nome = nome
+        self.limite_falhas = limite_falhas
+        self.abertura_inicial = abertura_inicial
+        self.abertura_max = abertura_max
+        # Se a chamada de teste nunca reportar o resultado, libera outra depois disso
+        self.timeout_teste = timeout_teste
+        self.estado = FECHADO
+        self.falhas_seguidas = 0
+        self.abertura = abertura_inicial
+        self.reabre_em = 0.0
+        self.teste_desde = None
+        self.ultimo_sucesso = None
+        self.ultima_falha = None
+        self.ultimo_erro = None
+        self.recusadas = 0
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        """True se a chamada pode seguir; False se deve falhar/usar fallback já."""
+        now = time.time()
+        with self._lock:
+            if self.estado == FECHADO:
+                return True
+            if self.estado == ABERTO and now >= self.reabre_em:
+                self.estado = MEIO_ABERTO
+                self.teste_desde = None
+            if self.estado == MEIO_ABERTO and (
+                    self.teste_desde is None or now - self.teste_desde > self.timeout_teste):
+                self.teste_desde = now
+                return True
+            self.recusadas += 1
+            return False
+
+    def sucesso(self):
+        with self._lock:
+            self.estado = FECHADO
+            self.falhas_seguidas = 0
+            self.abertura = self.abertura_inicial
+            self.teste_desde = None
+            self.ultimo_sucesso = time.time()
+
+    def falha(self, erro=None):
+        now = time.time()
+        with self._lock:
+            self.ultima_falha = now
+            self.ultimo_erro = str(erro) if erro is not None else None
+            self.falhas_seguidas += 1
+            if self.estado == MEIO_ABERTO:
+                # Teste falhou: reabre por mais tempo
+                self.abertura = min(self.abertura * 2, self.abertura_max)
+                self._abrir(now)
+            elif self.estado == FECHADO and self.falhas_seguidas >= self.limite_falhas:
+                self._abrir(now)
+
+    def _abrir(self, now):
+        self.estado = ABERTO
+        self.reabre_em = now + self.abertura
+        self.teste_desde = None
+        print(f"DEBUG: Disjuntor '{self.nome}' aberto por {self.abertura:.0f}s ({self.ultimo_erro})")
+
+    def disponivel(self):
+        """Fechado e sem falhas desde o último sucesso."""
+        return self.estado == FECHADO and self.falhas_seguidas == 0
+
+    def ultima_atividade(self):
+        return max(self.ultimo_sucesso or 0.0, self.ultima_falha or 0.0)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "estado": self.estado,
+                "falhas_seguidas": self.falhas_seguidas,
+                "abertura_s": self.abertura,
+                "reabre_em": self.reabre_em if self.estado != FECHADO else None,
+                "ultimo_sucesso": self.ultimo_sucesso,
+                "ultima_falha": self.ultima_falha,
+                "ultimo_erro": self.ultimo_erro,
+                "recusadas": self.recusadas,
+            }
+
+
+class MonitorSaude:
+    """
+    Sonda as dependências em segundo plano e guarda o último resultado.
+
+    `registrar(nome, disjuntor, sonda)`: `sonda()` faz uma chamada barata e
+    levanta exceção (ou retorna False) se a dependência estiver fora.
+    """
+
+    def __init__(self, intervalo=15.0):
+        self.intervalo = intervalo
+        self._dependencias = {}
+        self._status = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def registrar(self, nome, disjuntor, sonda):
+        self._dependencias[nome] = (disjuntor, sonda)
+        self._status[nome] = {"ok": None, "verificado_em": None, "latencia_ms": None, "erro": None}
+
+    def sondar(self, nome):
+        disjuntor, sonda = self._dependencias[nome]
+        inicio = time.time()
+        try:
+            ok = sonda() is not False
+            erro = None if ok else "resposta inválida"
+        except Exception as e:
+            ok, erro = False, str(e)
+        fim = time.time()
+        if ok:
+            disjuntor.sucesso()
+        else:
+            disjuntor.falha(erro)
+        with self._lock:
+            self._status[nome] = {
+                "ok": ok,
+                "verificado_em": fim,
+                "latencia_ms": round((fim - inicio) * 1000, 1),
+                "erro": erro,
+            }
+        return ok
+
+    def _precisa_sondar(self, disjuntor, now):
+        if disjuntor.estado == FECHADO:
+            # Tráfego real recente já diz se está de pé; depois de uma falha,
+            # confirma logo para abrir o disjuntor sem esperar o intervalo todo
+            espera = disjuntor.abertura_inicial if disjuntor.falhas_seguidas else self.intervalo
+            return now - disjuntor.ultima_atividade() >= espera
+        return disjuntor.estado == ABERTO and now >= disjuntor.reabre_em
+
+    def _laco(self):
+        while True:
+            now = time.time()
+            for nome, (disjuntor, _) in list(self._dependencias.items()):
+                try:
+                    if self._precisa_sondar(disjuntor, now) and disjuntor.permitir():
+                        self.sondar(nome)
+                except Exception as e:
+                    print(f"DEBUG: Erro ao sondar {nome}: {e}")
+            time.sleep(1)
+
+    def iniciar(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._laco, daemon=True, name="monitor-saude")
+            self._thread.start()
+
+    def disponivel(self, nome):
+        """
+        True/False pelo disjuntor; None enquanto a dependência não teve
+        nenhum resultado (sonda ou tráfego real), em vez do True do disjuntor novo.
+        """
+        disjuntor = self._dependencias[nome][0]
+        if not disjuntor.ultima_atividade():
+            return None
+        return disjuntor.disponivel()
+
+    def estado(self):
+        """Status em cache de cada dependência (sem chamadas de rede)."""
+        with self._lock:
+            status = {nome: dict(s) for nome, s in self._status.items()}
+        for nome, (disjuntor, _) in self._dependencias.items():
+            status[nome]["disjuntor"] = disjuntor.estatisticas()
+            status[nome]["disponivel"] = self.disponivel(nome)
+        return status
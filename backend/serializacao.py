@@ -0,0 +1,200 @@
+"""
+Serialização das respostas JSON das rotas de dados.
+
+Usa orjson quando instalado (bem mais rápido e já devolve bytes) e cai no
+json da biblioteca padrão caso contrário. Nos dois casos as chaves saem
+ordenadas, como no jsonify do Flask. A diferença é o NaN: o jsonify e o
+json da biblioteca padrão escrevem `NaN`, que não é JSON válido e quebra o
+JSON.parse do navegador; o orjson escreve `null`. `CacheSerializacao` guarda, por
+versão do snapshot, tanto estruturas intermediárias (ex.: as linhas já
+convertidas para float) quanto os bytes finais de cada payload, de modo que
+cada payload distinto é montado e codificado uma única vez por versão.
+Com tracemalloc ativo (ex.: PYTHONTRACEMALLOC=1), também registra a memória
+alocada para montar e codificar cada payload.
+
+Para o gráfico há também um formato binário colunar (/series.bin):
+
+    cabeçalho (16 bytes, little-endian):
+        "ESTB" | formato: uint16 | n_colunas: uint16 | n_pontos: uint32 | reservado: uint32
+    n_colunas nomes ASCII de 24 bytes (completados com zeros)
+    n_colunas colunas de n_pontos valores de 4 bytes cada: a primeira é
+    int32 (segundos desde 1970), as demais float32 (NaN = sem leitura)
+
+Todos os offsets são múltiplos de 4, então o navegador lê cada coluna com
+uma view (Int32Array/Float32Array) direto sobre o ArrayBuffer, sem cópia.
+"""
+
+import json
+import struct
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+from flask import Response
+
+from rastreamento import rastreador
+
+try:
+    import orjson
+except ImportError:  # opcional: sem o pacote, usa o json da biblioteca padrão
+    orjson = None
+
+CODIFICADOR = "orjson" if orjson is not None else "json"
+
+
+def dumps(obj):
+    """Codifica `obj` em JSON (bytes UTF-8)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+
+def resposta_json(corpo, status=200):
+    """Resposta Flask a partir de bytes já codificados (ou de um objeto a codificar)."""
+    if not isinstance(corpo, bytes):
+        corpo = dumps(corpo)
+    return Response(corpo, status=status, mimetype="application/json")
+
+
+MAGICO_BIN = b"ESTB"
+FORMATO_BIN = 1
+_CABECALHO_BIN = struct.Struct("<4sHHII")
+TAMANHO_NOME_BIN = 24
+
+
+def colunas_de_linhas(linhas, campos):
+    """
+    Linhas tipadas (dicts com 'timestamp') -> colunas numpy em ordem
+    cronológica: 'epoch' (int32) e um float32 por campo.
+    """
+    linhas = [l for l in linhas if l is not None]
+    textos = [l["timestamp"][:19].replace(" ", "T") for l in linhas]
+    try:
+        datas = np.array(textos, dtype="datetime64[s]")
+    except ValueError:
+        datas = np.array([_data_ou_nat(t) for t in textos], dtype="datetime64[s]")
+    epoch = np.where(np.isnat(datas), 0, datas.astype(np.int64))
+    ordem = np.argsort(epoch, kind="stable")
+    colunas = {"epoch": epoch[ordem].astype("<i4")}
+    for campo in campos:
+        valores = np.fromiter(
+            (np.nan if l.get(campo) is None else l[campo] for l in linhas),
+            dtype=np.float64, count=len(linhas)
+        )
+        colunas[campo] = valores[ordem].astype("<f4")
+    return colunas
+
+
+def _data_ou_nat(texto):
+    try:
+        return np.datetime64(texto, "s")
+    except ValueError:
+        return np.datetime64("NaT", "s")
+
+
+def partes_binarias(colunas, limit=None):
+    """
+    Cabeçalho + colunas (últimos `limit` pontos) como lista de buffers; as
+    colunas são views das arrays originais, sem cópia.
+    """
+    nomes = list(colunas)
+    fatias = [colunas[n][-limit:] if limit else colunas[n] for n in nomes]
+    n = len(fatias[0]) if fatias else 0
+    partes = [_CABECALHO_BIN.pack(MAGICO_BIN, FORMATO_BIN, len(nomes), n, 0)]
+    partes.extend(nome.encode("ascii")[:TAMANHO_NOME_BIN].ljust(TAMANHO_NOME_BIN, b"\0") for nome in nomes)
+    partes.extend(memoryview(f).cast("B") for f in fatias)
+    return partes
+
+
+def resposta_binaria(partes):
+    return Response(partes, mimetype="application/octet-stream",
+                    headers={"Content-Length": str(sum(len(p) for p in partes))})
+
+
+class CacheSerializacao:
+    """Valores e payloads codificados da versão atual do snapshot."""
+
+    def __init__(self, max_entradas=256):
+        self.max_entradas = max_entradas
+        self._versao = None
+        self._valores = {}
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.codificacoes = 0
+        self.tempo_montagem = 0.0
+        self.tempo_codificacao = 0.0
+        self.bytes_codificados = 0
+        self.alocado_bytes = 0
+
+    def _obter(self, versao, chave):
+        with self._lock:
+            if self._versao != versao:
+                self._versao = versao
+                self._valores = {}
+            if chave in self._valores:
+                self.acertos += 1
+                return True, self._valores[chave]
+        return False, None
+
+    def _guardar(self, versao, chave, valor):
+        with self._lock:
+            if self._versao == versao:
+                if len(self._valores) >= self.max_entradas:
+                    self._valores.pop(next(iter(self._valores)))
+                self._valores[chave] = valor
+
+    def memo(self, versao, chave, construir):
+        """Valor de `construir()` memorizado enquanto a versão não mudar (None não é memorizado)."""
+        achou, valor = self._obter(versao, chave)
+        if achou:
+            return valor
+        valor = construir()
+        if valor is not None:
+            self._guardar(versao, chave, valor)
+        return valor
+
+    def bytes(self, versao, chave, construir):
+        """JSON (bytes) do payload `construir()`, montado e codificado uma vez por versão."""
+        achou, corpo = self._obter(versao, ("json", chave))
+        if achou:
+            return corpo
+        rastreando = tracemalloc.is_tracing()
+        if rastreando:
+            tracemalloc.reset_peak()
+            antes = tracemalloc.get_traced_memory()[0]
+        inicio = time.perf_counter()
+        with rastreador.span("serializacao.montar", chave=repr(chave)):
+            payload = construir()
+        meio = time.perf_counter()
+        with rastreador.span("serializacao.codificar", codificador=CODIFICADOR) as span:
+            corpo = dumps(payload)
+            span.atributo(bytes=len(corpo))
+        fim = time.perf_counter()
+        with self._lock:
+            self.codificacoes += 1
+            self.tempo_montagem += meio - inicio
+            self.tempo_codificacao += fim - meio
+            self.bytes_codificados += len(corpo)
+            if rastreando:
+                self.alocado_bytes += tracemalloc.get_traced_memory()[1] - antes
+        self._guardar(versao, ("json", chave), corpo)
+        return corpo
+
+    def resposta(self, versao, chave, construir):
+        return resposta_json(self.bytes(versao, chave, construir))
+
+    def estatisticas(self):
+        with self._lock:
+            n = self.codificacoes or 1
+            return {
+                "codificador": CODIFICADOR,
+                "versao": self._versao,
+                "entradas": len(self._valores),
+                "acertos": self.acertos,
+                "codificacoes": self.codificacoes,
+                "montagem_media_ms": round(self.tempo_montagem / n * 1000, 3),
+                "codificacao_media_ms": round(self.tempo_codificacao / n * 1000, 3),
+                "bytes_medios": self.bytes_codificados // n,
+                "alocacao_media_bytes": self.alocado_bytes // n if tracemalloc.is_tracing() else None,
+            }
@@ -0,0 +1,121 @@
+"""
+Estado compartilhado entre workers (modo multi-worker).
+
+Um único worker é o dono da ingestão: ele busca os dados no servidor
+externo e publica o snapshot num SQLite local (WAL). Os demais workers
+apenas leem o snapshot quando a versão muda. A posse é decidida por um
+lock de arquivo (flock), liberado automaticamente se o dono morrer.
+
+O último snapshot também é gravado em JSON no disco para que um processo
+recém-iniciado tenha o que servir antes da primeira ingestão (warm start).
+"""
+
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class SnapshotCompartilhado:
+    """Snapshot versionado dos dados da estufa, gravado em SQLite."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._local = threading.local()
+        self._conn().execute("""
+            CREATE TABLE IF NOT EXISTS snapshot (
+                chave TEXT PRIMARY KEY,
+                versao INTEGER NOT NULL,
+                atualizado_em REAL NOT NULL,
+                payload TEXT NOT NULL
+            )
+        """)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def publicar(self, payload, chave="dados"):
+        """Grava um novo snapshot e retorna a versão publicada."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT versao FROM snapshot WHERE chave = ?", (chave,)).fetchone()
+            versao = (row[0] if row else 0) + 1
+            conn.execute(
+                "INSERT OR REPLACE INTO snapshot (chave, versao, atualizado_em, payload) VALUES (?, ?, ?, ?)",
+                (chave, versao, time.time(), json.dumps(payload, default=str))
+            )
+            conn.execute("COMMIT")
+            return versao
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def versao(self, chave="dados"):
+        row = self._conn().execute("SELECT versao FROM snapshot WHERE chave = ?", (chave,)).fetchone()
+        return row[0] if row else 0
+
+    def ler_se_mais_novo(self, versao_atual, chave="dados"):
+        """Retorna (versao, atualizado_em, payload) se houver versão mais nova, senão None."""
+        row = self._conn().execute(
+            "SELECT versao, atualizado_em, payload FROM snapshot WHERE chave = ? AND versao > ?",
+            (chave, versao_atual)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+
+def adquirir_lideranca(caminho_lock):
+    """
+    Tenta virar dono da ingestão. Retorna o arquivo do lock (que deve ser
+    mantido aberto enquanto o processo for dono) ou None se outro já é.
+    """
+    pasta = os.path.dirname(caminho_lock)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    f = open(caminho_lock, "a+")
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    f.seek(0)
+    f.truncate()
+    f.write(str(os.getpid()))
+    f.flush()
+    return f
+
+
+def salvar_json_atomico(caminho, payload):
+    """Grava JSON via arquivo temporário + rename: quem lê nunca vê um arquivo pela metade."""
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    tmp = f"{caminho}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, default=str)
+    os.replace(tmp, caminho)
+
+
+def carregar_json(caminho):
+    """Lê um JSON gravado por `salvar_json_atomico`; None se ausente ou inválido."""
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        print(f"DEBUG: Snapshot inválido em {caminho}: {e}")
+        return None
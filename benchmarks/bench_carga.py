@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Teste de carga ponta a ponta do backend, sem o Pi e sem o Ollama reais.
+
+Sobe o stub do Pi (benchmarks/stub_pi.py), o stub do Ollama
+(benchmarks/stub_ollama.py) e o backend via gunicorn, e simula usuários:
+
+* dashboard: o que o frontend faz a cada tick, isto é, /registros?limit=20 e
+  /series.bin?limit=20 com If-None-Match;
+* chat: POST /chat na mesma sessão, alternando perguntas respondidas
+  pelas regras locais e perguntas abertas que vão ao Ollama.
+
+O mix define a fração de usuários de cada tipo. Para cada rota, o
+relatório mostra req/s, p50/p95/p99 e a amplificação: chamadas ao Pi e ao
+Ollama por requisição. A amplificação é medida rodando cada rota sozinha
+por `--isolar-s` segundos, já descontadas as chamadas de fundo da
+ingestão. Os resultados vão para benchmarks/resultados/, e `--comparar`
+mostra a diferença para uma rodada anterior.
+
+    python3 benchmarks/bench_carga.py --mix misto --usuarios 16 --duracao 20
+    python3 benchmarks/bench_carga.py --mix dashboard --pensar-ms 5000 --usuarios 200 \\
+        --comparar benchmarks/resultados/carga_dashboard_<data>.json
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import stub_ollama  # noqa: E402
+import stub_pi  # noqa: E402
+from bench_multiworker import BACKEND_DIR, aguardar_backend  # noqa: E402
+
+RAIZ = os.path.dirname(BACKEND_DIR)
+RESULTADOS_DIR = os.path.join(RAIZ, "benchmarks", "resultados")
+
+# nome: (método, URL, usa If-None-Match)
+REQUISICOES = {
+    "/registros": ("GET", "/registros?limit=20", True),
+    "/series.bin": ("GET", "/series.bin?limit=20", True),
+    "/chat": ("POST", "/chat", False),
+}
+USUARIOS = {
+    "dashboard": ["/registros", "/series.bin"],
+    "chat": ["/chat"],
+}
+MIXES = {
+    "dashboard": {"dashboard": 1.0},
+    "chat": {"chat": 1.0},
+    "misto": {"dashboard": 0.9, "chat": 0.1},
+}
+PERGUNTAS = (
+    "qual é a temperatura?",
+    "como está a umidade?",
+    "como está a luminosidade?",
+    "quais pragas atacam o tomate cereja?",
+    "que adubo devo usar nesta fase?",
+)
+
+
+def percentil(ordenados, p):
+    if not ordenados:
+        return None
+    i = min(len(ordenados) - 1, max(0, int(round(p / 100 * len(ordenados))) - 1))
+    return ordenados[i]
+
+
+def _usuario(sequencia, porta, fim, pensar_s, seed, saida):
+    """Um usuário em laço fechado; acumula {rota: {"ms": [...], "erros": n, "304": n}} em `saida`."""
+    rnd = random.Random(seed)
+    conn = http.client.HTTPConnection("127.0.0.1", porta, timeout=30)
+    etags = {}
+    sessao = None
+    while time.perf_counter() < fim:
+        for nome in sequencia:
+            metodo, url, condicional = REQUISICOES[nome]
+            cabecalhos, corpo = {}, None
+            if condicional and url in etags:
+                cabecalhos["If-None-Match"] = etags[url]
+            if metodo == "POST":
+                corpo = json.dumps({"mensagem": rnd.choice(PERGUNTAS), "session_id": sessao})
+                cabecalhos["Content-Type"] = "application/json"
+            r = saida.setdefault(nome, {"ms": [], "erros": 0, "304": 0})
+            inicio = time.perf_counter()
+            try:
+                conn.request(metodo, url, body=corpo, headers=cabecalhos)
+                resp = conn.getresponse()
+                dados = resp.read()
+            except Exception:
+                r["erros"] += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", porta, timeout=30)
+                continue
+            r["ms"].append((time.perf_counter() - inicio) * 1000)
+            if resp.status == 304:
+                r["304"] += 1
+            elif resp.status != 200:
+                r["erros"] += 1
+            if resp.getheader("ETag"):
+                etags[url] = resp.getheader("ETag")
+            if metodo == "POST" and resp.status == 200:
+                sessao = json.loads(dados).get("session_id", sessao)
+        if pensar_s:
+            time.sleep(pensar_s * rnd.uniform(0.5, 1.5))
+
+
+def _processo(args):
+    sequencias, porta, duracao, pensar_s, seed = args
+    fim = time.perf_counter() + duracao
+    saidas = [{} for _ in sequencias]
+    threads = [threading.Thread(target=_usuario, args=(seq, porta, fim, pensar_s, seed + i, saidas[i]))
+               for i, seq in enumerate(sequencias)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    juntos = {}
+    for saida in saidas:
+        for nome, r in saida.items():
+            total = juntos.setdefault(nome, {"ms": [], "erros": 0, "304": 0})
+            total["ms"].extend(r["ms"])
+            total["erros"] += r["erros"]
+            total["304"] += r["304"]
+    return juntos
+
+
+def disparar(sequencias, porta, duracao, pensar_s, processos, seed=0):
+    """Distribui os usuários entre processos clientes; devolve o acumulado por rota."""
+    processos = max(1, min(processos, len(sequencias)))
+    lotes = [sequencias[i::processos] for i in range(processos)]
+    with multiprocessing.Pool(processos) as pool:
+        parciais = pool.map(_processo, [(lote, porta, duracao, pensar_s, seed + 1000 * i)
+                                        for i, lote in enumerate(lotes)])
+    juntos = {}
+    for parcial in parciais:
+        for nome, r in parcial.items():
+            total = juntos.setdefault(nome, {"ms": [], "erros": 0, "304": 0})
+            total["ms"].extend(r["ms"])
+            total["erros"] += r["erros"]
+            total["304"] += r["304"]
+    return juntos
+
+
+def usuarios_do_mix(mix, n):
+    """
+    `n` usuários na proporção do mix, com pelo menos um de cada tipo de
+    fração > 0; ValueError se `n` não comporta todos os tipos.
+    """
+    pesos = {tipo: fracao for tipo, fracao in MIXES[mix].items() if fracao > 0}
+    if n < len(pesos):
+        raise ValueError(f"o mix {mix} precisa de pelo menos {len(pesos)} usuários (--usuarios {n})")
+    quantos = {tipo: max(1, round(n * fracao)) for tipo, fracao in pesos.items()}
+    # Acerta o total em n mexendo no tipo mais longe da proporção, sem zerar nenhum
+    while sum(quantos.values()) > n:
+        tipo = max((t for t in quantos if quantos[t] > 1), key=lambda t: quantos[t] - n * pesos[t])
+        quantos[tipo] -= 1
+    while sum(quantos.values()) < n:
+        tipo = max(quantos, key=lambda t: n * pesos[t] - quantos[t])
+        quantos[tipo] += 1
+    sequencias = []
+    for tipo, k in quantos.items():
+        sequencias += [USUARIOS[tipo]] * k
+    return sequencias
+
+
+def chamadas(stub_pi_, stub_llm):
+    return sum(stub_pi_.stats().values()), sum(stub_llm.stats().values())
+
+
+def amplificacao(nome, args, stub_pi_, stub_llm, fundo):
+    """Chamadas ao Pi e ao Ollama por requisição de `nome`, rodando só essa rota."""
+    antes = chamadas(stub_pi_, stub_llm)
+    inicio = time.perf_counter()
+    r = disparar([[nome]] * args.usuarios, args.porta, args.isolar_s, 0, args.processos, seed=7)
+    dur = time.perf_counter() - inicio
+    depois = chamadas(stub_pi_, stub_llm)
+    n = len(r.get(nome, {}).get("ms", [])) or 1
+    return {
+        "pi_por_req": max(0.0, (depois[0] - antes[0] - fundo[0] * dur)) / n,
+        "ollama_por_req": max(0.0, (depois[1] - antes[1] - fundo[1] * dur)) / n,
+    }
+
+
+def commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def comparar(atual, arquivo):
+    with open(arquivo) as f:
+        anterior = {r["rota"]: r for r in json.load(f)["rotas"]}
+    print(f"\ncomparação com {arquivo}:")
+    print(f"{'rota':<14} {'req/s':>24} {'p95 ms':>24} {'p99 ms':>24}")
+    for r in atual:
+        a = anterior.get(r["rota"])
+        if not a:
+            continue
+        celulas = []
+        for campo in ("req_s", "p95_ms", "p99_ms"):
+            antes, agora = a[campo], r[campo]
+            if not antes or agora is None:
+                celulas.append(f"{'-':>24}")
+            else:
+                celulas.append(f"{antes:.1f} → {agora:.1f} ({agora / antes - 1:+.0%})".rjust(24))
+        print(f"{r['rota']:<14} " + " ".join(celulas))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--mix", choices=sorted(MIXES), default="misto")
+    ap.add_argument("--usuarios", type=int, default=16)
+    ap.add_argument("--duracao", type=float, default=20.0)
+    ap.add_argument("--pensar-ms", type=float, default=0.0,
+                    help="pausa média entre ciclos de cada usuário (o dashboard real usa 5000)")
+    ap.add_argument("--processos", type=int, default=max(1, os.cpu_count() // 2))
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--porta", type=int, default=5300)
+    ap.add_argument("--historico", type=int, default=1000)
+    ap.add_argument("--latencia-pi-ms", type=float, default=20.0)
+    ap.add_argument("--tokens-s", type=float, default=20.0)
+    ap.add_argument("--ttft-ms", type=float, default=300.0)
+    ap.add_argument("--tokens", type=int, default=40)
+    ap.add_argument("--isolar-s", type=float, default=5.0,
+                    help="duração da medida de amplificação por rota (0 desativa)")
+    ap.add_argument("--saida", help="arquivo de resultados (padrão: benchmarks/resultados/carga_<mix>_<data>.json)")
+    ap.add_argument("--comparar", help="resultado anterior para comparar")
+    args = ap.parse_args()
+    try:
+        sequencias = usuarios_do_mix(args.mix, args.usuarios)
+    except ValueError as e:
+        ap.error(str(e))
+
+    stub, servidor_pi = stub_pi.iniciar_em_thread(historico=args.historico, latencia_ms=args.latencia_pi_ms)
+    llm, servidor_llm = stub_ollama.iniciar_em_thread(tokens_s=args.tokens_s, ttft_ms=args.ttft_ms,
+                                                      tokens=args.tokens)
+    env = dict(os.environ,
+               EXTERNAL_SERVER_URL=f"http://127.0.0.1:{servidor_pi.server_address[1]}",
+               OLLAMA_URL=f"http://127.0.0.1:{servidor_llm.server_address[1]}/api/chat",
+               WEB_CONCURRENCY=str(args.workers),
+               GUNICORN_THREADS=str(args.threads),
+               GUNICORN_BIND=f"127.0.0.1:{args.porta}",
+               ESTADO_DIR=tempfile.mkdtemp(prefix="estufa_carga_"))
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+                            cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not aguardar_backend(args.porta):
+            sys.exit("backend não ficou pronto")
+
+        # Chamadas de fundo (ingestão, sondas) por segundo, sem tráfego; a
+        # janela cobre alguns ciclos da ingestão (INGESTAO_INTERVALO=5 s)
+        janela = max(args.isolar_s, 10.0) if args.isolar_s else 0.0
+        antes = chamadas(stub, llm)
+        time.sleep(janela)
+        depois = chamadas(stub, llm)
+        fundo = [(d - a) / janela if janela else 0.0 for a, d in zip(antes, depois)]
+
+        antes = chamadas(stub, llm)
+        brutos = disparar(sequencias, args.porta, args.duracao, args.pensar_ms / 1000, args.processos)
+        depois = chamadas(stub, llm)
+
+        rotas = []
+        for nome, r in sorted(brutos.items()):
+            ms = sorted(r["ms"])
+            rotas.append({
+                "rota": nome,
+                "requisicoes": len(ms),
+                "req_s": len(ms) / args.duracao,
+                "erros": r["erros"],
+                "fracao_304": r["304"] / len(ms) if ms else 0.0,
+                "p50_ms": percentil(ms, 50),
+                "p95_ms": percentil(ms, 95),
+                "p99_ms": percentil(ms, 99),
+            })
+        if args.isolar_s:
+            for r in rotas:
+                r.update(amplificacao(r["rota"], args, stub, llm, fundo))
+
+        total = sum(r["requisicoes"] for r in rotas)
+        print(f"mix {args.mix}: {len(sequencias)} usuários, {args.duracao:.0f} s, "
+              f"{args.workers} worker(s) x {args.threads} threads")
+        print(f"{'rota':<14} {'req/s':>8} {'erros':>6} {'304':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+              f" {'Pi/req':>7} {'LLM/req':>8}")
+        for r in rotas:
+            print(f"{r['rota']:<14} {r['req_s']:>8.1f} {r['erros']:>6} {r['fracao_304']:>5.0%} "
+                  f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f}"
+                  f" {r.get('pi_por_req', float('nan')):>7.3f} {r.get('ollama_por_req', float('nan')):>8.3f}")
+        print(f"total: {total / args.duracao:.1f} req/s; chamadas ao Pi {depois[0] - antes[0]}, "
+              f"ao Ollama {depois[1] - antes[1]} (fundo: {fundo[0]:.2f}/s e {fundo[1]:.2f}/s)")
+
+        resultado = {
+            "commit": commit_atual(),
+            "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "cpus": os.cpu_count(),
+            "config": vars(args),
+            "total_req_s": total / args.duracao,
+            "chamadas_pi": depois[0] - antes[0],
+            "chamadas_ollama": depois[1] - antes[1],
+            "fundo_por_s": {"pi": fundo[0], "ollama": fundo[1]},
+            "rotas": rotas,
+        }
+        saida = args.saida
+        if not saida:
+            os.makedirs(RESULTADOS_DIR, exist_ok=True)
+            saida = os.path.join(RESULTADOS_DIR, f"carga_{args.mix}_{time.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(saida, "w") as f:
+            json.dump(resultado, f, indent=2)
+        print(f"resultados em {saida}")
+
+        if args.comparar:
+            comparar(rotas, args.comparar)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=15)
+
+
+if __name__ == "__main__":
+    main()
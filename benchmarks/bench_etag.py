@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Bytes e CPU por polling do dashboard, com e sem o cache HTTP das rotas de dados.
+
+Sobe o stub do Pi, importa o backend no próprio processo e compara, para
+cada rota, três formas de atender o mesmo polling enquanto o snapshot não muda:
+
+* sem cache: a rota original (serializa e manda o JSON inteiro);
+* 200 comprimido: corpo já serializado e comprimido, vindo do cache;
+* 304: o cliente manda o ETag em If-None-Match e não recebe corpo.
+
+    python3 benchmarks/bench_etag.py --polls 2000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+sys.path.insert(0, os.path.join(RAIZ, "backend"))
+import stub_pi  # noqa: E402
+
+ROTAS = ["/registros?limit=20", "/series?limit=20", "/analise?limit=20", "/registros?limit=100"]
+
+
+def medir(cliente, url, polls, headers):
+    bytes_total = 0
+    inicio_cpu = time.process_time()
+    inicio = time.perf_counter()
+    for _ in range(polls):
+        resp = cliente.get(url, headers=headers)
+        bytes_total += len(resp.get_data())
+    cpu = time.process_time() - inicio_cpu
+    parede = time.perf_counter() - inicio
+    return {
+        "status": resp.status_code,
+        "bytes_por_poll": bytes_total / polls,
+        "cpu_us_por_poll": cpu / polls * 1e6,
+        "parede_us_por_poll": parede / polls * 1e6,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--polls", type=int, default=2000)
+    ap.add_argument("--encoding", default="gzip, deflate, br")
+    ap.add_argument("--saida", help="grava os resultados em JSON")
+    args = ap.parse_args()
+
+    _, servidor = stub_pi.iniciar_em_thread(historico=1000)
+    os.environ["EXTERNAL_SERVER_URL"] = f"http://127.0.0.1:{servidor.server_address[1]}"
+    os.environ["ESTADO_DIR"] = tempfile.mkdtemp(prefix="estufa_etag_")
+    # Snapshot estável durante a medição
+    os.environ["INGESTAO_INTERVALO"] = "3600"
+    os.chdir(os.path.join(RAIZ, "backend"))
+    import app as estufa_app
+
+    estufa_app.iniciar_worker()
+    fim = time.time() + 30
+    while not (estufa_app.system_ready and estufa_app.data_cache["versao"]) and time.time() < fim:
+        time.sleep(0.1)
+    if not estufa_app.system_ready:
+        sys.exit("backend não ficou pronto")
+
+    flask_app = estufa_app.app
+    sem_cache = flask_app.test_client()
+    resultados = []
+    print(f"{'rota':<22} {'modo':<16} {'bytes/poll':>11} {'CPU µs/poll':>12}")
+    for url in ROTAS:
+        caminho = url.split("?")[0]
+        endpoint = caminho.strip("/")
+        # A view sem o decorador, para comparar com o comportamento anterior
+        original = flask_app.view_functions[endpoint]
+        flask_app.view_functions[endpoint] = original.__wrapped__
+        try:
+            base = medir(sem_cache, url, args.polls, {"Accept-Encoding": args.encoding})
+        finally:
+            flask_app.view_functions[endpoint] = original
+
+        cliente = flask_app.test_client()
+        primeira = cliente.get(url, headers={"Accept-Encoding": args.encoding})
+        etag = primeira.headers["ETag"]
+        comprimido = medir(cliente, url, args.polls, {"Accept-Encoding": args.encoding})
+        condicional = medir(cliente, url, args.polls,
+                            {"Accept-Encoding": args.encoding, "If-None-Match": etag})
+
+        for modo, r in (("sem cache", base), ("200 comprimido", comprimido), ("304", condicional)):
+            print(f"{url:<22} {modo:<16} {r['bytes_por_poll']:>11.0f} {r['cpu_us_por_poll']:>12.1f}")
+            resultados.append(dict(r, rota=url, modo=modo))
+        print(f"{'':<22} economia 304: {1 - condicional['bytes_por_poll'] / base['bytes_por_poll']:.1%} dos bytes, "
+              f"{base['cpu_us_por_poll'] / condicional['cpu_us_por_poll']:.1f}x menos CPU")
+
+    print("cache:", estufa_app.cache_respostas.estatisticas())
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump({"polls": args.polls, "resultados": resultados}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+/estado: arquivo estado.json x cache do último valor (infraestrutura/lvc.py).
+
+Mede o custo da leitura do estado como o http_server.py fazia (abrir o
+estado.json e fazer json.load) contra o LVC (bytes prontos da memória
+compartilhada). Depois, com um processo escritor regravando o estado sem
+parar, conta quantas leituras saem rasgadas (JSON inválido ou mistura de
+duas escritas) em cada caminho:
+
+* "arquivo": open("w") + json.dump, como o bridge gravava antes;
+* "atomico": temporário + os.replace, como o bridge grava agora;
+* "lvc": o segmento de memória compartilhada.
+
+    python3 benchmarks/bench_lvc.py --leituras 20000 --segundos 3
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, "infraestrutura"))
+import lvc  # noqa: E402
+
+NOME = f"estufa_lvc_bench_{os.getpid()}"
+
+
+def estado(i):
+    """Um estado do tamanho do gravado pelo bridge; todos os campos carregam o número da escrita."""
+    entrada = {"timestamp": f"2025-01-01 00:00:{i % 60:02d}", "escrita": i}
+    for n in range(40):
+        entrada[f"campo_{n:02d}"] = i
+    return json.dumps(entrada, indent=2)
+
+
+def integro(texto):
+    try:
+        entrada = json.loads(texto)
+    except ValueError:
+        return False
+    return all(v == entrada["escrita"] for k, v in entrada.items() if k.startswith("campo_"))
+
+
+def escritor(modo, caminho, parar):
+    cache = lvc.CacheUltimoValor.abrir(NOME) if modo == "lvc" else None
+    i = 0
+    while not parar.is_set():
+        i += 1
+        texto = estado(i) + " " * (i % 50)  # tamanhos diferentes a cada escrita
+        if modo == "lvc":
+            cache.escrever(texto.encode())
+        elif modo == "atomico":
+            with open(caminho + ".tmp", "w") as f:
+                f.write(texto)
+            os.replace(caminho + ".tmp", caminho)
+        else:
+            with open(caminho, "w") as f:
+                f.write(texto)
+
+
+def ler_arquivo(caminho):
+    with open(caminho, "r") as f:
+        return f.read()
+
+
+def medir(f, n):
+    for _ in range(min(n, 100)):
+        f()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        f()
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--leituras", type=int, default=20000)
+    ap.add_argument("--segundos", type=float, default=3.0, help="duração de cada teste de leitura rasgada")
+    args = ap.parse_args()
+
+    cache = lvc.CacheUltimoValor.criar(NOME)
+    try:
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, "estado.json")
+            texto = estado(1)
+            with open(caminho, "w") as f:
+                f.write(texto)
+            cache.escrever(texto.encode())
+
+            print(f"[leitura do estado] {len(texto)} bytes, {args.leituras} leituras")
+            def arquivo_json():
+                with open(caminho, "r") as f:
+                    return json.load(f)
+            us_arquivo = medir(arquivo_json, args.leituras)
+            us_lvc = medir(cache.ler, args.leituras)
+            print(f"  arquivo + json.load: {us_arquivo:8.2f} µs")
+            print(f"  lvc.ler():           {us_lvc:8.2f} µs ({us_arquivo / us_lvc:.0f}x)")
+
+            print(f"\n[leituras rasgadas] escritor contínuo, {args.segundos:g} s por caminho")
+            for modo in ("arquivo", "atomico", "lvc"):
+                parar = multiprocessing.Event()
+                processo = multiprocessing.Process(target=escritor, args=(modo, caminho, parar))
+                processo.start()
+                leituras = rasgadas = 0
+                fim = time.perf_counter() + args.segundos
+                while time.perf_counter() < fim:
+                    bruto = cache.ler().decode() if modo == "lvc" else ler_arquivo(caminho)
+                    leituras += 1
+                    if not integro(bruto):
+                        rasgadas += 1
+                parar.set()
+                processo.join()
+                print(f"  {modo:<8} {leituras:>8} leituras, {rasgadas:>6} rasgadas")
+    finally:
+        cache.fechar()
+        lvc.shared_memory.SharedMemory(NOME).unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Escalonamento de throughput do backend em modo multi-worker.
+
+Sobe o stub do Pi, inicia o backend via gunicorn com 1..N workers e
+dispara requisições de polling do dashboard (/registros, /series, /analise)
+a partir de vários processos clientes. Mostra req/s por quantidade de
+workers e quantas chamadas chegaram ao "Pi" (deve ser ~constante: só o
+dono da ingestão busca dados).
+
+    python3 benchmarks/bench_multiworker.py --workers 1 2 4 --duracao 10
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import stub_pi  # noqa: E402
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+ROTAS = ["/registros?limit=20", "/series?limit=20", "/analise?limit=20"]
+
+
+def _cliente(args):
+    porta, duracao = args
+    conn = http.client.HTTPConnection("127.0.0.1", porta, timeout=10)
+    feitas, erros, i = 0, 0, 0
+    fim = time.perf_counter() + duracao
+    while time.perf_counter() < fim:
+        try:
+            conn.request("GET", ROTAS[i % len(ROTAS)])
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status == 200:
+                feitas += 1
+            else:
+                erros += 1
+        except Exception:
+            erros += 1
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", porta, timeout=10)
+        i += 1
+    return feitas, erros
+
+
+def aguardar_backend(porta, limite_s=60):
+    fim = time.time() + limite_s
+    while time.time() < fim:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", porta, timeout=2)
+            conn.request("GET", "/series?limit=20")
+            corpo = json.loads(conn.getresponse().read())
+            if corpo.get("temperatura"):
+                return True
+        except Exception:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def medir(workers, porta_pi, porta, clientes, duracao):
+    estado_dir = tempfile.mkdtemp(prefix="estufa_bench_")
+    env = dict(os.environ,
+               EXTERNAL_SERVER_URL=f"http://127.0.0.1:{porta_pi}",
+               WEB_CONCURRENCY=str(workers),
+               GUNICORN_BIND=f"127.0.0.1:{porta}",
+               ESTADO_DIR=estado_dir,
+               INGESTAO_INTERVALO="1")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not aguardar_backend(porta):
+            raise RuntimeError("backend não ficou pronto")
+        with multiprocessing.Pool(clientes) as pool:
+            resultados = pool.map(_cliente, [(porta, duracao)] * clientes)
+        feitas = sum(r[0] for r in resultados)
+        erros = sum(r[1] for r in resultados)
+        return feitas / duracao, erros
+    finally:
+        proc.terminate()
+        proc.wait(timeout=15)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, nargs="+",
+                    default=sorted({1, 2, max(1, os.cpu_count() // 2), os.cpu_count()}))
+    ap.add_argument("--clientes", type=int, default=max(2, os.cpu_count()))
+    ap.add_argument("--duracao", type=float, default=10.0)
+    ap.add_argument("--porta", type=int, default=5200)
+    ap.add_argument("--saida", help="grava os resultados em JSON")
+    args = ap.parse_args()
+
+    stub, servidor = stub_pi.iniciar_em_thread(historico=1000)
+    porta_pi = servidor.server_address[1]
+
+    resultados = []
+    print(f"{'workers':>8} {'req/s':>10} {'erros':>7} {'chamadas Pi':>12}")
+    for w in args.workers:
+        antes = sum(stub.stats().values())
+        rps, erros = medir(w, porta_pi, args.porta, args.clientes, args.duracao)
+        chamadas = sum(stub.stats().values()) - antes
+        resultados.append({"workers": w, "req_s": rps, "erros": erros, "chamadas_pi": chamadas})
+        print(f"{w:>8} {rps:>10.1f} {erros:>7} {chamadas:>12}")
+
+    base = resultados[0]["req_s"] or 1.0
+    for r in resultados:
+        print(f"  {r['workers']} worker(s): {r['req_s'] / base:.2f}x")
+
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump({"cpus": os.cpu_count(), "resultados": resultados}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Custo de decodificação por mensagem: JSON x MessagePack x quadro binário.
+
+Gera mensagens de sensores como as do NodeMCU (um ou todos os campos por
+mensagem) e mede, por formato, o tempo para transformar o payload bruto em
+{variável: valor}:
+
+* "json_ifs": o on_message original (decode + json.loads + um if por campo);
+* "json", "json_plano", "msgpack", "binario": payload.Decodificador, o que
+  o bridge usa hoje, montado a partir do config/mapping.csv. Ele também
+  converte os tipos, calibra e confere as faixas, que o json_ifs não fazia.
+
+Mostra µs/mensagem (mínimo de --repeticoes), bytes/mensagem e a razão
+contra o json_ifs. Sem o pacote msgpack, esse formato fica de fora.
+
+    python3 benchmarks/bench_payload.py --mensagens 20000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, "infraestrutura"))
+import payload  # noqa: E402
+
+VALORES = {
+    "temperature": lambda r: round(r.uniform(18, 35), 2),
+    "humidity": lambda r: round(r.uniform(40, 90), 2),
+    "light": lambda r: round(r.uniform(0, 1200), 1),
+    "soil_moisture": lambda r: round(r.uniform(20, 60), 2),
+    "nivel_baixo": lambda r: r.random() < 0.1,
+    "nivel_alto": lambda r: r.random() < 0.5,
+}
+
+
+def gerar_leituras(n, completas, seed=7):
+    rnd = random.Random(seed)
+    chaves = list(VALORES)
+    leituras = []
+    for i in range(n):
+        usadas = chaves if completas else [chaves[i % len(chaves)]]
+        leituras.append(({c: VALORES[c](rnd) for c in usadas}, 1.7e9 + i * 0.01))
+    return leituras
+
+
+def codificar(formato, leituras, decodificador):
+    corpos = []
+    for i, (valores, ts) in enumerate(leituras):
+        if formato in ("json_ifs", "json"):
+            corpos.append(json.dumps({"sensor_id": f"s{i % 20:02d}", "estufa_id": "estufa01",
+                                      "sensor_data": valores, "ts_envio": ts}).encode())
+        elif formato == "json_plano":
+            corpos.append(json.dumps(dict(valores, sensor_id=f"s{i % 20:02d}", ts_envio=ts)).encode())
+        elif formato == "msgpack":
+            corpos.append(payload.msgpack.packb(dict(valores, sensor_id=f"s{i % 20:02d}", ts_envio=ts)))
+        else:
+            corpos.append(decodificador.codificar_binario(valores, ts))
+    return corpos
+
+
+def decodificar_ifs(corpos):
+    # Cópia do on_message de antes do payload.py
+    dados = {}
+    for bruto in corpos:
+        p = json.loads(bruto.decode())
+        if "sensor_data" in p:
+            p = p["sensor_data"]
+        if "humidity" in p:
+            dados["umidade"] = p.get("humidity")
+        if "light" in p:
+            dados["luminosidade"] = p.get("light")
+        if "temperature" in p:
+            dados["temperatura"] = p.get("temperature")
+        if "soil_moisture" in p:
+            dados["umidade_solo"] = p.get("soil_moisture")
+        if "nivel_baixo" in p:
+            dados["nivel_baixo"] = bool(p.get("nivel_baixo"))
+        if "nivel_alto" in p:
+            dados["nivel_alto"] = bool(p.get("nivel_alto"))
+    return dados
+
+
+def decodificar_tabela(decodificador, corpos):
+    dados = {}
+    decodificar = decodificador.decodificar
+    for bruto in corpos:
+        valores, _ts = decodificar(bruto)
+        dados.update(valores)
+    return dados
+
+
+def medir(f, repeticoes):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        f()
+        melhor = min(melhor, time.perf_counter() - t0)
+    return melhor
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--mensagens", type=int, default=20000)
+    ap.add_argument("--repeticoes", type=int, default=5)
+    ap.add_argument("--saida", help="grava o resultado em JSON")
+    args = ap.parse_args()
+
+    decodificador = payload.Decodificador()
+    formatos = ["json_ifs", "json", "json_plano", "msgpack", "binario"]
+    if payload.msgpack is None:
+        formatos.remove("msgpack")
+        print("msgpack não instalado: formato ignorado")
+
+    resultado = {}
+    for completas in (False, True):
+        caso = "6 campos/msg" if completas else "1 campo/msg"
+        leituras = gerar_leituras(args.mensagens, completas)
+        print(f"\n[{caso}] {args.mensagens} mensagens")
+        print(f"{'formato':<12} {'µs/msg':>8} {'bytes/msg':>10} {'x json_ifs':>11}")
+        referencia = None
+        for formato in formatos:
+            corpos = codificar(formato, leituras, decodificador)
+            if formato == "json_ifs":
+                esperado = decodificar_ifs(corpos)
+                segundos = medir(lambda: decodificar_ifs(corpos), args.repeticoes)
+            else:
+                # Mesmo estado final que o caminho antigo (a menos do float32 do binário)
+                obtido = decodificar_tabela(decodificador, corpos)
+                assert obtido.keys() == esperado.keys(), formato
+                segundos = medir(lambda: decodificar_tabela(decodificador, corpos), args.repeticoes)
+            us = segundos / args.mensagens * 1e6
+            tamanho = sum(len(c) for c in corpos) / len(corpos)
+            referencia = referencia or us
+            print(f"{formato:<12} {us:>8.2f} {tamanho:>10.1f} {referencia / us:>10.2f}x")
+            resultado.setdefault(caso, {})[formato] = {"us_msg": us, "bytes_msg": tamanho}
+
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump(resultado, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+/series (JSON) x /series.bin (colunas binárias) para 1k a 100k pontos.
+
+Para cada tamanho, monta os corpos com as mesmas funções do backend ("json"
+é o /series atual, com 2 colunas; "json5" tem as mesmas 5 colunas do
+binário) e compara o tamanho (cru e gzip), o tempo de montagem no servidor
+e o tempo de leitura no cliente. A leitura é medida no Node, se estiver instalado, com a
+própria função `lerSeriesBinarias` do frontend/script.js contra
+`JSON.parse`; sem Node, usa json.loads x numpy.frombuffer como referência.
+
+    python3 benchmarks/bench_series_bin.py --pontos 1000 10000 100000
+"""
+
+import argparse
+import gzip
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+sys.path.insert(0, os.path.join(RAIZ, "backend"))
+import stub_pi  # noqa: E402
+
+SCRIPT_NODE = r"""
+const fs = require('fs');
+%s
+const [arqJson, arqBin, repeticoes] = process.argv.slice(2);
+const textoJson = fs.readFileSync(arqJson, 'utf8');
+const bruto = fs.readFileSync(arqBin);
+const buffer = bruto.buffer.slice(bruto.byteOffset, bruto.byteOffset + bruto.byteLength);
+function medir(f) {
+  const n = parseInt(repeticoes, 10);
+  for (let i = 0; i < 3; i++) f();
+  const t0 = process.hrtime.bigint();
+  let soma = 0;
+  for (let i = 0; i < n; i++) soma += f();
+  return { ms: Number(process.hrtime.bigint() - t0) / 1e6 / n, soma };
+}
+const json = medir(() => {
+  const s = JSON.parse(textoJson);
+  const temperatura = Float64Array.from(s.temperatura);
+  return temperatura.length + s.time.length;
+});
+const bin = medir(() => {
+  const c = lerSeriesBinarias(buffer);
+  return c.temperatura.length + c.epoch.length;
+});
+console.log(JSON.stringify({ json_ms: json.ms, bin_ms: bin.ms }));
+"""
+
+
+def funcao_do_frontend():
+    with open(os.path.join(RAIZ, "frontend", "script.js"), encoding="utf-8") as f:
+        fonte = f.read()
+    achado = re.search(r"^function lerSeriesBinarias\(buffer\) \{.*?^\}", fonte, re.S | re.M)
+    if not achado:
+        sys.exit("lerSeriesBinarias não encontrada em frontend/script.js")
+    return achado.group(0)
+
+
+def leitura_node(corpo_json, corpo_bin, repeticoes):
+    with tempfile.TemporaryDirectory() as pasta:
+        arq_json, arq_bin = os.path.join(pasta, "s.json"), os.path.join(pasta, "s.bin")
+        with open(arq_json, "wb") as f:
+            f.write(corpo_json)
+        with open(arq_bin, "wb") as f:
+            f.write(corpo_bin)
+        script = os.path.join(pasta, "ler.js")
+        with open(script, "w", encoding="utf-8") as f:
+            f.write(SCRIPT_NODE % funcao_do_frontend())
+        saida = subprocess.run(["node", script, arq_json, arq_bin, str(repeticoes)],
+                               capture_output=True, text=True, check=True).stdout
+    r = json.loads(saida)
+    return r["json_ms"], r["bin_ms"]
+
+
+def leitura_python(corpo_json, corpo_bin, repeticoes):
+    from serializacao import TAMANHO_NOME_BIN, _CABECALHO_BIN
+
+    def ler_bin():
+        _, _, n_colunas, n, _ = _CABECALHO_BIN.unpack_from(corpo_bin)
+        offset = _CABECALHO_BIN.size + TAMANHO_NOME_BIN * n_colunas
+        return [np.frombuffer(corpo_bin, "<f4", n, offset + 4 * n * i) for i in range(n_colunas)]
+
+    def medir(f):
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            f()
+        return (time.perf_counter() - inicio) / repeticoes * 1000
+
+    return medir(lambda: json.loads(corpo_json)), medir(ler_bin)
+
+
+def cronometrar(f, repeticoes=5):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = f()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return resultado, melhor * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pontos", type=int, nargs="+", default=[1000, 10000, 100000])
+    ap.add_argument("--repeticoes", type=int, default=20)
+    ap.add_argument("--saida", help="grava os resultados em JSON")
+    args = ap.parse_args()
+
+    os.environ.setdefault("ESTADO_DIR", tempfile.mkdtemp(prefix="estufa_bin_"))
+    os.chdir(os.path.join(RAIZ, "backend"))
+    import app as estufa_app
+    from serializacao import dumps, colunas_de_linhas, partes_binarias
+
+    ler = leitura_node if shutil.which("node") else leitura_python
+    print(f"leitura no cliente: {'Node (frontend/script.js)' if ler is leitura_node else 'Python (referência)'}")
+    print(f"{'pontos':>8} {'formato':<6} {'bytes':>10} {'gzip':>10} {'montagem ms':>12} {'leitura ms':>11}")
+
+    resultados = []
+    for n in args.pontos:
+        linhas = [estufa_app.converter_registro(r) for r in stub_pi.gerar_historico(n, intervalo_s=5)]
+        corpo_json, ms_json = cronometrar(lambda: dumps(estufa_app.montar_series(linhas, n)))
+        corpo_bin, ms_bin = cronometrar(lambda: b"".join(partes_binarias(
+            colunas_de_linhas(linhas, estufa_app.CAMPOS_SERIES_BIN), n)))
+        # JSON com as mesmas 5 colunas do binário, para comparar bytes por coluna
+        corpo_json5, ms_json5 = cronometrar(lambda: dumps(dict(
+            {"time": estufa_app.montar_series(linhas, n)["time"]},
+            **{c: [l[c] for l in linhas] for c in estufa_app.CAMPOS_SERIES_BIN})))
+        leitura_json, leitura_bin = ler(corpo_json, corpo_bin, args.repeticoes)
+        leitura_json5, _ = ler(corpo_json5, corpo_bin, args.repeticoes)
+
+        for formato, corpo, montagem, leitura in (("json", corpo_json, ms_json, leitura_json),
+                                                  ("json5", corpo_json5, ms_json5, leitura_json5),
+                                                  ("bin", corpo_bin, ms_bin, leitura_bin)):
+            gz = len(gzip.compress(corpo, 6))
+            print(f"{n:>8} {formato:<6} {len(corpo):>10} {gz:>10} {montagem:>12.2f} {leitura:>11.3f}")
+            resultados.append({"pontos": n, "formato": formato, "bytes": len(corpo), "gzip": gz,
+                               "montagem_ms": montagem, "leitura_ms": leitura})
+
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump({"leitura": ler.__name__, "resultados": resultados}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Tempo até a primeira resposta útil do backend, em partida a frio e a quente.
+
+"Resposta útil" = /series?limit=20 com dados de temperatura. Cada cenário
+sobe o backend via gunicorn (1 worker) e mede, a partir do spawn do
+processo, quanto tempo leva até o dashboard ter o que mostrar:
+
+* frio: ESTADO_DIR vazio, sem snapshot em disco;
+* quente: ESTADO_DIR com o snapshot gravado pelo desligamento anterior.
+
+O "Pi" pode estar ok (stub), fora (porta fechada) ou travado (aceita a
+conexão e não responde).
+
+    python3 benchmarks/bench_warm_start.py --limite 60
+"""
+
+import argparse
+import http.client
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import stub_pi  # noqa: E402
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+
+def porta_livre():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    porta = s.getsockname()[1]
+    s.close()
+    return porta
+
+
+def iniciar_backend(url_pi, estado_dir, porta):
+    env = dict(os.environ,
+               EXTERNAL_SERVER_URL=url_pi,
+               WEB_CONCURRENCY="1",
+               GUNICORN_BIND=f"127.0.0.1:{porta}",
+               ESTADO_DIR=estado_dir,
+               INGESTAO_INTERVALO="1")
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def primeira_resposta_util(porta, inicio, limite_s):
+    """Segundos até /series ter dados (ou None) e o cabeçalho de dados desatualizados."""
+    while time.perf_counter() - inicio < limite_s:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", porta, timeout=limite_s)
+            conn.request("GET", "/series?limit=20")
+            resp = conn.getresponse()
+            corpo = json.loads(resp.read())
+            if corpo.get("temperatura"):
+                return time.perf_counter() - inicio, resp.getheader("X-Dados-Desatualizados")
+        except (OSError, ValueError, http.client.HTTPException):
+            pass
+        time.sleep(0.05)
+    return None, None
+
+
+def medir(nome, url_pi, estado_dir, limite_s):
+    porta = porta_livre()
+    inicio = time.perf_counter()
+    proc = iniciar_backend(url_pi, estado_dir, porta)
+    try:
+        segundos, desatualizado = primeira_resposta_util(porta, inicio, limite_s)
+    finally:
+        # SIGTERM: o worker grava o snapshot ao sair (worker_exit)
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+    tempo = f"{segundos:.2f}s" if segundos is not None else f"> {limite_s:.0f}s"
+    print(f"{nome:<22} {tempo:>10} {desatualizado or '-':>14}")
+    return {"cenario": nome, "segundos": segundos, "desatualizado": desatualizado}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--limite", type=float, default=60.0, help="desiste após N segundos por cenário")
+    ap.add_argument("--latencia-ms", type=float, default=50.0, help="latência do Pi no cenário 'ok'")
+    ap.add_argument("--saida", help="grava os resultados em JSON")
+    args = ap.parse_args()
+
+    _, servidor_ok = stub_pi.iniciar_em_thread(historico=1000, latencia_ms=args.latencia_ms)
+    _, servidor_travado = stub_pi.iniciar_em_thread(historico=1000, latencia_ms=3600 * 1000)
+    pis = {
+        "ok": f"http://127.0.0.1:{servidor_ok.server_address[1]}",
+        "fora": f"http://127.0.0.1:{porta_livre()}",
+        "travado": f"http://127.0.0.1:{servidor_travado.server_address[1]}",
+    }
+
+    # Uma execução com o Pi ok deixa o snapshot em disco para os cenários a quente
+    modelo_quente = tempfile.mkdtemp(prefix="estufa_warm_")
+    print(f"{'cenário':<22} {'1ª resposta':>10} {'desatualizado':>14}")
+    resultados = [medir("frio / Pi ok", pis["ok"], modelo_quente, args.limite)]
+    if not os.path.exists(os.path.join(modelo_quente, "ultimo_snapshot.json")):
+        print("snapshot não foi gravado ao desligar; cenários a quente ficariam iguais aos frios")
+        sys.exit(1)
+
+    for estado in ("fora", "travado"):
+        resultados.append(medir(f"frio / Pi {estado}", pis[estado], tempfile.mkdtemp(prefix="estufa_cold_"),
+                                args.limite))
+    for estado in ("ok", "fora", "travado"):
+        estado_dir = tempfile.mkdtemp(prefix="estufa_warm_")
+        shutil.copytree(modelo_quente, estado_dir, dirs_exist_ok=True)
+        resultados.append(medir(f"quente / Pi {estado}", pis[estado], estado_dir, args.limite))
+
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump({"limite_s": args.limite, "resultados": resultados}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
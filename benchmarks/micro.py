@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks das funções quentes de análise e agregação do backend.
+
+Gera históricos sintéticos de 20 a 1M linhas e, para cada função e
+tamanho, mede o tempo por chamada (mínimo e mediana de várias repetições)
+e o pico de memória alocada numa chamada (tracemalloc, medido à parte para
+não distorcer o tempo). As funções que recebem os dados já agregados
+(`avaliar_variaveis_ambiente`, `calcular_maturidade_planta`) não dependem
+do tamanho e são medidas uma vez.
+
+Compara com benchmarks/micro_baseline.json e sai com código 1 se algum
+caso piorar além da tolerância. Os tempos da baseline são corrigidos pela
+velocidade da máquina atual, medida por um laço de calibração.
+
+    python3 benchmarks/micro.py                      # compara com a baseline
+    python3 benchmarks/micro.py --gravar-baseline    # grava uma baseline nova
+    python3 benchmarks/micro.py --tamanhos 20 1000 --funcoes analisar
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, "backend"))
+BASELINE = os.path.join(RAIZ, "benchmarks", "micro_baseline.json")
+
+TAMANHOS = (20, 1000, 100000, 1000000)
+# Abaixo disso a diferença é ruído de medição, não regressão
+PISO_US = 5.0
+
+
+def gerar_linhas(n, seed=42, intervalo_s=60):
+    """Registros no formato do servidor externo, com ~1% de leituras faltando."""
+    rnd = random.Random(seed)
+    inicio = datetime(2025, 1, 1)
+    linhas = []
+    for i in range(n):
+        temp = 24 + 5 * rnd.random()
+        linhas.append({
+            "timestamp": (inicio + timedelta(seconds=i * intervalo_s)).strftime("%Y-%m-%d %H:%M:%S"),
+            "temperatura": round(temp, 2),
+            "umidade": round(60 + 15 * rnd.random(), 2),
+            "luminosidade": round(400 * rnd.random(), 1) if rnd.random() > 0.01 else None,
+            "umidade_solo": round(40 + rnd.gauss(0, 3), 2),
+            "nivel_alto": rnd.random() > 0.3,
+        })
+    return linhas
+
+
+def casos(app):
+    """nome: (prepara(linhas) -> função sem argumentos, depende do tamanho)."""
+    import analyzer
+
+    def analisar(linhas):
+        pts = [{"temperatura": l["temperatura"], "umidade": l["umidade"]} for l in linhas]
+        return lambda: analyzer.analisar(pts)
+
+    def process_initial_data(linhas):
+        return lambda: app.process_initial_data(linhas)
+
+    def obter_dados_estufa_atual(linhas):
+        app.process_initial_data(linhas)
+
+        def chamar():
+            # Cache recente: mede a agregação, não a rede
+            app.data_cache['last_update'] = time.time()
+            return app.obter_dados_estufa_atual(limit=len(linhas))
+        return chamar
+
+    def agregados(linhas):
+        return app.agregar_dados_estufa(linhas)
+
+    def avaliar_variaveis_ambiente(linhas):
+        dados = agregados(linhas)
+        return lambda: app.avaliar_variaveis_ambiente(dados)
+
+    def calcular_maturidade_planta(linhas):
+        dados = agregados(linhas)
+        return lambda: app.calcular_maturidade_planta(dados, dias_plantio=40)
+
+    return {
+        "analisar": (analisar, True),
+        "process_initial_data": (process_initial_data, True),
+        "obter_dados_estufa_atual": (obter_dados_estufa_atual, True),
+        "avaliar_variaveis_ambiente": (avaliar_variaveis_ambiente, False),
+        "calcular_maturidade_planta": (calcular_maturidade_planta, False),
+    }
+
+
+def cronometrar(funcao, tempo_min=0.2, repeticoes_min=5, repeticoes_max=1000):
+    funcao()
+    tempos = []
+    inicio = time.perf_counter()
+    while len(tempos) < repeticoes_min or (time.perf_counter() - inicio < tempo_min and len(tempos) < repeticoes_max):
+        t0 = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - t0)
+    return min(tempos), statistics.median(tempos), len(tempos)
+
+
+def pico_alocado(funcao):
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        antes = tracemalloc.get_traced_memory()[0]
+        funcao()
+        return tracemalloc.get_traced_memory()[1] - antes
+    finally:
+        tracemalloc.stop()
+
+
+def calibrar():
+    """Tempo (ms) de um laço Python fixo: mede a velocidade da máquina."""
+    def laco():
+        d = {}
+        for i in range(200000):
+            d[i % 1000] = d.get(i % 1000, 0.0) + i * 0.5
+        return d
+    return cronometrar(laco, repeticoes_min=5)[0] * 1000
+
+
+def comparar(resultados, baseline, calibracao, tolerancia, tolerancia_alocacao):
+    escala = calibracao / baseline["calibracao_ms"]
+    base = {(r["funcao"], r["linhas"]): r for r in baseline["resultados"]}
+    regressoes = []
+    print(f"\nbaseline de {baseline.get('data')} ({baseline.get('commit')}); "
+          f"máquina atual {escala:.2f}x o tempo da calibração da baseline")
+    for r in resultados:
+        b = base.get((r["funcao"], r["linhas"]))
+        if b is None:
+            continue
+        esperado = b["min_us"] * escala
+        limite = max(esperado * (1 + tolerancia), esperado + PISO_US)
+        if r["min_us"] > limite:
+            regressoes.append(f"{r['funcao']} ({r['linhas']} linhas): {r['min_us']:.1f} µs, "
+                              f"esperado até {limite:.1f} µs (baseline {b['min_us']:.1f} µs)")
+        if b["alocado_bytes"] and r["alocado_bytes"] > b["alocado_bytes"] * (1 + tolerancia_alocacao) + 1024:
+            regressoes.append(f"{r['funcao']} ({r['linhas']} linhas): pico de {r['alocado_bytes']} bytes, "
+                              f"baseline {b['alocado_bytes']} bytes")
+    return regressoes
+
+
+def commit_atual():
+    try:
+        import subprocess
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tamanhos", type=int, nargs="+", default=list(TAMANHOS))
+    ap.add_argument("--funcoes", nargs="+", help="só estas funções")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--gravar-baseline", action="store_true")
+    ap.add_argument("--tolerancia", type=float, default=0.30, help="piora de tempo aceita (0.30 = 30%%)")
+    ap.add_argument("--tolerancia-alocacao", type=float, default=0.10)
+    ap.add_argument("--saida", help="grava os resultados em JSON")
+    args = ap.parse_args()
+
+    os.environ.setdefault("ESTADO_DIR", tempfile.mkdtemp(prefix="estufa_micro_"))
+    os.chdir(os.path.join(RAIZ, "backend"))
+    import app
+
+    todos = casos(app)
+    nomes = args.funcoes or list(todos)
+    calibracao = calibrar()
+    print(f"calibração: {calibracao:.2f} ms")
+    print(f"{'função':<28} {'linhas':>8} {'mín µs':>12} {'mediana µs':>12} {'ns/linha':>9} {'pico alocado':>13}")
+
+    resultados = []
+    for n in sorted(args.tamanhos):
+        linhas = gerar_linhas(n)
+        for nome in nomes:
+            preparar, por_linhas = todos[nome]
+            if not por_linhas and n != min(args.tamanhos):
+                continue
+            funcao = preparar(linhas)
+            minimo, mediana, reps = cronometrar(funcao)
+            alocado = pico_alocado(funcao)
+            r = {
+                "funcao": nome,
+                "linhas": n if por_linhas else None,
+                "min_us": minimo * 1e6,
+                "mediana_us": mediana * 1e6,
+                "repeticoes": reps,
+                "alocado_bytes": alocado,
+            }
+            resultados.append(r)
+            por_linha = f"{minimo * 1e9 / n:>9.0f}" if por_linhas else f"{'-':>9}"
+            print(f"{nome:<28} {n if por_linhas else '-':>8} {r['min_us']:>12.1f} {r['mediana_us']:>12.1f} "
+                  f"{por_linha} {alocado:>13}")
+        del linhas
+
+    registro = {
+        "commit": commit_atual(),
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "calibracao_ms": calibracao,
+        "resultados": resultados,
+    }
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump(registro, f, indent=2)
+    if args.gravar_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(registro, f, indent=2)
+        print(f"baseline gravada em {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"sem baseline em {args.baseline}; rode com --gravar-baseline")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressoes = comparar(resultados, baseline, calibracao, args.tolerancia, args.tolerancia_alocacao)
+    if regressoes:
+        print("REGRESSÕES:")
+        for linha in regressoes:
+            print(f"  {linha}")
+        sys.exit(1)
+    print("sem regressões")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Substituto local do Ollama para benchmarks.
+
+Atende /api/chat (em streaming NDJSON ou não, como o Ollama), /api/generate
+e /api/tags. A resposta sai em `--tokens` pedaços, o primeiro depois de
+`--ttft-ms` e os demais no ritmo de `--tokens-s` tokens por segundo. A
+rota /_stats devolve quantas chamadas cada rota recebeu.
+
+    python3 benchmarks/stub_ollama.py --porta 11500 --tokens-s 20 --ttft-ms 300
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+from stub_pi import _Servidor
+
+PALAVRAS = ("a ", "estufa ", "está ", "com ", "temperatura ", "adequada ", "para ", "o ", "tomate ", "cereja. ")
+
+
+class StubOllama:
+    def __init__(self, tokens_s=20.0, ttft_s=0.3, tokens=60, modelo="llama3.2:1b"):
+        self.tokens_s = tokens_s
+        self.ttft_s = ttft_s
+        self.tokens = tokens
+        self.modelo = modelo
+        self.chamadas = {}
+        self._lock = threading.Lock()
+
+    def contar(self, rota):
+        with self._lock:
+            self.chamadas[rota] = self.chamadas.get(rota, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.chamadas)
+
+    def pedacos(self):
+        """Tokens da resposta, já no ritmo configurado."""
+        time.sleep(self.ttft_s)
+        for i in range(self.tokens):
+            if i and self.tokens_s:
+                time.sleep(1.0 / self.tokens_s)
+            yield PALAVRAS[i % len(PALAVRAS)]
+
+    def criar_servidor(self, host, porta):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _responder(self, status, corpo):
+                dados = json.dumps(corpo).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def _linha(self, obj):
+                dados = json.dumps(obj).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(dados), dados))
+                self.wfile.flush()
+
+            def do_GET(self):
+                if self.path == "/_stats":
+                    return self._responder(200, stub.stats())
+                stub.contar(self.path)
+                if self.path == "/api/tags":
+                    return self._responder(200, {"models": [{"name": stub.modelo}]})
+                return self._responder(404, {"error": "not found"})
+
+            def do_POST(self):
+                tamanho = int(self.headers.get("Content-Length", 0))
+                pedido = json.loads(self.rfile.read(tamanho) or b"{}")
+                stub.contar(self.path)
+                if self.path not in ("/api/chat", "/api/generate"):
+                    return self._responder(404, {"error": "not found"})
+                chat = self.path == "/api/chat"
+
+                def mensagem(texto, fim):
+                    base = {"model": stub.modelo, "done": fim}
+                    if chat:
+                        base["message"] = {"role": "assistant", "content": texto}
+                    else:
+                        base["response"] = texto
+                    return base
+
+                if not pedido.get("stream", True):
+                    return self._responder(200, mensagem("".join(stub.pedacos()), True))
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for texto in stub.pedacos():
+                    self._linha(mensagem(texto, False))
+                self._linha(mensagem("", True))
+                self.wfile.write(b"0\r\n\r\n")
+
+        return _Servidor((host, porta), Handler)
+
+
+def iniciar_em_thread(porta=0, tokens_s=20.0, ttft_ms=300.0, tokens=60, host="127.0.0.1"):
+    """Sobe o stub numa thread daemon; retorna (stub, servidor)."""
+    stub = StubOllama(tokens_s, ttft_ms / 1000.0, tokens)
+    servidor = stub.criar_servidor(host, porta)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return stub, servidor
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--porta", type=int, default=11500)
+    ap.add_argument("--tokens-s", type=float, default=20.0)
+    ap.add_argument("--ttft-ms", type=float, default=300.0)
+    ap.add_argument("--tokens", type=int, default=60)
+    args = ap.parse_args()
+
+    stub = StubOllama(args.tokens_s, args.ttft_ms / 1000.0, args.tokens)
+    servidor = stub.criar_servidor(args.host, args.porta)
+    print(f"[STUB OLLAMA] http://{args.host}:{args.porta} ({args.tokens} tokens a {args.tokens_s}/s, "
+          f"primeiro em {args.ttft_ms} ms)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
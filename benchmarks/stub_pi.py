@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Substituto local do http_server.py do Raspberry Pi para benchmarks.
+
+Serve /registros e /estado com o mesmo contrato (Basic Auth admin/12345),
+com histórico sintético de tamanho configurável e latência artificial.
+A rota /_stats devolve quantas chamadas cada rota recebeu, para medir a
+amplificação de chamadas do backend.
+
+    python3 benchmarks/stub_pi.py --porta 5100 --historico 5000 --latencia-ms 20
+"""
+
+import argparse
+import base64
+import json
+import math
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+USERNAME = "admin"
+PASSWORD = "12345"
+AUTH_ESPERADO = "Basic " + base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()
+
+
+def gerar_historico(n, seed=42, intervalo_s=60):
+    """Histórico sintético no formato de data/registros.json."""
+    rnd = random.Random(seed)
+    inicio = datetime.now() - timedelta(seconds=n * intervalo_s)
+    historico = []
+    for i in range(n):
+        hora = (i * intervalo_s / 3600.0) % 24
+        temp = 22 + 6 * math.sin((hora - 9) / 24 * 2 * math.pi) + rnd.gauss(0, 0.5)
+        umid = 70 - 10 * math.sin((hora - 9) / 24 * 2 * math.pi) + rnd.gauss(0, 2)
+        luz = max(0.0, 500 * math.sin((hora - 6) / 12 * math.pi)) if 6 <= hora <= 18 else 0.0
+        historico.append({
+            "timestamp": (inicio + timedelta(seconds=i * intervalo_s)).strftime("%Y-%m-%d %H:%M:%S"),
+            "temperatura": round(temp, 2),
+            "umidade": round(umid, 2),
+            "luminosidade": round(luz, 1),
+            "umidade_solo": round(40 + rnd.gauss(0, 3), 2),
+            "nivel_baixo": False,
+            "nivel_alto": rnd.random() > 0.3,
+            "bomba": 0, "valvula": 0, "luminaria": 0,
+            "ventilador": int(temp > 30), "exaustor": int(temp > 30), "emergencia": 0,
+        })
+    return historico
+
+
+class _Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Cliente que desiste no meio (timeout do backend) não é erro do stub
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StubPi:
+    def __init__(self, historico, latencia_s=0.0):
+        self.historico = historico
+        self.latencia_s = latencia_s
+        self.chamadas = {}
+        self._lock = threading.Lock()
+
+    def contar(self, rota):
+        with self._lock:
+            self.chamadas[rota] = self.chamadas.get(rota, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.chamadas)
+
+    def criar_servidor(self, host, porta):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _responder(self, status, corpo):
+                dados = json.dumps(corpo).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/_stats":
+                    return self._responder(200, stub.stats())
+                if self.headers.get("Authorization") != AUTH_ESPERADO:
+                    return self._responder(401, {"erro": "Acesso restrito"})
+                stub.contar(url.path)
+                if stub.latencia_s:
+                    time.sleep(stub.latencia_s)
+                if url.path == "/registros":
+                    limit = int(parse_qs(url.query).get("limit", ["20"])[0])
+                    return self._responder(200, stub.historico[-limit:])
+                if url.path == "/estado":
+                    return self._responder(200, stub.historico[-1] if stub.historico else {})
+                return self._responder(404, {"erro": "rota inexistente"})
+
+        return _Servidor((host, porta), Handler)
+
+
+def iniciar_em_thread(porta=0, historico=1000, latencia_ms=0.0, host="127.0.0.1"):
+    """Sobe o stub numa thread daemon; retorna (stub, servidor)."""
+    stub = StubPi(gerar_historico(historico), latencia_ms / 1000.0)
+    servidor = stub.criar_servidor(host, porta)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return stub, servidor
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--porta", type=int, default=5100)
+    ap.add_argument("--historico", type=int, default=1000)
+    ap.add_argument("--latencia-ms", type=float, default=0.0)
+    args = ap.parse_args()
+
+    stub = StubPi(gerar_historico(args.historico), args.latencia_ms / 1000.0)
+    servidor = stub.criar_servidor(args.host, args.porta)
+    print(f"[STUB PI] http://{args.host}:{args.porta} ({args.historico} registros, {args.latencia_ms} ms)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -39,6 +39,7 @@ const els = {
 const state = {
   systemReady: false,
   connectionStatus: 'checking',
+  idadeDados: 0,
   currentSessionId: null,
   isAuthenticated: false,
   previousData: null,
@@ -368,6 +369,10 @@ function updateConnectionStatus() {
       els.connectionStatus.innerHTML = 'Conectado ao servidor - Dados em tempo real';
       els.connectionStatus.className = 'connection-status status-connected';
       break;
+    case 'stale':
+      els.connectionStatus.innerHTML = `Exibindo últimos dados salvos (há ${formatarIdade(state.idadeDados)}) - atualizando...`;
+      els.connectionStatus.className = 'connection-status status-checking';
+      break;
     case 'error':
       els.connectionStatus.innerHTML = 'Erro de conexão com o servidor';
       els.connectionStatus.className = 'connection-status status-error';
@@ -375,6 +380,36 @@ function updateConnectionStatus() {
   }
 }
 
+// Último ETag e corpo por URL: o backend responde 304 enquanto o snapshot não muda
+const respostasValidadas = new Map();
+
+async function fetchComValidador(url, ler = response => response.json()) {
+  const anterior = respostasValidadas.get(url);
+  const headers = anterior ? { 'If-None-Match': anterior.etag } : {};
+  const response = await fetch(url, { headers, cache: 'no-store' });
+
+  if (response.status === 304 && anterior) {
+    return { response, dados: anterior.dados, modificado: false };
+  }
+  if (!response.ok) {
+    throw new Error(`Erro HTTP: ${response.status}`);
+  }
+  const dados = await ler(response);
+  const etag = response.headers.get('ETag');
+  if (etag) {
+    respostasValidadas.set(url, { etag, dados });
+  } else {
+    respostasValidadas.delete(url);
+  }
+  return { response, dados, modificado: true };
+}
+
+function formatarIdade(segundos) {
+  if (segundos < 60) return `${segundos}s`;
+  if (segundos < 3600) return `${Math.round(segundos / 60)} min`;
+  return `${Math.round(segundos / 3600)} h`;
+}
+
 async function checkSystemReady() {
   try {
     const response = await fetch(`${API}/registros?limit=1`);
@@ -397,29 +432,58 @@ async function checkSystemReady() {
   }
 }
 
-function processDataForChart(dados) {
-  if (!dados || !Array.isArray(dados) || dados.length === 0) {
-    console.warn('Dados inválidos ou vazios:', dados);
-    return;
+// Lê o formato binário de /series.bin (ver backend/serializacao.py). Cada coluna
+// vira uma view (Int32Array/Float32Array) sobre o próprio buffer, sem cópia nem parse.
+// Os valores vêm em little-endian, a ordem nativa dos navegadores.
+function lerSeriesBinarias(buffer) {
+  const dv = new DataView(buffer);
+  const magico = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+  if (magico !== 'ESTB') {
+    throw new Error('Formato de série desconhecido');
   }
+  const nColunas = dv.getUint16(6, true);
+  const n = dv.getUint32(8, true);
+  const decoder = new TextDecoder('ascii');
+
+  let offset = 16;
+  const nomes = [];
+  for (let i = 0; i < nColunas; i++) {
+    nomes.push(decoder.decode(new Uint8Array(buffer, offset, 24)).replace(/\0+$/, ''));
+    offset += 24;
+  }
+
+  const colunas = { n };
+  nomes.forEach((nome, i) => {
+    colunas[nome] = i === 0 ? new Int32Array(buffer, offset, n) : new Float32Array(buffer, offset, n);
+    offset += 4 * n;
+  });
+  return colunas;
+}
+
+function paraGrafico(coluna) {
+  // Chart.js espera arrays comuns; NaN (sem leitura) vira lacuna
+  return Array.from(coluna, v => (Number.isNaN(v) ? null : Math.round(v * 100) / 100));
+}
+
+async function atualizarGrafico() {
+  const { dados: colunas, modificado } = await fetchComValidador(
+    `${API}/series.bin?limit=20`,
+    response => response.arrayBuffer().then(lerSeriesBinarias)
+  );
+  if (!modificado || colunas.n === 0) return;
 
   try {
-    const dadosOrdenados = [...dados].sort((a, b) => new Date(a.timestamp) - new Date(b.timestamp));
-    const dadosLimitados = dadosOrdenados.slice(-20);
-
-    const labels = dadosLimitados.map(item => {
-      const date = new Date(item.timestamp);
-      return date.toLocaleTimeString('pt-BR', {
-        hour: '2-digit',
-        minute: '2-digit',
-        second: '2-digit'
-      });
-    });
+    // Epoch do backend = horário local da estufa contado como UTC
+    const labels = Array.from(colunas.epoch, epoch => new Date(epoch * 1000).toLocaleTimeString('pt-BR', {
+      hour: '2-digit',
+      minute: '2-digit',
+      second: '2-digit',
+      timeZone: 'UTC'
+    }));
 
-    const temperaturas = dadosLimitados.map(item => parseFloat(item.temperatura));
-    const umidades = dadosLimitados.map(item => parseFloat(item.umidade));
-    const luminosidades = dadosLimitados.map(item => parseFloat(item.luminosidade || 0));
-    const niveisAgua = dadosLimitados.map(item => parseFloat(item.nivel_reservatorio || 0));
+    const temperaturas = paraGrafico(colunas.temperatura);
+    const umidades = paraGrafico(colunas.umidade);
+    const luminosidades = paraGrafico(colunas.luminosidade);
 
     els.graf.data.labels = labels;
     els.graf.data.datasets[0].data = temperaturas;
@@ -430,15 +494,15 @@ function processDataForChart(dados) {
 
     state.chartData = {
       labels,
-      temperatura: temperaturas,
-      umidade: umidades,
-      luminosidade: luminosidades,
-      nivel_agua: niveisAgua
+      temperatura: colunas.temperatura,
+      umidade: colunas.umidade,
+      luminosidade: colunas.luminosidade,
+      nivel_agua: colunas.nivel_reservatorio
     };
 
     document.querySelector('.chart-container').classList.remove('chart-error', 'chart-loading');
 
-    console.log('📊 Gráfico atualizado com', dadosLimitados.length, 'pontos de dados');
+    console.log('📊 Gráfico atualizado com', colunas.n, 'pontos de dados');
 
   } catch (error) {
     console.error('Erro ao processar dados para gráfico:', error);
@@ -550,13 +614,7 @@ async function tick() {
   try {
     console.log('🔄 Buscando dados do servidor...');
 
-    const response = await fetch(`${API}/registros?limit=20`);
-
-    if (!response.ok) {
-      throw new Error(`Erro HTTP: ${response.status}`);
-    }
-
-    const dados = await response.json();
+    const { response, dados, modificado } = await fetchComValidador(`${API}/registros?limit=20`);
 
     if (!Array.isArray(dados)) {
       throw new Error('Dados recebidos não são um array válido');
@@ -567,21 +625,31 @@ async function tick() {
       return;
     }
 
-    console.log('✅ Dados recebidos:', dados.length, 'registros');
+    // 304: nada mudou desde a última busca, não precisa redesenhar
+    if (modificado) {
+      console.log('✅ Dados recebidos:', dados.length, 'registros');
 
-    const previousData = state.previousData;
-    state.previousData = { ...state.estufaData };
+      const previousData = state.previousData;
+      state.previousData = { ...state.estufaData };
 
-    processDataForChart(dados);
-    updateTable(dados);
-    updateGlobalData(dados);
-    updateCurrentValues();
+      updateTable(dados);
+      updateGlobalData(dados);
+      updateCurrentValues();
 
-    if (previousData) {
-      updateTrendIndicators(state.estufaData, previousData);
+      if (previousData) {
+        updateTrendIndicators(state.estufaData, previousData);
+      }
     }
 
-    state.connectionStatus = 'connected';
+    await atualizarGrafico();
+
+    // Backend recém-reiniciado ou servidor externo fora: dados antigos, marcados pelo backend
+    if (response.headers.get('X-Dados-Desatualizados') === '1') {
+      state.idadeDados = parseInt(response.headers.get('X-Idade-Dados') || '0', 10);
+      state.connectionStatus = 'stale';
+    } else {
+      state.connectionStatus = 'connected';
+    }
     updateConnectionStatus();
 
   } catch (error) {
@@ -0,0 +1,243 @@
+"""
+Diagnóstico sob demanda em produção: amostrador de pilhas e memória.
+
+* `amostrar_pilhas(segundos)`: de `intervalo` em `intervalo` segundos,
+  captura a pilha de todas as threads (sys._current_frames) e conta as
+  pilhas iguais. O resultado sai no formato "collapsed" (uma linha
+  `thread;mod:func;mod:func N` por pilha), que o flamegraph.pl e o
+  speedscope leem direto. É tempo de parede: threads bloqueadas aparecem
+  na função em que estão esperando. A pilha da thread de um loop asyncio
+  só mostra a corrotina que está rodando naquele instante; com `loop`,
+  cada task suspensa do loop também entra, como `task:<nome>;...` até o
+  await em que está parada.
+* `memoria()`: top-N de alocações do tracemalloc e diferença para o
+  snapshot anterior. Na primeira chamada liga o tracemalloc (que tem custo
+  enquanto estiver ligado); `parar=True` desliga.
+
+Este arquivo existe igual em backend/ e infraestrutura/ (ver metricas.py).
+"""
+
+import asyncio
+import base64
+import collections
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from urllib.parse import parse_qs
+
+MAX_SEGUNDOS = 60
+MIN_INTERVALO = 0.001
+
+_lock_perfil = threading.Lock()
+_lock_memoria = threading.Lock()
+_snapshot_anterior = None
+_rotulos = {}
+
+
+def _rotulo(codigo):
+    rotulo = _rotulos.get(codigo)
+    if rotulo is None:
+        modulo = os.path.splitext(os.path.basename(codigo.co_filename))[0]
+        rotulo = _rotulos[codigo] = f"{modulo}:{codigo.co_name}"
+    return rotulo
+
+
+def _pilha(frame):
+    partes = []
+    while frame is not None:
+        partes.append(_rotulo(frame.f_code))
+        frame = frame.f_back
+    partes.reverse()
+    return partes
+
+
+def _pilha_corrotina(coro):
+    # Segue a cadeia de awaits (cr_await) até o Future em que a task espera
+    partes = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        partes.append(_rotulo(frame.f_code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return partes
+
+
+def _pilhas_tasks(loop, contagem):
+    try:
+        tasks = asyncio.all_tasks(loop)
+    except RuntimeError:
+        return
+    for task in tasks:
+        pilha = _pilha_corrotina(task.get_coro())
+        if pilha:
+            contagem[";".join([f"task:{task.get_name()}"] + pilha)] += 1
+
+
+def parametros_perfil(parametros):
+    """(segundos, intervalo em s) de ?seconds= e ?intervalo_ms=; ValueError se não forem números."""
+    return float(parametros.get("seconds", 10)), float(parametros.get("intervalo_ms", 5)) / 1000
+
+
+def amostrar_pilhas(segundos, intervalo=0.005, loop=None):
+    """
+    {pilha colapsada: amostras} durante `segundos`, mais as tasks de `loop`
+    (um loop asyncio de outra thread), se informado. Só um perfil por vez:
+    levanta RuntimeError se outro já estiver rodando.
+    """
+    if not _lock_perfil.acquire(blocking=False):
+        raise RuntimeError("já existe um perfil em andamento")
+    try:
+        proprio = threading.get_ident()
+        contagem = collections.Counter()
+        fim = time.perf_counter() + min(float(segundos), MAX_SEGUNDOS)
+        intervalo = max(intervalo, MIN_INTERVALO)
+        while time.perf_counter() < fim:
+            nomes = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == proprio:
+                    continue
+                pilha = [nomes.get(ident, str(ident))] + _pilha(frame)
+                contagem[";".join(pilha)] += 1
+            if loop is not None:
+                _pilhas_tasks(loop, contagem)
+            time.sleep(intervalo)
+        return contagem
+    finally:
+        _lock_perfil.release()
+
+
+def texto_collapsed(contagem):
+    return "".join(f"{pilha} {n}\n" for pilha, n in contagem.most_common())
+
+
+def resumo_pilhas(contagem, top=20):
+    """Funções com mais amostras no topo da pilha (próprio) e em qualquer nível (total)."""
+    total = sum(contagem.values()) or 1
+    proprio = collections.Counter()
+    inclusivo = collections.Counter()
+    for pilha, n in contagem.items():
+        quadros = pilha.split(";")[1:]
+        if quadros:
+            proprio[quadros[-1]] += n
+        for quadro in set(quadros):
+            inclusivo[quadro] += n
+    return {
+        "amostras": sum(contagem.values()),
+        "proprio": [{"funcao": f, "fracao": round(n / total, 4)} for f, n in proprio.most_common(top)],
+        "total": [{"funcao": f, "fracao": round(n / total, 4)} for f, n in inclusivo.most_common(top)],
+    }
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for linha in f:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def memoria(top=20, agrupar="lineno", parar=False, quadros=25):
+    """Top-N do tracemalloc e diferença para o snapshot anterior (dict JSON)."""
+    global _snapshot_anterior
+    if agrupar not in ("lineno", "filename", "traceback"):
+        agrupar = "lineno"
+    with _lock_memoria:
+        if parar:
+            tracemalloc.stop()
+            _snapshot_anterior = None
+            return {"rastreando": False, "rss_bytes": _rss_bytes()}
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(quadros)
+            _snapshot_anterior = None
+            return {"rastreando": True, "iniciado_agora": True, "rss_bytes": _rss_bytes(),
+                    "mensagem": "tracemalloc ligado; só alocações a partir de agora aparecem"}
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        atual, pico = tracemalloc.get_traced_memory()
+        resultado = {
+            "rastreando": True,
+            "rss_bytes": _rss_bytes(),
+            "rastreado_bytes": atual,
+            "pico_bytes": pico,
+            "top": [{
+                "local": _local(s.traceback, agrupar),
+                "bytes": s.size,
+                "blocos": s.count,
+            } for s in snapshot.statistics(agrupar)[:top]],
+        }
+        if _snapshot_anterior is not None:
+            resultado["diferenca"] = [{
+                "local": _local(d.traceback, agrupar),
+                "bytes": d.size,
+                "bytes_diff": d.size_diff,
+                "blocos_diff": d.count_diff,
+            } for d in snapshot.compare_to(_snapshot_anterior, agrupar)[:top]]
+        _snapshot_anterior = snapshot
+        return resultado
+
+
+def _local(traceback, agrupar):
+    if agrupar == "traceback":
+        return [f"{q.filename}:{q.lineno}" for q in traceback]
+    quadro = traceback[0]
+    return quadro.filename if agrupar == "filename" else f"{quadro.filename}:{quadro.lineno}"
+
+
+def autorizado(cabecalho, usuario, senha):
+    """Confere um cabeçalho Authorization Basic."""
+    if not cabecalho or not cabecalho.startswith("Basic "):
+        return False
+    try:
+        u, _, s = base64.b64decode(cabecalho[6:]).decode().partition(":")
+    except Exception:
+        return False
+    return u == usuario and s == senha
+
+
+def rotas_http(usuario, senha, loop=None):
+    """
+    Rotas /debug/profile e /debug/memory para `metricas_http.servir_http`, com
+    Basic Auth (processos sem Flask, como o bridge). Com `loop`, o perfil
+    inclui as tasks asyncio dele.
+    """
+    def protegida(funcao):
+        def rota(parametros, cabecalhos):
+            if not autorizado(cabecalhos.get("Authorization"), usuario, senha):
+                return 401, "text/plain; charset=utf-8", "Acesso restrito.".encode(), {
+                    "WWW-Authenticate": 'Basic realm="Estufa IoT"'}
+            return funcao({k: v[-1] for k, v in parse_qs(parametros).items()})
+        return rota
+
+    def perfil(p):
+        try:
+            segundos, intervalo = parametros_perfil(p)
+        except ValueError:
+            return 400, "text/plain; charset=utf-8", "seconds e intervalo_ms devem ser números.".encode(), {}
+        try:
+            contagem = amostrar_pilhas(segundos, intervalo, loop)
+        except RuntimeError as e:
+            return 409, "text/plain; charset=utf-8", str(e).encode(), {}
+        if p.get("formato") == "json":
+            return 200, "application/json", json.dumps(resumo_pilhas(contagem)).encode(), {}
+        return 200, "text/plain; charset=utf-8", texto_collapsed(contagem).encode(), {}
+
+    def mem(p):
+        try:
+            top = int(p.get("top", 20))
+        except ValueError:
+            return 400, "text/plain; charset=utf-8", "top deve ser um inteiro.".encode(), {}
+        resultado = memoria(top=top, agrupar=p.get("agrupar", "lineno"),
+                            parar=p.get("parar") == "1")
+        return 200, "application/json", json.dumps(resultado).encode(), {}
+
+    return {"/debug/profile": protegida(perfil), "/debug/memory": protegida(mem)}
@@ -10,12 +10,15 @@ import os
 import sys
 import csv
 import json
+import re
 import time
 import logging
 import logging.handlers
 import asyncio
 import threading
+from collections import deque
 from datetime import datetime
+from urllib.parse import parse_qs
 
 
 EXPECTED_PYTHON = "/home/pi4b/Desktop/Estufa-IoT/infraestrutura/venv/bin/python3"
@@ -45,6 +48,15 @@ except Exception:
         def cleanup(self): print("[SIM] GPIO cleanup")
     GPIO = _MockGPIO()
 
+from metricas import Registro
+from metricas_http import servir_http
+import diagnostico
+from ingestao import FilaIngestao
+from payload import Decodificador
+from lvc import CacheUltimoValor, nome_segmento, remover as remover_lvc
+import historico
+import http_async
+
 # asyncua (OPC UA)
 try:
     from asyncua import Server
@@ -62,7 +74,7 @@ os.makedirs(LOG_DIR, exist_ok=True)
 
 LOG_FILE = os.path.join(LOG_DIR, "estufa_opcua.log")
 JSON_ESTADO = os.path.join(DATA_DIR, "estado.json")
-JSON_REGISTRO = os.path.join(DATA_DIR,"registros.json")
+JSON_REGISTRO = os.path.join(DATA_DIR, historico.ARQUIVO)
 
 logger = logging.getLogger("estufa")
 logger.setLevel(logging.INFO)
@@ -95,9 +107,9 @@ for name, pin in PINS.items():
         logger.exception("Erro ao configurar pino %s (%s). Continuando em modo simulacao.", name, pin)
 
 # -------------------------
-# variáveis de processo e setpoints
+# variáveis de processo e setpoints (valores iniciais de cada estufa)
 # -------------------------
-dados = {
+DADOS_INICIAIS = {
     "temperatura": None,
     "umidade": None,
     "luminosidade": None,
@@ -106,7 +118,7 @@ dados = {
     "nivel_alto": False
 }
 
-setpoints = {
+SETPOINTS_INICIAIS = {
     "temperatura_setpoint": 30.0,
     "umidade_setpoint": 70.0,
     "luminosidade_setpoint": 300.0,
@@ -114,162 +126,339 @@ setpoints = {
 }
 TOLERANCIA = 1.0
 
-estado_reles = {n: False for n in PINS.keys()}
-feedbacks = {}
-for n in PINS.keys():
-    feedbacks[f"{n}_fb_ativado"] = False
-    feedbacks[f"{n}_fb_desativado"] = True
-
-alarmes = {
-    "alarme_temperatura_baixo": False,
-    "alarme_temperatura_alto": False,
-    "alarme_umidade_baixo": False,
-    "alarme_umidade_alto": False,
-    "alarme_luminosidade_baixo": False,
-    "alarme_luminosidade_alto": False,
-    "alarme_umidade_solo_baixo": False,
-    "alarme_umidade_solo_alto": False
-}
-
-modo_manual = False
-liga_geral = True
+ALARMES = [
+    "alarme_temperatura_baixo",
+    "alarme_temperatura_alto",
+    "alarme_umidade_baixo",
+    "alarme_umidade_alto",
+    "alarme_luminosidade_baixo",
+    "alarme_luminosidade_alto",
+    "alarme_umidade_solo_baixo",
+    "alarme_umidade_solo_alto"
+]
 
 # MQTT
 MQTT_BROKER = "localhost"
 MQTT_PORT = 1883
 MQTT_TOPIC = "estufa/sensores"
+# Outras estufas publicam em estufa/<site>/sensores
+MQTT_TOPIC_SITES = "estufa/+/sensores"
+# Estado dos relés publicado a cada mudança (retido): NodeMCU e simulador_planta.py
+MQTT_TOPIC_ACIONAMENTOS = "estufa/acionamentos"
 mqtt_client = mqtt.Client()
 
-data_lock = threading.Lock()
+# Fila entre o on_message e o estado (ver ingestao.py)
+INGESTAO_CAPACIDADE = int(os.getenv("INGESTAO_CAPACIDADE", 10000))  # por fila
+INGESTAO_POLITICA = os.getenv("INGESTAO_POLITICA", "descartar_antigas")  # ou "ultimo_valor"
+INGESTAO_LOTE = int(os.getenv("INGESTAO_LOTE", 500))
+# Filas (threads) de ingestão; cada tópico cai sempre na mesma, o que preserva a ordem por estufa
+INGESTAO_FILAS = max(1, int(os.getenv("INGESTAO_FILAS", 4)))
+
+# Período do loop de controle; menor para rodar com o simulador_planta.py acelerado
+CICLO_SEGUNDOS = float(os.getenv("CICLO_SEGUNDOS", 60))
+# Estufa cujo ciclo falha seguidamente fica de fora de 1, 3, 7... ciclos, até este máximo
+CICLO_ERRO_PULAR_MAX = int(os.getenv("CICLO_ERRO_PULAR_MAX", 15))
+
+# -------------------------
+# estufas (sites)
+# -------------------------
+# A estufa local (relés no GPIO deste Pi) publica em estufa/sensores e recebe
+# os relés em estufa/acionamentos; as demais usam estufa/<site>/sensores e
+# estufa/<site>/acionamentos e só têm relés virtuais, acionados pelo MQTT.
+SITE_LOCAL = os.getenv("SITE_LOCAL", "principal")
+# Último estado de cada estufa também em memória compartilhada, para o /estado (ver lvc.py)
+LVC_ATIVO = os.getenv("ESTUFA_LVC", "1") == "1"
+# Últimos registros de cada estufa mantidos em memória para o /registros da API
+# (~100 KB por estufa); limit maior lê o registros.ndjson (ver historico.py)
+HISTORICO_MEMORIA = max(1, int(os.getenv("HISTORICO_MEMORIA", 200)))
+# Limite de estufas criadas por tópico (protege contra tópicos espúrios)
+MAX_SITES = int(os.getenv("MAX_SITES", 1000))
+# O nome vira diretório em data/sites/: sem "/", "." ou espaços
+NOME_SITE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class Site:
+    """Estado de uma estufa, com o próprio lock: estufas diferentes não disputam o mesmo."""
+
+    def __init__(self, nome, local=False):
+        self.nome = nome
+        self.local = local
+        self.dados = dict(DADOS_INICIAIS)
+        self.setpoints = dict(SETPOINTS_INICIAIS)
+        self.estado_reles = {n: False for n in PINS.keys()}
+        self.feedbacks = {}
+        for n in PINS.keys():
+            self.feedbacks[f"{n}_fb_ativado"] = False
+            self.feedbacks[f"{n}_fb_desativado"] = True
+        self.alarmes = {a: False for a in ALARMES}
+        self.modo_manual = False
+        self.liga_geral = True
+        self.lock = threading.Lock()
+        if local:
+            self.data_dir = DATA_DIR
+            self.topico_acionamentos = MQTT_TOPIC_ACIONAMENTOS
+        else:
+            self.data_dir = os.path.join(DATA_DIR, "sites", nome)
+            self.topico_acionamentos = f"estufa/{nome}/acionamentos"
+        os.makedirs(self.data_dir, exist_ok=True)
+        # Fora do loop asyncio: a estufa local nasce na importação e as outras na thread de ingestão
+        historico.migrar(self.data_dir)
+        self.registros_path = os.path.join(self.data_dir, historico.ARQUIVO)
+        # Fim do histórico em memória, já serializado (linhas do registros.ndjson)
+        self.historico = deque(historico.ler_ultimas_linhas(self.registros_path, HISTORICO_MEMORIA),
+                               maxlen=HISTORICO_MEMORIA)
+        self.lvc = None
+        if LVC_ATIVO:
+            try:
+                self.lvc = CacheUltimoValor.criar(nome_segmento(nome))
+            except OSError:
+                logger.exception("LVC indisponível para %s; /estado fica só com o arquivo", nome)
+        if self.lvc is None:
+            # Um segmento de uma execução anterior serviria um estado parado no /estado
+            try:
+                remover_lvc(nome_segmento(nome))
+            except OSError:
+                logger.exception("Não foi possível remover o LVC antigo de %s", nome)
+
+
+site_local = Site(SITE_LOCAL, local=True)
+sites = {SITE_LOCAL: site_local}
+sites_lock = threading.Lock()
+
+# Nomes de antes: continuam apontando para o estado da estufa local
+dados = site_local.dados
+setpoints = site_local.setpoints
+estado_reles = site_local.estado_reles
+feedbacks = site_local.feedbacks
+alarmes = site_local.alarmes
+data_lock = site_local.lock
+
+
+def obter_site(nome):
+    """Estufa pelo nome, criada na primeira mensagem; None se o nome é inválido ou passou de MAX_SITES."""
+    site = sites.get(nome)
+    if site is not None:
+        return site
+    if not NOME_SITE.match(nome):
+        return None
+    with sites_lock:
+        site = sites.get(nome)
+        if site is None:
+            if len(sites) >= MAX_SITES:
+                return None
+            site = Site(nome)
+            sites[nome] = site
+            logger.info("Nova estufa: %s (%d no total)", nome, len(sites))
+    return site
+
+
+def site_do_topico(topico):
+    """estufa/sensores -> estufa local; estufa/<site>/sensores -> <site>."""
+    if topico == MQTT_TOPIC:
+        return site_local
+    partes = topico.split("/")
+    if len(partes) != 3:
+        return None
+    return obter_site(partes[1])
+
+# -------------------------
+# métricas (Prometheus, http://<pi>:METRICAS_PORTA/metrics; 0 desativa)
+# -------------------------
+METRICAS_PORTA = int(os.getenv("METRICAS_PORTA", 9101))
+# API HTTP dentro do loop do bridge (/estado, /registros, /stream); 0 desativa.
+# Com 5000 ela substitui o http_server.py (que então não deve rodar)
+BRIDGE_HTTP_PORTA = int(os.getenv("BRIDGE_HTTP_PORTA", 0))
+# Login das rotas /debug/* e da API (o mesmo do http_server.py)
+USERNAME = "admin"
+PASSWORD = "12345"
+metricas = Registro()
+metrica_ciclo = metricas.histograma(
+    "estufa_bridge_ciclo_segundos", "Duração de cada ciclo do loop OPC UA, todas as estufas (sem a espera)",
+    baldes=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+metrica_ciclo_erros = metricas.contador(
+    "estufa_bridge_ciclo_erros_total", "Ciclos de uma estufa no loop OPC UA que terminaram em exceção", ("site",))
+metrica_mqtt = metricas.contador(
+    "estufa_bridge_mqtt_mensagens_total", "Mensagens MQTT recebidas", ("resultado",))
+# Só para mensagens com "ts_envio" (epoch do publicador, ex.: simulador_carga.py)
+metrica_ingestao = metricas.histograma(
+    "estufa_bridge_ingestao_latencia_segundos", "Do envio pelo publicador até a aplicação no estado",
+    baldes=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+metrica_lote = metricas.histograma(
+    "estufa_bridge_ingestao_lote_mensagens", "Mensagens aplicadas no estado por lote",
+    baldes=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000))
+
+
+def _descartes():
+    total = {}
+    for fila in filas_ingestao:
+        for motivo, n in fila.descartadas.items():
+            total[(motivo,)] = total.get((motivo,), 0) + n
+    return total
+
+metricas.coletor("estufa_bridge_ingestao_recebidas_total", "counter",
+                 "Mensagens MQTT colocadas nas filas de ingestão", (),
+                 lambda: sum(f.recebidas for f in filas_ingestao))
+metricas.coletor("estufa_bridge_ingestao_descartes_total", "counter",
+                 "Mensagens descartadas pelas filas (cheia ou substituída pelo último valor)", ("motivo",),
+                 _descartes)
+metricas.medidor("estufa_bridge_ingestao_fila", "Mensagens aguardando em cada fila de ingestão", ("fila",),
+                 funcao=lambda: {(str(i),): f.profundidade() for i, f in enumerate(filas_ingestao)})
+metrica_rejeitadas = metricas.contador(
+    "estufa_bridge_ingestao_rejeitadas_total", "Leituras rejeitadas no ingest (tipo inválido ou fora da faixa)",
+    ("variavel", "motivo"))
+metrica_mqtt_ultima = metricas.medidor(
+    "estufa_bridge_mqtt_ultima_mensagem_timestamp", "Hora (epoch) da última mensagem MQTT válida")
+metrica_acionamentos = metricas.contador(
+    "estufa_bridge_acionamentos_total", "Mudanças de estado dos relés", ("site", "rele", "estado"))
+metricas.medidor("estufa_bridge_sites", "Estufas atendidas por este bridge", funcao=lambda: len(sites))
+metricas.medidor("estufa_bridge_rele_ligado", "Estado atual dos relés", ("site", "rele"),
+                 funcao=lambda: {(s.nome, n): int(v)
+                                 for s in list(sites.values()) for n, v in s.estado_reles.items()})
+
+def _valor_sensor(v):
+    if isinstance(v, bool):
+        return int(v)
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+metricas.medidor("estufa_bridge_sensor", "Última leitura de cada sensor", ("site", "variavel"),
+                 funcao=lambda: {(s.nome, k): _valor_sensor(v)
+                                 for s in list(sites.values()) for k, v in s.dados.items()})
 
 # -------------------------
 # funções utilitárias
 # -------------------------
-def registrar_json_row():
+def escrever_atomico(caminho, texto):
+    """Grava num temporário e troca com os.replace: quem lê nunca vê o arquivo pela metade."""
+    temporario = caminho + ".tmp"
+    with open(temporario, "w") as f:
+        f.write(texto)
+    os.replace(temporario, caminho)
+
+def montar_registro(site=site_local):
+    """Estado atual da estufa no formato do estado.json / registros.ndjson."""
+    with site.lock:
+        leituras = dict(site.dados)
     entry = {
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "temperatura":dados.get("temperatura"),
-        "umidade": dados.get("umidade"),
-        "luminosidade": dados.get("luminosidade"),
-        "umidade_solo":dados.get("umidade_solo"),
-        "nivel_baixo":bool(dados.get("nivel_baixo")),
-        "nivel_alto": bool(dados.get("nivel_alto")),
-        #Estado do relés
-        "bomba": int(bool(estado_reles["bomba"])),
-        "valvula": int(bool(estado_reles["valvula"])),
-        "luminaria": int(bool(estado_reles["luminaria"])),
-        "ventilador": int(bool(estado_reles["ventilador"])),
-        "exaustor": int(bool(estado_reles["exaustor"])),
-        "emergencia": int(bool(estado_reles["emergencia"])),
-        # Feedbacka
-        "bomba_fb_ativado": int(bool(feedbacks["bomba_fb_ativado"])),       
-        "bomba_fb_desativado": int(bool(feedbacks["bomba_fb_desativado"])),
-        "valvula_fb_ativado": int(bool(feedbacks["valvula_fb_ativado"])),
-        "valvula_fb_desativado": int(bool(feedbacks["valvula_fb_desativado"])),
-        "luminaria_fb_ativado": int(bool(feedbacks["luminaria_fb_ativado"])),
-        "luminaria_fb_desativado": int(bool(feedbacks["luminaria_fb_desativado"])),
-        "ventilador_fb_ativado": int(bool(feedbacks["ventilador_fb_ativado"])),
-        "ventilador_fb_desativado": int(bool(feedbacks["ventilador_fb_desativado"])),
-        "exaustor_fb_ativado": int(bool(feedbacks["exaustor_fb_ativado"])),
-        "exaustor_fb_desativado": int(bool(feedbacks["exaustor_fb_desativado"])),
-        "emergencia_fb_ativado": int(bool(feedbacks["emergencia_fb_ativado"])),
-        "emergencia_fb_desativado": int(bool(feedbacks["emergencia_fb_desativado"])),
-        #Alarmes
-        "alarme_temperatura_baixo": int(bool(alarmes["alarme_temperatura_baixo"])),
-        "alarme_temperatura_alto": int(bool(alarmes["alarme_temperatura_alto"])),
-        "alarme_umidade_baixo": int(bool(alarmes["alarme_umidade_baixo"])),
-        "alarme_umidade_alto": int(bool(alarmes["alarme_umidade_alto"])),
-        "alarme_luminosidade_baixo": int(bool(alarmes["alarme_luminosidade_baixo"])),
-        "alarme_luminosidade_alto": int(bool(alarmes["alarme_luminosidade_alto"])),
-        "alarme_umidade_solo_baixo": int(bool(alarmes["alarme_umidade_solo_baixo"])),
-        "alarme_umidade_solo_alto": int(bool(alarmes["alarme_umidade_solo_alto"])),
+        "temperatura": leituras.get("temperatura"),
+        "umidade": leituras.get("umidade"),
+        "luminosidade": leituras.get("luminosidade"),
+        "umidade_solo": leituras.get("umidade_solo"),
+        "nivel_baixo": bool(leituras.get("nivel_baixo")),
+        "nivel_alto": bool(leituras.get("nivel_alto")),
     }
+    # Estado dos relés, feedbacks e alarmes, na ordem de PINS / ALARMES
+    entry.update({n: int(bool(v)) for n, v in site.estado_reles.items()})
+    entry.update({n: int(bool(v)) for n, v in site.feedbacks.items()})
+    entry.update({n: int(bool(v)) for n, v in site.alarmes.items()})
+    return entry
+
+def registrar_json_row(site=site_local):
+    """
+    Registro do ciclo: publica no LVC e no histórico em memória e devolve
+    (estado, linha) para `gravar_registro()`, que faz a parte em disco.
+    """
+    entry = montar_registro(site)
+
+    estado = json.dumps(entry, indent=2)
+    if site.lvc is not None:
+        try:
+            site.lvc.escrever(estado.encode())
+        except ValueError:
+            # Sem invalidar, o /estado continuaria servindo o último estado que coube
+            site.lvc.invalidar()
+            logger.exception("Estado de %s não coube no LVC", site.nome)
+    texto = historico.linha(entry)
+    site.historico.append(texto)
+    return estado, texto
 
-    estado_path = os.path.join(DATA_DIR,"estado.json")
-    with open(estado_path, "w") as f:
-        json.dump(entry, f, indent=2)
-
-    registros_path = os.path.join(DATA_DIR,"registros.json")
-
-    if os.path.isfile(registros_path):
-        with open(registros_path, "r") as f:
-           try:
-               historico = json.load(f)
-               if not isinstance(historico, list):
-                   historico = []
-           except Exception:
-               historico = []
-
-    else:
-        historico = []
-
-    historico.append(entry)
-
-    with open(registros_path, "w") as f:
-        json.dump(historico, f,indent=2)
+def gravar_registro(site, estado, texto):
+    """estado.json (atômico) e uma linha a mais no registros.ndjson; roda fora do loop asyncio."""
+    escrever_atomico(os.path.join(site.data_dir, "estado.json"), estado)
+    historico.anexar(site.registros_path, texto)
 
 
 
 
 
-def atualizar_hardware(nome, estado: bool):
+def atualizar_hardware(nome, estado: bool, site=site_local):
     if nome not in PINS:
         logger.error("Atualizacao hardware solicitada para nome inválido: %s", nome)
         return
+    if site.local:
+        # Só a estufa local tem relés neste Pi; as outras recebem pelo MQTT
+        try:
+            GPIO.output(PINS[nome], GPIO.HIGH if estado else GPIO.LOW)
+        except Exception:
+            logger.exception("Falha ao escrever pino %s", nome)
+    mudou = site.estado_reles[nome] != bool(estado)
+    if mudou:
+        # O controle reafirma o estado a cada ciclo; só conta as mudanças
+        metrica_acionamentos.inc(site=site.nome, rele=nome, estado="on" if estado else "off")
+    site.estado_reles[nome] = bool(estado)
+    site.feedbacks[f"{nome}_fb_ativado"] = bool(estado)
+    site.feedbacks[f"{nome}_fb_desativado"] = not bool(estado)
+    if mudou:
+        publicar_acionamentos(site)
+    # Com centenas de estufas, reafirmar o estado a cada ciclo encheria o log
+    logger.log(logging.INFO if mudou else logging.DEBUG,
+               "Hardware %s/%s -> %s", site.nome, nome, "ON" if estado else "OFF")
+
+def publicar_acionamentos(site=site_local):
+    payload = dict(site.estado_reles, timestamp=datetime.now().isoformat())
     try:
-        GPIO.output(PINS[nome], GPIO.HIGH if estado else GPIO.LOW)
+        mqtt_client.publish(site.topico_acionamentos, json.dumps(payload), retain=True)
     except Exception:
-        logger.exception("Falha ao escrever pino %s", nome)
-    estado_reles[nome] = bool(estado)
-    feedbacks[f"{nome}_fb_ativado"] = bool(estado)
-    feedbacks[f"{nome}_fb_desativado"] = not bool(estado)
-    logger.info("Hardware %s -> %s", nome, "ON" if estado else "OFF")
-
-def atualizar_alarmes():
-    with data_lock:
-        for sp_key, sp in setpoints.items():
+        logger.exception("Falha ao publicar acionamentos de %s", site.nome)
+
+def atualizar_alarmes(site=site_local):
+    with site.lock:
+        for sp_key, sp in site.setpoints.items():
             var = sp_key.replace("_setpoint", "")
-            val = dados.get(var)
+            val = site.dados.get(var)
             if val is None:
-                alarmes[f"alarme_{var}_baixo"] = False
-                alarmes[f"alarme_{var}_alto"] = False
+                site.alarmes[f"alarme_{var}_baixo"] = False
+                site.alarmes[f"alarme_{var}_alto"] = False
             else:
-                alarmes[f"alarme_{var}_baixo"] = val < (sp - TOLERANCIA)
-                alarmes[f"alarme_{var}_alto"] = val > (sp + TOLERANCIA)
+                site.alarmes[f"alarme_{var}_baixo"] = val < (sp - TOLERANCIA)
+                site.alarmes[f"alarme_{var}_alto"] = val > (sp + TOLERANCIA)
 
-def controle_automatico():
-    global modo_manual, liga_geral
-    if modo_manual or not liga_geral:
+def controle_automatico(site=site_local):
+    if site.modo_manual or not site.liga_geral:
         return
-    atualizar_alarmes()
-    with data_lock:
+    atualizar_alarmes(site)
+    with site.lock:
+        dados, setpoints = site.dados, site.setpoints
         sp = setpoints["umidade_solo_setpoint"]
         um_solo = dados.get("umidade_solo")
         if um_solo is not None:
             if um_solo < (sp - TOLERANCIA):
-                atualizar_hardware("bomba", True)
+                atualizar_hardware("bomba", True, site)
             elif um_solo > (sp + TOLERANCIA):
-                atualizar_hardware("bomba", False)
+                atualizar_hardware("bomba", False, site)
         if dados.get("nivel_baixo"):
-            atualizar_hardware("valvula", True)
+            atualizar_hardware("valvula", True, site)
         elif dados.get("nivel_alto"):
-            atualizar_hardware("valvula", False)
+            atualizar_hardware("valvula", False, site)
         sp_l = setpoints["luminosidade_setpoint"]
         light = dados.get("luminosidade")
         if light is not None:
             if light < (sp_l - TOLERANCIA):
-                atualizar_hardware("luminaria", True)
+                atualizar_hardware("luminaria", True, site)
             elif light > (sp_l + TOLERANCIA):
-                atualizar_hardware("luminaria", False)
+                atualizar_hardware("luminaria", False, site)
         sp_t = setpoints["temperatura_setpoint"]
         temp = dados.get("temperatura")
         if temp is not None:
             if temp > (sp_t + TOLERANCIA):
-                atualizar_hardware("ventilador", True)
-                atualizar_hardware("exaustor", True)
+                atualizar_hardware("ventilador", True, site)
+                atualizar_hardware("exaustor", True, site)
             elif temp < (sp_t - TOLERANCIA):
-                atualizar_hardware("ventilador", False)
-                atualizar_hardware("exaustor", False)
+                atualizar_hardware("ventilador", False, site)
+                atualizar_hardware("exaustor", False, site)
 
 # -------------------------
 # MQTT callbacks
@@ -277,37 +466,76 @@ def controle_automatico():
 def on_connect(client, userdata, flags, rc):
     if rc == 0:
         logger.info("Conectado ao broker MQTT %s:%s", MQTT_BROKER, MQTT_PORT)
-        client.subscribe(MQTT_TOPIC)
+        client.subscribe([(MQTT_TOPIC, 0), (MQTT_TOPIC_SITES, 0)])
+        for site in list(sites.values()):
+            publicar_acionamentos(site)
     else:
         logger.error("Falha MQTT. rc=%s", rc)
 
+def rejeitar_leitura(variavel, motivo, valor):
+    metrica_rejeitadas.inc(variavel=variavel, motivo=motivo)
+    logger.debug("Leitura rejeitada (%s): %s=%r", motivo, variavel, valor)
+
+# JSON, MessagePack ou quadro binário; campos, tipos, calibração e faixas do
+# config/mapping.csv (ver payload.py): `dados` só recebe valores tipados
+decodificador = Decodificador(ao_rejeitar=rejeitar_leitura)
+
 def on_message(client, userdata, msg):
-    try:
-        payload = json.loads(msg.payload.decode())
-    except Exception:
-        logger.exception("Payload MQTT inválido")
-        return
-    with data_lock:
-        if "sensor_data" in payload:
-            payload = payload["sensor_data"]
-        if "humidity" in payload:
-            dados["umidade"] = payload.get("humidity")
-        if "light" in payload:
-            dados["luminosidade"] = payload.get("light")
-        if "temperature" in payload:
-            dados["temperatura"] = payload.get("temperature")
-        if "soil_moisture" in payload:
-            dados["umidade_solo"] = payload.get("soil_moisture")
-        if "nivel_baixo" in payload:
-            dados["nivel_baixo"] = bool(payload.get("nivel_baixo"))
-        if "nivel_alto" in payload:
-            dados["nivel_alto"] = bool(payload.get("nivel_alto"))
-    logger.debug("MQTT recebido e atualizado: %s", payload)
+    # Thread de rede do paho: só enfileira (decodificação e locks ficam nas filas).
+    # O mesmo tópico vai sempre para a mesma fila, então cada estufa é aplicada em ordem.
+    filas_ingestao[hash(msg.topic) % INGESTAO_FILAS].colocar(msg.topic, msg.payload)
+
+def processar_lote(lote):
+    """Decodifica um lote da fila e aplica em cada estufa numa única seção crítica."""
+    atualizacoes = {}  # Site -> {variável: valor}
+    envios = []
+    validas = 0
+    for topico, bruto, _recebido_em in lote:
+        site = site_do_topico(topico)
+        if site is None:
+            metrica_mqtt.inc(resultado="site_invalido")
+            logger.warning("Tópico MQTT sem estufa válida: %s", topico)
+            continue
+        try:
+            leituras, ts_envio = decodificador.decodificar(bruto)
+        except Exception as e:
+            # Qualquer erro de um payload (até RecursionError de um JSON aninhado demais)
+            # descarta só esta mensagem, não o lote inteiro da fila
+            metrica_mqtt.inc(resultado="invalido")
+            logger.warning("Payload MQTT inválido em %s (%s): %r", topico, type(e).__name__, bruto[:200])
+            continue
+        # Em ordem de chegada: a leitura mais recente de cada variável vence
+        atualizacoes.setdefault(site, {}).update(leituras)
+        validas += 1
+        if ts_envio is not None:
+            envios.append(ts_envio)
+    for site, atualizacao in atualizacoes.items():
+        if atualizacao:
+            with site.lock:
+                site.dados.update(atualizacao)
+    agora = time.time()
+    metrica_lote.observar(len(lote))
+    if validas:
+        metrica_mqtt.inc(validas, resultado="ok")
+        metrica_mqtt_ultima.set(agora)
+    for ts_envio in envios:
+        try:
+            metrica_ingestao.observar(max(0.0, agora - float(ts_envio)))
+        except (TypeError, ValueError):
+            pass
+    logger.debug("MQTT: lote de %d aplicado em %d estufa(s)", len(lote), len(atualizacoes))
+
+filas_ingestao = [
+    FilaIngestao(processar_lote, INGESTAO_CAPACIDADE, INGESTAO_POLITICA, INGESTAO_LOTE, nome=f"ingestao-mqtt-{i}")
+    for i in range(INGESTAO_FILAS)
+]
 
 mqtt_client.on_connect = on_connect
 mqtt_client.on_message = on_message
 
 def iniciar_mqtt():
+    for fila in filas_ingestao:
+        fila.iniciar()
     try:
         mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
         mqtt_client.loop_start()
@@ -315,127 +543,254 @@ def iniciar_mqtt():
         logger.exception("Erro conectando ao MQTT broker")
 
 # -------------------------
-# OPC UA server (async)
+# API HTTP embutida: mesmas rotas e login do http_server.py, direto da memória
 # -------------------------
-async def servidor_opcua():
-    global modo_manual, liga_geral
-    server = Server()
-    await server.init()
-    
-    # LINHAS CORRIGIDAS - Removidas as chamadas set_certificate e set_private_key
-    # server.set_certificate(None)  # REMOVIDO
-    # server.set_private_key(None)  # REMOVIDO
-    
-    # Endpoint corrigido para usar 0.0.0.0
-    server.set_endpoint("opc.tcp://0.0.0.0:4840/estufa/")
-    server.set_server_name("Estufa Inteligente - OPC UA")
+def _json(status, obj):
+    return status, "application/json", json.dumps(obj).encode(), {}
+
+def _parametros(query):
+    return {k: v[-1] for k, v in parse_qs(query).items()}
+
+def rota_inicio(query, cabecalhos):
+    return _json(200, {
+        "message": "API Estufa IoT (bridge) rodando com autenticação.",
+        "endpoints": ["/estado", "/registros", "/sites", "/stream"]
+    })
+
+def rota_sites(query, cabecalhos):
+    return _json(200, list(sites))
+
+def rota_estado(query, cabecalhos):
+    site = sites.get(_parametros(query).get("site", SITE_LOCAL))
+    if site is None:
+        return _json(404, {"erro": "Estufa não encontrada"})
+    # O último registro do ciclo (o mesmo do estado.json), não uma montagem com o relógio de agora
+    if not site.historico:
+        return _json(404, {"erro": "Nenhum registro ainda"})
+    return 200, "application/json", site.historico[-1].encode(), {}
+
+async def rota_registros(query, cabecalhos):
+    p = _parametros(query)
+    site = sites.get(p.get("site", SITE_LOCAL))
+    if site is None:
+        return _json(404, {"erro": "Estufa não encontrada"})
+    try:
+        limit = int(p.get("limit", 20))
+    except ValueError:
+        return _json(400, {"erro": "limit inválido"})
+    linhas = list(site.historico)
+    if limit > len(linhas) == HISTORICO_MEMORIA:
+        # Mais do que cabe em memória: o fim do arquivo, lido numa thread
+        linhas = await asyncio.to_thread(historico.ler_ultimas_linhas, site.registros_path, limit)
+    linhas = linhas[-limit:] if limit > 0 else []
+    return 200, "application/json", ("[" + ",".join(linhas) + "]").encode(), {}
+
+def fluxo_estado(query, cabecalhos):
+    p = _parametros(query)
+    site = sites.get(p.get("site", SITE_LOCAL))
+    if site is None:
+        return _json(404, {"erro": "Estufa não encontrada"})
+    try:
+        intervalo = max(0.2, float(p.get("intervalo", 1)))
+    except ValueError:
+        return _json(400, {"erro": "intervalo inválido"})
+    return eventos_estado(site, intervalo)
+
+async def eventos_estado(site, intervalo, keepalive=15.0):
+    """Server-Sent Events: o estado atual sempre que muda (sensores, relés ou alarmes)."""
+    anterior = None
+    silencio = 0.0
+    while True:
+        entry = montar_registro(site)
+        atual = {k: v for k, v in entry.items() if k != "timestamp"}
+        if atual != anterior:
+            anterior = atual
+            silencio = 0.0
+            yield f"data: {json.dumps(entry)}\n\n".encode()
+        elif silencio >= keepalive:
+            # Comentário SSE: mantém proxies e o navegador com a conexão aberta
+            silencio = 0.0
+            yield b": keepalive\n\n"
+        await asyncio.sleep(intervalo)
+        silencio += intervalo
+
+ROTAS_API = {
+    "/": rota_inicio,
+    "/sites": rota_sites,
+    "/estado": rota_estado,
+    "/registros": rota_registros,
+}
 
-    ns = await server.register_namespace("EstufaInteligente")
-    obj = await server.nodes.objects.add_object(ns, "Estufa")
+# -------------------------
+# OPC UA server (async)
+# -------------------------
+async def criar_nos_site(server, ns, site):
+    """Objeto OPC UA de uma estufa ("Estufa" para a local, "Estufa_<site>" para as demais)."""
+    obj = await server.nodes.objects.add_object(ns, "Estufa" if site.local else f"Estufa_{site.nome}")
+    nos = {}
 
-    sensor_vars = {}
+    nos["sensores"] = {}
     for k in ["temperatura", "umidade", "luminosidade", "umidade_solo", "nivel_baixo", "nivel_alto"]:
-        initial = dados.get(k)
+        initial = site.dados.get(k)
         if initial is None:
             initial = 0.0
         if isinstance(initial, bool):
             initial = 1.0 if initial else 0.0
         initial = float(initial)
 
-        sensor_vars[k] = await obj.add_variable(ns, k, initial)
-        await sensor_vars[k].set_writable(False)
+        nos["sensores"][k] = await obj.add_variable(ns, k, initial)
+        await nos["sensores"][k].set_writable(False)
 
-    setpoint_vars = {}
-    for k, v in setpoints.items():
-        setpoint_vars[k] = await obj.add_variable(ns, k, v)
-        await setpoint_vars[k].set_writable(True)
+    nos["setpoints"] = {}
+    for k, v in site.setpoints.items():
+        nos["setpoints"][k] = await obj.add_variable(ns, k, v)
+        await nos["setpoints"][k].set_writable(True)
 
-    rele_cmd_on = {}
-    rele_cmd_off = {}
-    rele_state_vars = {}
+    nos["cmd_on"] = {}
+    nos["cmd_off"] = {}
+    nos["estado"] = {}
     for n in PINS.keys():
-        rele_cmd_on[n] = await obj.add_variable(ns, f"{n}_cmd_on", False)
-        await rele_cmd_on[n].set_writable(True)
-        rele_cmd_off[n] = await obj.add_variable(ns, f"{n}_cmd_off", False)
-        await rele_cmd_off[n].set_writable(True)
-        rele_state_vars[n] = await obj.add_variable(ns, f"{n}_state", False)
-        await rele_state_vars[n].set_writable(False)
-
-    feedback_vars = {}
-    for fb_name, fb_val in feedbacks.items():
-        feedback_vars[fb_name] = await obj.add_variable(ns, fb_name, fb_val)
-        await feedback_vars[fb_name].set_writable(False)
-
-    alarme_vars = {}
-    for a_name, a_val in alarmes.items():
-        alarme_vars[a_name] = await obj.add_variable(ns, a_name, a_val)
-        await alarme_vars[a_name].set_writable(False)
-
-    modo_manual_var = await obj.add_variable(ns, "modo_manual", modo_manual)
-    await modo_manual_var.set_writable(True)
-    liga_geral_var = await obj.add_variable(ns, "liga_geral", liga_geral)
-    await liga_geral_var.set_writable(True)
+        nos["cmd_on"][n] = await obj.add_variable(ns, f"{n}_cmd_on", False)
+        await nos["cmd_on"][n].set_writable(True)
+        nos["cmd_off"][n] = await obj.add_variable(ns, f"{n}_cmd_off", False)
+        await nos["cmd_off"][n].set_writable(True)
+        nos["estado"][n] = await obj.add_variable(ns, f"{n}_state", False)
+        await nos["estado"][n].set_writable(False)
+
+    nos["feedbacks"] = {}
+    for fb_name, fb_val in site.feedbacks.items():
+        nos["feedbacks"][fb_name] = await obj.add_variable(ns, fb_name, fb_val)
+        await nos["feedbacks"][fb_name].set_writable(False)
+
+    nos["alarmes"] = {}
+    for a_name, a_val in site.alarmes.items():
+        nos["alarmes"][a_name] = await obj.add_variable(ns, a_name, a_val)
+        await nos["alarmes"][a_name].set_writable(False)
+
+    nos["modo_manual"] = await obj.add_variable(ns, "modo_manual", site.modo_manual)
+    await nos["modo_manual"].set_writable(True)
+    nos["liga_geral"] = await obj.add_variable(ns, "liga_geral", site.liga_geral)
+    await nos["liga_geral"].set_writable(True)
+    return nos
+
+async def ciclo_site(nos, site):
+    """Um ciclo de uma estufa: publica o estado no OPC UA, lê comandos/setpoints e roda o controle."""
+    atualizar_alarmes(site)
+    # Cópia sob o lock: os awaits abaixo não seguram o lock da estufa
+    with site.lock:
+        leituras = dict(site.dados)
+    for k, var in nos["sensores"].items():
+        value = leituras.get(k)
+
+        if value is None:
+            value = 0.0
+        if isinstance(value,bool):
+            value = 1.0 if value else 0.0
+        try:
+            value = float(value)
+        except:
+            value = 0.0
+        await var.write_value(value)
+    for n, var in nos["estado"].items():
+        await var.write_value(site.estado_reles[n])
+    for name, var in nos["feedbacks"].items():
+        await var.write_value(site.feedbacks[name])
+    for name, var in nos["alarmes"].items():
+        await var.write_value(site.alarmes[name])
+
+    for k, var in nos["setpoints"].items():
+        site.setpoints[k] = await var.read_value()
+    site.modo_manual = await nos["modo_manual"].read_value()
+    site.liga_geral = await nos["liga_geral"].read_value()
+
+    for n in PINS.keys():
+        v_on = await nos["cmd_on"][n].read_value()
+        v_off = await nos["cmd_off"][n].read_value()
+        if v_on:
+            atualizar_hardware(n, True, site)
+            await nos["cmd_on"][n].write_value(False)
+        if v_off:
+            atualizar_hardware(n, False, site)
+            await nos["cmd_off"][n].write_value(False)
+
+    if not site.modo_manual:
+        controle_automatico(site)
+
+    if not site.liga_geral:
+        for n in PINS.keys():
+            atualizar_hardware(n, False, site)
+
+    estado, texto = registrar_json_row(site)
+    # Disco numa thread: o loop segue atendendo OPC UA e a API enquanto o cartão SD grava
+    await asyncio.to_thread(gravar_registro, site, estado, texto)
+
+async def servidor_opcua():
+    server = Server()
+    await server.init()
+
+    # LINHAS CORRIGIDAS - Removidas as chamadas set_certificate e set_private_key
+    # server.set_certificate(None)  # REMOVIDO
+    # server.set_private_key(None)  # REMOVIDO
+
+    # Endpoint corrigido para usar 0.0.0.0
+    server.set_endpoint("opc.tcp://0.0.0.0:4840/estufa/")
+    server.set_server_name("Estufa Inteligente - OPC UA")
+
+    ns = await server.register_namespace("EstufaInteligente")
+    # nome da estufa -> nós OPC UA; estufas novas ganham o objeto no ciclo seguinte
+    nos_sites = {site_local.nome: await criar_nos_site(server, ns, site_local)}
 
     logger.info("OPC UA iniciado em opc.tcp://0.0.0.0:4840/estufa/")
 
     async with server:
-        while True:
+        if BRIDGE_HTTP_PORTA:
             try:
-                atualizar_alarmes()
-                with data_lock:
-                    for k, var in sensor_vars.items():
-                        value = dados.get(k)
-
-                        if value is None:
-                            value = 0.0
-                        if isinstance(value,bool):
-                            value = 1.0 if value else 0.0
-                        try:
-                            value = float(value)
-                        except:
-                            value = 0.0
-                        await var.write_value(value)
-                for n, var in rele_state_vars.items():
-                    await var.write_value(estado_reles[n])
-                for name, var in feedback_vars.items():
-                    await var.write_value(feedbacks[name])
-                for name, var in alarme_vars.items():
-                    await var.write_value(alarmes[name])
-
-                for k, var in setpoint_vars.items():
-                    setpoints[k] = await var.read_value()
-                modo_manual = await modo_manual_var.read_value()
-                liga_geral = await liga_geral_var.read_value()
-
-                for n in PINS.keys():
-                    v_on = await rele_cmd_on[n].read_value()
-                    v_off = await rele_cmd_off[n].read_value()
-                    if v_on:
-                        atualizar_hardware(n, True)
-                        await rele_cmd_on[n].write_value(False)
-                    if v_off:
-                        atualizar_hardware(n, False)
-                        await rele_cmd_off[n].write_value(False)
-
-                if not modo_manual:
-                    controle_automatico()
-
-                if not liga_geral:
-                    for n in PINS.keys():
-                        atualizar_hardware(n, False)
-
-                registrar_json_row()
-                await asyncio.sleep(60)
-            except Exception:
-                logger.exception("Erro no loop OPC UA")
-                await asyncio.sleep(5)
+                api = await http_async.servir(ROTAS_API, BRIDGE_HTTP_PORTA, fluxos={"/stream": fluxo_estado},
+                                              usuario=USERNAME, senha=PASSWORD)
+                logger.info("API HTTP em http://0.0.0.0:%s/", BRIDGE_HTTP_PORTA)
+            except OSError:
+                logger.exception("Não foi possível abrir a porta da API %s", BRIDGE_HTTP_PORTA)
+        # estufa -> (falhas seguidas, ciclos que ainda vai pular)
+        falhas = {}
+        while True:
+            inicio_ciclo = time.perf_counter()
+            for site in list(sites.values()):
+                seguidas, pular = falhas.get(site.nome, (0, 0))
+                if pular:
+                    falhas[site.nome] = (seguidas, pular - 1)
+                    continue
+                # Uma estufa com erro não impede nem acelera o ciclo das outras:
+                # o recuo vale só para ela
+                try:
+                    nos = nos_sites.get(site.nome)
+                    if nos is None:
+                        nos = nos_sites[site.nome] = await criar_nos_site(server, ns, site)
+                    await ciclo_site(nos, site)
+                    falhas.pop(site.nome, None)
+                except Exception:
+                    seguidas += 1
+                    falhas[site.nome] = (seguidas, min(2 ** (seguidas - 1) - 1, CICLO_ERRO_PULAR_MAX))
+                    metrica_ciclo_erros.inc(site=site.nome)
+                    logger.exception("Erro no loop OPC UA (estufa %s, %d seguido(s))", site.nome, seguidas)
+            duracao = time.perf_counter() - inicio_ciclo
+            metrica_ciclo.observar(duracao)
+            await asyncio.sleep(max(0.0, CICLO_SEGUNDOS - duracao))
 
 # -------------------------
 # MAIN
 # -------------------------
 def main():
-    iniciar_mqtt()
     loop = asyncio.get_event_loop()
+    if METRICAS_PORTA:
+        try:
+            # /debug/profile e /debug/memory com o mesmo login do http_server.py;
+            # o perfil também amostra as tasks do loop do OPC UA
+            servir_http(metricas, METRICAS_PORTA,
+                        rotas=diagnostico.rotas_http(USERNAME, PASSWORD, loop))
+            logger.info("Métricas em http://0.0.0.0:%s/metrics", METRICAS_PORTA)
+        except OSError:
+            logger.exception("Não foi possível abrir a porta de métricas %s", METRICAS_PORTA)
+    iniciar_mqtt()
     try:
         loop.run_until_complete(servidor_opcua())
     except KeyboardInterrupt:
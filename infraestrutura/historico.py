@@ -0,0 +1,100 @@
+"""
+Histórico de registros do bridge, um JSON por linha (registros.ndjson).
+
+Cada ciclo acrescenta uma linha ao fim do arquivo, com custo constante,
+em vez de regravar o array inteiro do registros.json, que crescia a cada
+ciclo (um mês de uma estufa passava de 20 MB por gravação). Quem lê pega
+só o fim: `ler_ultimos()` volta do fim do arquivo em blocos até juntar as
+N linhas pedidas. Uma linha pela metade (gravação em andamento) ou
+corrompida é ignorada.
+
+O registros.json de antes é convertido uma vez por `migrar()` e fica
+renomeado para registros.json.migrado.
+"""
+
+import json
+import os
+
+ARQUIVO = "registros.ndjson"
+LEGADO = "registros.json"
+BLOCO = 64 * 1024
+
+
+def linha(entrada):
+    """Registro serializado como no arquivo (JSON compacto, sem a quebra de linha)."""
+    return json.dumps(entrada, separators=(",", ":"))
+
+
+def anexar(caminho, texto):
+    """Acrescenta uma linha já serializada; uma única escrita em modo append."""
+    with open(caminho, "a", encoding="utf-8") as f:
+        f.write(texto + "\n")
+
+
+def _fim(caminho, n):
+    """(texto, registro) das até `n` últimas linhas válidas do arquivo, em ordem."""
+    if n <= 0:
+        return []
+    try:
+        f = open(caminho, "rb")
+    except FileNotFoundError:
+        return []
+    with f:
+        pos = f.seek(0, os.SEEK_END)
+        pedacos = []
+        quebras = 0
+        while pos > 0 and quebras <= n:
+            tamanho = min(BLOCO, pos)
+            pos -= tamanho
+            f.seek(pos)
+            pedaco = f.read(tamanho)
+            pedacos.append(pedaco)
+            quebras += pedaco.count(b"\n")
+    linhas = b"".join(reversed(pedacos)).split(b"\n")
+    # O último pedaço vem depois da última quebra: "" ou uma linha ainda sendo gravada
+    linhas.pop()
+    if pos > 0:
+        # O primeiro começou no meio de uma linha
+        linhas.pop(0)
+    validas = []
+    for bruto in linhas[-n:]:
+        # Uma gravação interrompida (queda de energia) deixa uma linha sem fim, emendada na seguinte
+        try:
+            texto = bruto.decode("utf-8")
+            registro = json.loads(texto)
+        except ValueError:
+            continue
+        if isinstance(registro, dict):
+            validas.append((texto, registro))
+    return validas
+
+
+def ler_ultimas_linhas(caminho, n):
+    """Até `n` linhas do fim do arquivo, já validadas, como str; [] sem o arquivo."""
+    return [texto for texto, _registro in _fim(caminho, n)]
+
+
+def ler_ultimos(caminho, n):
+    """Até `n` registros (dicts) do fim do arquivo; linhas inválidas ficam de fora."""
+    return [registro for _texto, registro in _fim(caminho, n)]
+
+
+def migrar(pasta):
+    """Converte pasta/registros.json (array) em registros.ndjson, se ainda não foi convertido."""
+    destino = os.path.join(pasta, ARQUIVO)
+    legado = os.path.join(pasta, LEGADO)
+    if os.path.exists(destino) or not os.path.isfile(legado):
+        return False
+    try:
+        with open(legado, "r", encoding="utf-8") as f:
+            historico = json.load(f)
+    except ValueError:
+        historico = []
+    temporario = destino + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        for entrada in historico if isinstance(historico, list) else []:
+            if isinstance(entrada, dict):
+                f.write(linha(entrada) + "\n")
+    os.replace(temporario, destino)
+    os.replace(legado, legado + ".migrado")
+    return True
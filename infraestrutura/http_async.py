@@ -0,0 +1,120 @@
+"""
+Servidor HTTP mínimo em asyncio, para rodar dentro do loop do bridge.
+
+As rotas seguem o contrato do `metricas_http.servir_http`: {caminho:
+funcao(query, cabecalhos) -> (status, tipo, corpo em bytes, cabecalhos
+extras)}; a função também pode ser `async def`, para rotas que precisam
+esperar (ex.: ler arquivo numa thread). Os fluxos são rotas longas, como Server-Sent Events: {caminho:
+funcao(query, cabecalhos)} que devolve um gerador assíncrono de bytes, cada
+pedaço enviado assim que sai. Tudo roda no mesmo loop do OPC UA, sem
+threads, então as rotas podem ler o estado do bridge direto da memória.
+
+Só GET, HTTP/1.1 com keep-alive. Com `usuario`/`senha`, todas as rotas
+exigem Basic Auth, como o http_server.py.
+"""
+
+import asyncio
+import inspect
+import logging
+
+from diagnostico import autorizado
+
+logger = logging.getLogger("estufa.http")
+
+MAX_CABECALHO = 16 * 1024
+OCIOSO_S = 30
+MOTIVOS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+           405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class Cabecalhos(dict):
+    """Cabeçalhos com nomes em minúsculas; get() aceita qualquer caixa."""
+
+    def get(self, nome, padrao=None):
+        return dict.get(self, nome.lower(), padrao)
+
+
+def _resposta(status, tipo, corpo, extras=None, manter=True):
+    linhas = [f"HTTP/1.1 {status} {MOTIVOS.get(status, '')}",
+              f"Content-Type: {tipo}",
+              f"Content-Length: {len(corpo)}",
+              f"Connection: {'keep-alive' if manter else 'close'}"]
+    linhas += [f"{nome}: {valor}" for nome, valor in (extras or {}).items()]
+    return ("\r\n".join(linhas) + "\r\n\r\n").encode("latin-1") + corpo
+
+
+async def servir(rotas, porta, host="0.0.0.0", fluxos=None, usuario=None, senha=None):
+    """Abre o servidor no loop atual e devolve o asyncio.Server."""
+    rotas = dict(rotas)
+    fluxos = dict(fluxos or {})
+
+    async def atender(reader, writer):
+        try:
+            while True:
+                try:
+                    bruto = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), OCIOSO_S)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError):
+                    return
+                linhas = bruto.decode("latin-1").split("\r\n")
+                try:
+                    metodo, alvo, versao = linhas[0].split(" ", 2)
+                except ValueError:
+                    writer.write(_resposta(400, "text/plain", b"", manter=False))
+                    return
+                cabecalhos = Cabecalhos()
+                for linha in linhas[1:]:
+                    nome, _, valor = linha.partition(":")
+                    if nome:
+                        cabecalhos[nome.strip().lower()] = valor.strip()
+                conexao = cabecalhos.get("Connection", "").lower()
+                manter = conexao != "close" and (versao == "HTTP/1.1" or conexao == "keep-alive")
+                caminho, _, query = alvo.partition("?")
+
+                if metodo != "GET":
+                    writer.write(_resposta(405, "text/plain", b"", {"Allow": "GET"}, manter))
+                elif usuario is not None and not autorizado(cabecalhos.get("Authorization"), usuario, senha):
+                    writer.write(_resposta(401, "text/plain; charset=utf-8",
+                                           "Acesso restrito. Informe usuário e senha.".encode(),
+                                           {"WWW-Authenticate": 'Basic realm="Estufa IoT"'}, manter))
+                elif caminho in fluxos:
+                    # O fluxo devolve uma resposta comum (ex.: 404) ou o gerador de eventos
+                    resultado = fluxos[caminho](query, cabecalhos)
+                    if not isinstance(resultado, tuple):
+                        await _transmitir(resultado, writer)
+                        return
+                    writer.write(_resposta(*resultado, manter))
+                elif caminho in rotas:
+                    try:
+                        resultado = rotas[caminho](query, cabecalhos)
+                        if inspect.isawaitable(resultado):
+                            resultado = await resultado
+                        status, tipo, corpo, extras = resultado
+                    except Exception:
+                        logger.exception("Erro na rota %s", caminho)
+                        status, tipo, corpo, extras = 500, "text/plain", b"", {}
+                    writer.write(_resposta(status, tipo, corpo, extras, manter))
+                else:
+                    writer.write(_resposta(404, "text/plain", b"", manter=manter))
+                await writer.drain()
+                if not manter:
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(atender, host, porta, limit=MAX_CABECALHO)
+
+
+async def _transmitir(pedacos, writer):
+    writer.write(("HTTP/1.1 200 OK\r\n"
+                  "Content-Type: text/event-stream\r\n"
+                  "Cache-Control: no-cache\r\n"
+                  "Connection: close\r\n\r\n").encode("latin-1"))
+    try:
+        async for pedaco in pedacos:
+            writer.write(pedaco)
+            # drain() levanta ConnectionError quando o cliente fecha: encerra o gerador
+            await writer.drain()
+    finally:
+        await pedacos.aclose()
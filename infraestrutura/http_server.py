@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 from flask import Flask, jsonify, request, Response
-import csv, json, os
+import csv, json, os, re
 from pathlib import Path
 
+from lvc import CacheUltimoValor, nome_segmento
+import historico
+
 # --- CONFIGURAÇÃO DE LOGIN ---
 USERNAME = "admin"
 PASSWORD = "12345"
@@ -10,8 +13,12 @@ PASSWORD = "12345"
 # --- Caminhos de dados ---
 BASE = Path(__file__).resolve().parent
 DATA_DIR = BASE / "data"
-JSON_REGISTROS = DATA_DIR / "registros.json"
+JSON_REGISTROS = DATA_DIR / historico.ARQUIVO
 JSON_ESTADO = DATA_DIR / "estado.json"
+# Demais estufas do bridge: data/sites/<site>/ (a local fica em data/)
+SITES_DIR = DATA_DIR / "sites"
+SITE_LOCAL = os.getenv("SITE_LOCAL", "principal")
+NOME_SITE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
 
 app = Flask(__name__)
 
@@ -34,37 +41,79 @@ def requires_auth(f):
     wrapper.__name__ = f.__name__
     return wrapper
 
+# site -> LVC aberto (memória compartilhada escrita pelo estufa_opcua.py)
+lvcs = {}
+
+def estado_lvc(site):
+    """Bytes JSON do último estado, sem abrir arquivo nem fazer parse; None sem o bridge."""
+    lvc = lvcs.get(site)
+    if lvc is not None and lvc.descartado():
+        # O bridge recriou ou removeu o segmento: reabre pelo nome
+        lvc.fechar()
+        del lvcs[site]
+        lvc = None
+    if lvc is None:
+        try:
+            lvc = lvcs[site] = CacheUltimoValor.abrir(nome_segmento(site))
+        except (FileNotFoundError, ValueError):
+            return None
+    return lvc.ler()
+
+def arquivos_site():
+    """(estado.json, registros.ndjson) da estufa em ?site=; None se o nome é inválido."""
+    site = request.args.get("site", SITE_LOCAL)
+    if site == SITE_LOCAL:
+        return JSON_ESTADO, JSON_REGISTROS
+    if not NOME_SITE.match(site):
+        return None
+    return SITES_DIR / site / "estado.json", SITES_DIR / site / historico.ARQUIVO
+
 # --- Rotas ---
 @app.route("/")
 @requires_auth
 def home():
     return jsonify({
         "message": "API Estufa IoT rodando com autenticação.",
-        "endpoints": ["/estado", "/registros"]
+        "endpoints": ["/estado", "/registros", "/sites"]
     })
 
+@app.route("/sites")
+@requires_auth
+def listar_sites():
+    outras = sorted(p.name for p in SITES_DIR.iterdir() if p.is_dir()) if SITES_DIR.exists() else []
+    return jsonify([SITE_LOCAL] + outras)
+
 @app.route("/estado")
 @requires_auth
 def estado():
-    if not JSON_ESTADO.exists():
+    arquivos = arquivos_site()
+    if arquivos is None:
+        return jsonify({"erro": "Nome de estufa inválido"}), 400
+    dados = estado_lvc(request.args.get("site", SITE_LOCAL))
+    if dados is not None:
+        return Response(dados, mimetype="application/json")
+    json_estado = arquivos[0]
+    if not json_estado.exists():
         return jsonify({"erro": "Arquivo estado.json não encontrado"}), 404
-    with open(JSON_ESTADO, "r") as f:
+    with open(json_estado, "r") as f:
         return jsonify(json.load(f))
 
 @app.route("/registros")
 @requires_auth
 def registros():
-    if not JSON_REGISTROS.exists():
-        return jsonify({"erro": "Arquivo registros.csv não encontrado"}), 404
-    limit = int(request.args.get("limit", 20))
-    rows = []
-    with open(JSON_REGISTROS, "r") as f:
-        historico = json.load(f)
-
-    # Caso o arquivo esteja vazio ou corrompido
-    if not isinstance(historico,list):
-        return jsonify([])
-    return jsonify(historico[-limit:])
+    arquivos = arquivos_site()
+    if arquivos is None:
+        return jsonify({"erro": "Nome de estufa inválido"}), 400
+    json_registros = arquivos[1]
+    if not json_registros.exists():
+        return jsonify({"erro": "Arquivo registros.ndjson não encontrado"}), 404
+    try:
+        limit = int(request.args.get("limit", 20))
+    except ValueError:
+        return jsonify({"erro": "limit inválido"}), 400
+    # Só o fim do arquivo: o custo depende do limit, não do tamanho do histórico
+    linhas = historico.ler_ultimas_linhas(json_registros, limit)
+    return Response("[" + ",".join(linhas) + "]", mimetype="application/json")
 
 if __name__ == "__main__":
     print(f"Servidor HTTP rodando em todas as interfaces (porta 5000)")
@@ -0,0 +1,150 @@
+"""
+Fila de ingestão MQTT: desacopla o callback do paho do processamento.
+
+O on_message só chama `colocar()`, que guarda o payload bruto numa fila
+limitada e retorna: nada de json.loads nem de data_lock na thread de rede,
+que cuida do socket e dos keepalives. Uma thread própria retira lotes,
+entrega tudo a `processar(lote)` de uma vez; cada item do lote é
+(tópico, bruto, recebido_em), e o bridge aplica o lote em cada estufa
+numa única seção crítica. O bridge pode ter várias filas, escolhidas pelo
+tópico: cada estufa fica sempre na mesma e é aplicada em ordem.
+
+Com a fila cheia vale a política:
+
+* "descartar_antigas": a mensagem mais antiga sai para a nova entrar;
+* "ultimo_valor": vale a mais recente de cada sensor. Uma mensagem nova
+  substitui a pendente do mesmo sensor (tópico + sensor_id, no JSON ou no
+  MessagePack; sem sensor_id, tópico + campos enviados, ver
+  `chave_sensor`) mesmo com a fila vazia, pois só o último valor
+  interessa ao estado. Se o sensor não tem mensagem pendente e a fila
+  está cheia, a mais antiga sai.
+
+As contagens (recebidas, descartadas por motivo, lotes) ficam no objeto e
+são expostas pelo bridge com `Registro.coletor`.
+"""
+
+import collections
+import logging
+import re
+import threading
+import time
+
+from payload import MAGICO, INICIO_MSGPACK
+
+POLITICAS = ("descartar_antigas", "ultimo_valor")
+
+logger = logging.getLogger("estufa.ingestao")
+
+# sensor_id sem decodificar o JSON inteiro (o callback precisa ser barato)
+_SENSOR_ID = re.compile(rb'"sensor_id"\s*:\s*"([^"]*)"')
+# No MessagePack: a chave "sensor_id" (fixstr) e o cabeçalho do valor (fixstr ou str8)
+_SENSOR_ID_MSGPACK = re.compile(rb'\xa9sensor_id([\xa0-\xbf]|\xd9.)', re.DOTALL)
+# Chaves de um objeto JSON, para payloads sem sensor_id
+_CHAVE_JSON = re.compile(rb'"((?:[^"\\]|\\.)*)"\s*:')
+_QUADRO_BINARIO = bytes([MAGICO])
+
+
+def chave_sensor(topico, bruto):
+    """
+    Identifica o sensor de um payload bruto, para a política "ultimo_valor":
+    (tópico, "id", sensor_id) ou, sem sensor_id, (tópico, "campos", campos
+    enviados), pois leituras parciais com campos diferentes não se
+    substituem. None se não dá para identificar sem decodificar (MessagePack
+    sem sensor_id): a mensagem não substitui nem é substituída.
+    """
+    if bruto[:1] == _QUADRO_BINARIO:
+        # Quadro binário (payload.py) não tem sensor_id: a máscara de presença diz os campos
+        return topico, "campos", bytes(bruto[2:4])
+    if bruto[:1] and bruto[0] in INICIO_MSGPACK:
+        achado = _SENSOR_ID_MSGPACK.search(bruto)
+        if achado is None:
+            return None
+        cabecalho = achado.group(1)
+        tamanho = cabecalho[1] if cabecalho[0] == 0xD9 else cabecalho[0] & 0x1F
+        return topico, "id", bytes(bruto[achado.end():achado.end() + tamanho])
+    achado = _SENSOR_ID.search(bruto)
+    if achado is not None:
+        return topico, "id", achado.group(1)
+    return topico, "campos", frozenset(_CHAVE_JSON.findall(bruto))
+
+
+class FilaIngestao:
+    def __init__(self, processar, capacidade=10000, politica="descartar_antigas", lote=500,
+                 nome="ingestao-mqtt"):
+        if politica not in POLITICAS:
+            raise ValueError(f"política de ingestão inválida: {politica} (use {', '.join(POLITICAS)})")
+        self.processar = processar
+        self.capacidade = max(1, int(capacidade))
+        self.politica = politica
+        self.lote = max(1, int(lote))
+        self.nome = nome
+        # chave -> (tópico, bruto, recebido_em); na "descartar_antigas" (e para mensagens
+        # sem chave_sensor) a chave é só um número de sequência
+        self._pendentes = collections.OrderedDict()
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._parar = False
+        self.recebidas = 0
+        self.descartadas = {"fila_cheia": 0, "substituida": 0}
+        self.lotes = 0
+        self.processadas = 0
+        self.erros = 0
+
+    def colocar(self, topico, bruto, recebido_em=None):
+        """Chamado pelo on_message: O(1), sem decodificar."""
+        if recebido_em is None:
+            recebido_em = time.time()
+        with self._cond:
+            self.recebidas += 1
+            chave = chave_sensor(topico, bruto) if self.politica == "ultimo_valor" else None
+            if chave is not None:
+                if chave in self._pendentes:
+                    # Mantém a posição na fila para o sensor não ficar sempre no fim
+                    self._pendentes[chave] = (topico, bruto, recebido_em)
+                    self.descartadas["substituida"] += 1
+                    return
+            else:
+                self._seq += 1
+                chave = self._seq
+            if len(self._pendentes) >= self.capacidade:
+                self._pendentes.popitem(last=False)
+                self.descartadas["fila_cheia"] += 1
+            self._pendentes[chave] = (topico, bruto, recebido_em)
+            self._cond.notify()
+
+    def profundidade(self):
+        with self._cond:
+            return len(self._pendentes)
+
+    def _retirar(self):
+        with self._cond:
+            while not self._pendentes and not self._parar:
+                self._cond.wait()
+            n = min(self.lote, len(self._pendentes))
+            return [self._pendentes.popitem(last=False)[1] for _ in range(n)]
+
+    def _loop(self):
+        while not self._parar:
+            lote = self._retirar()
+            if not lote:
+                continue
+            try:
+                self.processar(lote)
+            except Exception:
+                # Um lote ruim não derruba a ingestão
+                self.erros += 1
+                logger.exception("Erro processando lote de %d mensagens", len(lote))
+            self.lotes += 1
+            self.processadas += len(lote)
+
+    def iniciar(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True, name=self.nome)
+            self._thread.start()
+        return self
+
+    def parar(self):
+        with self._cond:
+            self._parar = True
+            self._cond.notify_all()
@@ -0,0 +1,144 @@
+"""
+Cache do último valor (LVC) em memória compartilhada, entre o bridge e o
+http_server.py.
+
+O bridge escreve o JSON do estado de cada estufa num segmento
+/dev/shm/estufa_lvc_<site>; o /estado lê os bytes prontos, sem abrir
+arquivo nem fazer parse. Um escritor e vários leitores, sem lock:
+
+    cabeçalho: magic "LVC1" (4s), capacidade (I), seq (Q)
+    2 slots:   tamanho (I), crc32 (I), dados (capacidade bytes)
+
+A escrita número `seq` vai para o slot seq % 2 e só então publica o novo
+seq, então o leitor copia sempre o último slot completo enquanto o
+escritor preenche o outro (buffer duplo versionado). Se o seq avançou 2 ou
+mais durante a cópia, o escritor pode ter reescrito aquele slot, e a
+leitura é refeita (seqlock). O crc32 pega o que sobrar, como a ordem de
+escrita não garantida entre núcleos do ARM. Uma leitura nunca devolve
+estado rasgado: ou os bytes de uma escrita inteira, ou None.
+
+O segmento não é removido quando o bridge para. Ao reiniciar, o bridge
+reaproveita o mesmo segmento, e os leitores que já o tinham aberto
+continuam válidos. Quando o segmento deixa de valer (layout diferente,
+bridge rodando sem LVC), o escritor apaga o magic antes de removê-lo:
+o leitor vê `descartado()` e reabre pelo nome. Um estado que não coube
+zera o seq (`invalidar()`) e o leitor volta para o estado.json até a
+próxima escrita.
+"""
+
+import struct
+import zlib
+from multiprocessing import resource_tracker, shared_memory
+
+MAGIC = b"LVC1"
+CABECALHO = struct.Struct("<4sIQ")
+SLOT = struct.Struct("<II")
+CAPACIDADE_PADRAO = 64 * 1024
+TENTATIVAS = 100
+
+
+def nome_segmento(site):
+    return f"estufa_lvc_{site}"
+
+
+def _descartar(shm):
+    # Leitores com o segmento já mapeado deixam de confiar nele (ver descartado()).
+    # `shm` vem aberto sem _sem_rastreio: o unlink() tira o registro do resource_tracker
+    CABECALHO.pack_into(shm.buf, 0, b"\0" * 4, 0, 0)
+    shm.close()
+    shm.unlink()
+
+
+def remover(nome):
+    """Descarta e remove o segmento, se existir (bridge rodando sem LVC)."""
+    try:
+        shm = shared_memory.SharedMemory(nome)
+    except FileNotFoundError:
+        return False
+    _descartar(shm)
+    return True
+
+
+def _sem_rastreio(shm):
+    # Sem isso o resource_tracker remove o segmento quando o processo sai
+    # (inclusive num leitor que só o abriu); quem cria e quem lê não são donos dele
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+class CacheUltimoValor:
+    def __init__(self, shm):
+        self._shm = shm
+        self._buf = shm.buf
+        magic, self.capacidade, _seq = CABECALHO.unpack_from(self._buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"segmento {shm.name} não é um LVC")
+        self._slots = (CABECALHO.size, CABECALHO.size + SLOT.size + self.capacidade)
+
+    @classmethod
+    def criar(cls, nome, capacidade=CAPACIDADE_PADRAO):
+        """Cria o segmento ou reaproveita um existente com a mesma capacidade (lado do escritor)."""
+        tamanho = CABECALHO.size + 2 * (SLOT.size + capacidade)
+        try:
+            shm = _sem_rastreio(shared_memory.SharedMemory(nome, create=True, size=tamanho))
+            CABECALHO.pack_into(shm.buf, 0, MAGIC, capacidade, 0)
+        except FileExistsError:
+            shm = shared_memory.SharedMemory(nome)
+            magic, atual, _seq = CABECALHO.unpack_from(shm.buf, 0)
+            if magic != MAGIC or atual != capacidade:
+                # Layout diferente (versão antiga): recria
+                _descartar(shm)
+                return cls.criar(nome, capacidade)
+            _sem_rastreio(shm)
+        return cls(shm)
+
+    @classmethod
+    def abrir(cls, nome):
+        """Abre um segmento existente (lado do leitor); FileNotFoundError se o bridge não o criou."""
+        return cls(_sem_rastreio(shared_memory.SharedMemory(nome)))
+
+    def descartado(self):
+        """True se o escritor trocou ou removeu o segmento; o leitor deve reabrir pelo nome."""
+        return CABECALHO.unpack_from(self._buf, 0)[0] != MAGIC
+
+    def seq(self):
+        return CABECALHO.unpack_from(self._buf, 0)[2]
+
+    def escrever(self, dados):
+        """Publica `dados` (bytes); só um escritor por segmento."""
+        if len(dados) > self.capacidade:
+            raise ValueError(f"{len(dados)} bytes não cabem no LVC ({self.capacidade})")
+        seq = self.seq() + 1
+        inicio = self._slots[seq % 2]
+        self._buf[inicio + SLOT.size:inicio + SLOT.size + len(dados)] = dados
+        SLOT.pack_into(self._buf, inicio, len(dados), zlib.crc32(dados))
+        # Publica por último: até aqui os leitores seguem no outro slot
+        CABECALHO.pack_into(self._buf, 0, MAGIC, self.capacidade, seq)
+        return seq
+
+    def invalidar(self):
+        """Zera o seq: os leitores recebem None até a próxima escrita."""
+        CABECALHO.pack_into(self._buf, 0, MAGIC, self.capacidade, 0)
+
+    def ler(self):
+        """Bytes da última escrita completa; None se nada foi escrito (ou se o escritor não dá trégua)."""
+        buf = self._buf
+        for _ in range(TENTATIVAS):
+            seq = CABECALHO.unpack_from(buf, 0)[2]
+            if seq == 0:
+                return None
+            inicio = self._slots[seq % 2]
+            tamanho, crc = SLOT.unpack_from(buf, inicio)
+            if tamanho > self.capacidade:
+                continue
+            dados = bytes(buf[inicio + SLOT.size:inicio + SLOT.size + tamanho])
+            if CABECALHO.unpack_from(buf, 0)[2] - seq < 2 and zlib.crc32(dados) == crc:
+                return dados
+        return None
+
+    def fechar(self):
+        self._buf = None
+        self._shm.close()
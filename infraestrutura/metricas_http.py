@@ -0,0 +1,45 @@
+"""
+Exportador HTTP das métricas para processos sem Flask (o bridge).
+
+O backend expõe o /metrics pelas rotas do Flask; este servidor fica só
+em infraestrutura/, fora do metricas.py compartilhado.
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from metricas import TIPO_CONTEUDO
+
+
+def servir_http(registro, porta, host="0.0.0.0", rotas=None):
+    """
+    Exporta `registro` em http://host:porta/metrics numa thread daemon.
+    `rotas` acrescenta outros GETs: {caminho: funcao(query, cabecalhos) ->
+    (status, tipo, corpo em bytes, cabecalhos extras)}.
+    """
+    rotas = dict(rotas or {})
+    rotas["/metrics"] = lambda query, cabecalhos: (200, TIPO_CONTEUDO, registro.texto().encode("utf-8"), {})
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            caminho, _, query = self.path.partition("?")
+            rota = rotas.get(caminho)
+            if rota is None:
+                self.send_error(404)
+                return
+            status, tipo, corpo, extras = rota(query, self.headers)
+            self.send_response(status)
+            self.send_header("Content-Type", tipo)
+            self.send_header("Content-Length", str(len(corpo)))
+            for nome, valor in extras.items():
+                self.send_header(nome, valor)
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host, porta), _Handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True, name="metricas-http").start()
+    return servidor
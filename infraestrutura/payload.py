@@ -0,0 +1,204 @@
+"""
+Decodificação dos payloads de sensores: JSON, MessagePack ou binário fixo.
+
+Os campos vêm do config/mapping.csv: cada linha com "Campo" preenchido diz
+a chave no payload (temperature...; apelidos separados por "|"), a
+variável do bridge (temperatura...), o tipo (FLOAT/BOOL) e a "Posicao" no
+quadro binário. O decodificador é montado uma vez a partir dessa tabela,
+sem uma cadeia de ifs por campo.
+
+Cada campo vira um conversor compilado, aplicado uma vez, no ingest:
+
+* FLOAT: float(), depois valor * Ganho + Offset (a conversão para a
+  "Unit" da linha, ex.: °F -> °C com Ganho 0.5556 e Offset -17.78) e a
+  faixa [Minimo, Maximo]. None e NaN viram None (sensor sem leitura);
+* BOOL: bool de verdade, inclusive para "0"/"false" em texto.
+
+Valores que não convertem ou saem da faixa são rejeitados: o campo fica de
+fora da leitura (vale o último valor bom) e `ao_rejeitar(variável, motivo,
+valor)` é chamado, com motivo "tipo" ou "faixa". O estado do bridge e o
+histórico ficam, portanto, só com float/None e bool.
+
+O formato sai do primeiro byte, sem tópico novo nem negociação:
+
+* 0xE5: quadro binário, little-endian:
+  magic (B), versão (B), máscara de presença (H, bit = Posicao),
+  ts_envio (d, 0 = ausente) e um valor por campo em ordem de Posicao
+  (FLOAT -> float32 "f", BOOL -> "?"). Campos fora da máscara são ignorados.
+  Com os 6 campos de hoje são 30 bytes, contra ~150 do JSON do NodeMCU;
+* 0x80-0x8F, 0xDE, 0xDF: mapa MessagePack, se o pacote `msgpack` estiver
+  instalado, com as mesmas chaves do JSON;
+* qualquer outro: JSON, aninhado em "sensor_data" ou plano.
+
+`decodificar()` devolve ({variável: valor}, ts_envio) ou levanta
+ValueError. `codificar_binario()` monta o quadro, para simuladores e como
+referência para o firmware.
+"""
+
+import collections
+import csv
+import json
+import math
+import os
+import struct
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MAPEAMENTO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config", "mapping.csv")
+
+MAGICO = 0xE5
+VERSAO = 1
+CABECALHO = "<BBHd"
+CODIGOS_STRUCT = {"FLOAT": "f", "BOOL": "?"}
+INICIO_MSGPACK = set(range(0x80, 0x90)) | {0xDE, 0xDF}
+
+VERDADEIROS = {"1", "true", "on", "sim"}
+
+Campo = collections.namedtuple("Campo", "tag chaves variavel tipo posicao ganho offset minimo maximo")
+
+
+class ValorRejeitado(ValueError):
+    def __init__(self, motivo):
+        super().__init__(motivo)
+        self.motivo = motivo
+
+
+def _numero(texto, padrao):
+    texto = (texto or "").strip()
+    return float(texto) if texto else padrao
+
+
+def carregar_campos(caminho=MAPEAMENTO):
+    """Campos com "Campo" preenchido no mapping.csv, em ordem de Posicao."""
+    campos = []
+    with open(caminho, newline="", encoding="utf-8") as f:
+        for linha in csv.DictReader(f):
+            chave = (linha.get("Campo") or "").strip()
+            if not chave:
+                continue
+            tipo = linha["DataType"].strip().upper()
+            if tipo not in CODIGOS_STRUCT:
+                raise ValueError(f"{caminho}: tipo {tipo} não suportado no campo {chave}")
+            campos.append(Campo(
+                linha["Tag"].strip(), tuple(c.strip() for c in chave.split("|")), linha["Variavel"].strip(),
+                tipo, int(linha["Posicao"]),
+                _numero(linha.get("Ganho"), 1.0), _numero(linha.get("Offset"), 0.0),
+                _numero(linha.get("Minimo"), -math.inf), _numero(linha.get("Maximo"), math.inf)))
+    campos.sort(key=lambda c: c.posicao)
+    if [c.posicao for c in campos] != list(range(len(campos))):
+        raise ValueError(f"{caminho}: Posicao deve ser 0..{len(campos) - 1}, sem repetir")
+    if len(campos) > 16:
+        raise ValueError(f"{caminho}: a máscara de presença comporta até 16 campos")
+    return campos
+
+
+def compilar(campo):
+    """Conversor valor bruto -> valor tipado e calibrado do campo; levanta ValorRejeitado."""
+    if campo.tipo == "BOOL":
+        def converter(valor):
+            if isinstance(valor, str):
+                return valor.strip().lower() in VERDADEIROS
+            return bool(valor)
+        return converter
+
+    ganho, offset, minimo, maximo = campo.ganho, campo.offset, campo.minimo, campo.maximo
+    calibrar = ganho != 1.0 or offset != 0.0
+
+    def converter(valor):
+        if valor is None:
+            return None
+        try:
+            x = float(valor)
+        except (TypeError, ValueError, OverflowError):
+            # OverflowError: inteiro do JSON grande demais para um float
+            raise ValorRejeitado("tipo") from None
+        if x != x:
+            return None
+        if calibrar:
+            x = x * ganho + offset
+        if not minimo <= x <= maximo:
+            raise ValorRejeitado("faixa")
+        return x
+    return converter
+
+
+class Decodificador:
+    def __init__(self, campos=None, ao_rejeitar=None):
+        self.campos = campos if campos is not None else carregar_campos()
+        self.ao_rejeitar = ao_rejeitar
+        conversores = [compilar(c) for c in self.campos]
+        # chave (e apelidos) -> (variável, conversor) para payloads em dict: percorre só as chaves recebidas
+        self._por_chave = {chave: (c.variavel, conv)
+                           for c, conv in zip(self.campos, conversores) for chave in c.chaves}
+        # (bit, variável, conversor) para o quadro binário
+        self._bits = [(1 << c.posicao, c.variavel, conv) for c, conv in zip(self.campos, conversores)]
+        self.estrutura = struct.Struct(CABECALHO + "".join(CODIGOS_STRUCT[c.tipo] for c in self.campos))
+
+    def decodificar(self, bruto):
+        if not bruto:
+            raise ValueError("payload vazio")
+        inicio = bruto[0]
+        if inicio == MAGICO:
+            return self._de_binario(bruto)
+        if inicio in INICIO_MSGPACK and msgpack is not None:
+            try:
+                payload = msgpack.unpackb(bruto, raw=False)
+            except Exception as e:
+                raise ValueError(f"MessagePack inválido: {e}") from None
+        else:
+            # decode() explícito: json.loads(bytes) detecta a codificação a cada chamada
+            payload = json.loads(bruto.decode() if isinstance(bruto, (bytes, bytearray)) else bruto)
+        return self._de_dict(payload)
+
+    def _de_dict(self, payload):
+        if not isinstance(payload, dict):
+            raise ValueError("payload não é um objeto")
+        leituras = payload.get("sensor_data", payload)
+        if not isinstance(leituras, dict):
+            raise ValueError("sensor_data não é um objeto")
+        valores = {}
+        por_chave = self._por_chave
+        for chave, valor in leituras.items():
+            campo = por_chave.get(chave)
+            if campo is not None:
+                try:
+                    valores[campo[0]] = campo[1](valor)
+                except ValorRejeitado as e:
+                    self._rejeitar(campo[0], e.motivo, valor)
+        return valores, payload.get("ts_envio")
+
+    def _de_binario(self, bruto):
+        if len(bruto) != self.estrutura.size:
+            raise ValueError(f"quadro binário com {len(bruto)} bytes (esperado {self.estrutura.size})")
+        _magico, versao, presenca, ts_envio, *dados = self.estrutura.unpack(bruto)
+        if versao != VERSAO:
+            raise ValueError(f"versão de quadro binário {versao} não suportada")
+        valores = {}
+        for (bit, variavel, converter), valor in zip(self._bits, dados):
+            if presenca & bit:
+                try:
+                    valores[variavel] = converter(valor)
+                except ValorRejeitado as e:
+                    self._rejeitar(variavel, e.motivo, valor)
+        return valores, ts_envio or None
+
+    def _rejeitar(self, variavel, motivo, valor):
+        if self.ao_rejeitar is not None:
+            self.ao_rejeitar(variavel, motivo, valor)
+
+    def codificar_binario(self, leituras, ts_envio=None):
+        """Quadro binário de {chave do payload: valor}; chaves fora do mapping são ignoradas."""
+        presenca = 0
+        dados = []
+        for c in self.campos:
+            chave = next((k for k in c.chaves if k in leituras), None)
+            if chave is not None:
+                presenca |= 1 << c.posicao
+                valor = leituras[chave]
+            else:
+                valor = False if c.tipo == "BOOL" else 0.0
+            dados.append(bool(valor) if c.tipo == "BOOL" else float(valor))
+        return self.estrutura.pack(MAGICO, VERSAO, presenca, ts_envio or 0.0, *dados)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Replay de um histórico gravado pelo tópico MQTT dos sensores.
+
+Lê dados_estufa.csv ou data/registros.ndjson (um JSON por linha; o array
+do antigo registros.json também serve) e publica cada registro em
+estufa/sensores no formato do NodeMCU, com os nomes que o on_message
+espera (temperatura -> temperature, umidade_solo -> soil_moisture...). Os
+intervalos gravados são respeitados, divididos por --velocidade: 1 é tempo
+real, 720 faz um mês em cerca de uma hora e 0 publica o mais rápido
+possível.
+
+A entrada é lida em fluxo, registro a registro, então o uso de memória não
+depende do tamanho do arquivo. Com --repetir, o arquivo é reaberto a cada
+volta. Cada payload leva "ts_envio", e o bridge mede a latência de
+ingestão como faz com o simulador_carga.py.
+
+    python3 replay.py dados_estufa.csv --velocidade 60
+    python3 replay.py data/registros.ndjson --velocidade 0 --repetir 10
+    python3 replay.py dados_estufa.csv --seco > payloads.ndjson
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import datetime
+
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:
+    mqtt = None
+
+# Coluna gravada -> chave do payload lida pelo on_message do estufa_opcua.py
+CAMPOS = {
+    "temperatura": "temperature",
+    "umidade": "humidity",
+    "luminosidade": "light",
+    "umidade_solo": "soil_moisture",
+    "nivel_baixo": "nivel_baixo",
+    "nivel_alto": "nivel_alto",
+}
+BOOLEANOS = {"nivel_baixo", "nivel_alto"}
+VERDADEIROS = {"1", "true", "True", "on", "sim"}
+
+TAMANHO_BLOCO = 64 * 1024
+
+
+def ler_csv(caminho):
+    with open(caminho, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def ler_json(caminho):
+    """
+    Registros de um array JSON (ou de objetos separados por linha), um por
+    vez: decodifica objeto a objeto sobre um buffer de TAMANHO_BLOCO, sem
+    carregar o arquivo inteiro.
+    """
+    decodificador = json.JSONDecoder()
+    with open(caminho, encoding="utf-8") as f:
+        buffer = ""
+        pos = 0
+        fim_arquivo = False
+        while True:
+            # Pula espaços e a pontuação do array entre os objetos
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,[]":
+                pos += 1
+            if pos >= len(buffer):
+                if fim_arquivo:
+                    return
+                buffer, pos = f.read(TAMANHO_BLOCO), 0
+                fim_arquivo = not buffer
+                continue
+            try:
+                registro, fim = decodificador.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if fim_arquivo:
+                    raise
+                # Objeto cortado no fim do bloco: lê mais e tenta de novo
+                bloco = f.read(TAMANHO_BLOCO)
+                fim_arquivo = not bloco
+                buffer, pos = buffer[pos:] + bloco, 0
+                continue
+            pos = fim
+            if isinstance(registro, dict):
+                yield registro
+
+
+def ler_registros(caminho):
+    if caminho.lower().endswith(".csv"):
+        return ler_csv(caminho)
+    return ler_json(caminho)
+
+
+def _epoch(timestamp):
+    try:
+        return datetime.fromisoformat(str(timestamp).strip()).timestamp()
+    except ValueError:
+        return None
+
+
+def para_payload(registro):
+    """(epoch gravado, leituras com as chaves do MQTT); leituras vazias ficam de fora."""
+    leituras = {}
+    for coluna, chave in CAMPOS.items():
+        valor = registro.get(coluna)
+        if valor is None or valor == "":
+            continue
+        if coluna in BOOLEANOS:
+            leituras[chave] = valor if isinstance(valor, bool) else str(valor).strip() in VERDADEIROS
+        else:
+            try:
+                leituras[chave] = float(valor)
+            except (TypeError, ValueError):
+                continue
+    return _epoch(registro.get("timestamp", "")), leituras
+
+
+def replay(caminho, publicar, velocidade=1.0, max_intervalo=None, repetir=1):
+    """
+    Publica o histórico respeitando os intervalos gravados / velocidade.
+    Intervalos gravados maiores que `max_intervalo` segundos (o Pi desligado,
+    por exemplo) são encurtados para ele. Retorna as contagens da execução.
+    """
+    publicadas = ignoradas = voltas = 0
+    gravado_s = 0.0
+    inicio = time.perf_counter()
+    while not repetir or voltas < repetir:
+        voltas += 1
+        relogio = time.perf_counter()
+        anterior = None
+        decorrido = 0.0  # tempo gravado desde o início da volta, já com os intervalos encurtados
+        for registro in ler_registros(caminho):
+            ts, leituras = para_payload(registro)
+            if not leituras:
+                ignoradas += 1
+                continue
+            if ts is not None and anterior is not None:
+                # Fora de ordem conta como intervalo zero
+                intervalo = max(0.0, ts - anterior)
+                if max_intervalo is not None:
+                    intervalo = min(intervalo, max_intervalo)
+                decorrido += intervalo
+            if ts is not None:
+                anterior = ts if anterior is None else max(anterior, ts)
+            if velocidade:
+                espera = relogio + decorrido / velocidade - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+            publicar({
+                "sensor_data": leituras,
+                "timestamp": registro.get("timestamp"),
+                "ts_envio": time.time(),
+            })
+            publicadas += 1
+        gravado_s += decorrido
+    return {
+        "publicadas": publicadas,
+        "ignoradas": ignoradas,
+        "voltas": voltas,
+        "gravado_s": gravado_s,
+        "decorrido_s": time.perf_counter() - inicio,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("arquivo", help="dados_estufa.csv, registros.ndjson ou registros.json")
+    ap.add_argument("--broker", default="localhost")
+    ap.add_argument("--porta", type=int, default=1883)
+    ap.add_argument("--topico", default="estufa/sensores")
+    ap.add_argument("--qos", type=int, choices=(0, 1), default=0)
+    ap.add_argument("--velocidade", type=float, default=1.0,
+                    help="multiplicador do tempo gravado (1 = tempo real, 0 = sem espera)")
+    ap.add_argument("--max-intervalo", type=float,
+                    help="encurta intervalos gravados maiores que isso (segundos gravados)")
+    ap.add_argument("--repetir", type=int, default=1, help="voltas pelo arquivo (0 = sem fim)")
+    ap.add_argument("--seco", action="store_true", help="imprime os payloads em vez de publicar")
+    args = ap.parse_args()
+
+    if args.seco:
+        def publicar(payload):
+            sys.stdout.write(json.dumps(payload) + "\n")
+    else:
+        if mqtt is None:
+            raise SystemExit("paho-mqtt não instalado. Ative o venv e 'pip install paho-mqtt'")
+        cliente = mqtt.Client(client_id="estufa_replay")
+        cliente.connect(args.broker, args.porta, 60)
+        cliente.loop_start()
+
+        def publicar(payload):
+            cliente.publish(args.topico, json.dumps(payload), qos=args.qos)
+
+        print(f"[REPLAY] {args.arquivo} -> {args.broker}:{args.porta} {args.topico}, "
+              f"velocidade {f'{args.velocidade:g}x' if args.velocidade else 'máxima'}")
+    try:
+        resultado = replay(args.arquivo, publicar, args.velocidade, args.max_intervalo, args.repetir)
+    except KeyboardInterrupt:
+        resultado = None
+    finally:
+        if not args.seco:
+            cliente.loop_stop()
+            cliente.disconnect()
+    if resultado and not args.seco:
+        print(f"publicadas: {resultado['publicadas']} em {resultado['voltas']} volta(s), "
+              f"{resultado['ignoradas']} registros sem leituras ignorados; "
+              f"{resultado['gravado_s'] / 3600:.1f} h gravadas em {resultado['decorrido_s']:.1f} s "
+              f"({resultado['publicadas'] / max(resultado['decorrido_s'], 1e-9):.0f} msg/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Simulador de carga MQTT: N estufas x M sensores publicando em alta taxa.
+
+Cada sensor mede uma grandeza (temperatura, umidade, luz, solo, nível) com
+um passeio aleatório determinístico (--seed) e publica no ritmo escolhido:
+
+* constante: uma mensagem a cada 1/taxa segundos;
+* poisson: intervalos exponenciais com a mesma taxa média;
+* rajada: --rajada mensagens seguidas, com a mesma taxa média.
+
+--formato escolhe o payload: JSON aninhado (NodeMCU), JSON plano,
+MessagePack ou o quadro binário do payload.py.
+
+Todo payload leva "ts_envio" (epoch do envio). O bridge usa esse campo
+para medir a latência de ingestão, exposta em
+estufa_bridge_ingestao_latencia_segundos. Ao final, o simulador lê o
+/metrics do bridge e relata a taxa publicada, a taxa ingerida, as
+mensagens perdidas e os percentis de latência. Simulador e bridge devem
+usar o mesmo relógio: a mesma máquina ou NTP.
+
+    python3 simulador_carga.py --estufas 4 --sensores 5 --taxa 10 --duracao 30
+    python3 simulador_carga.py --estufas 1 --sensores 1 --taxa 2000 --padrao rajada --rajada 200
+    python3 simulador_carga.py --formato binario --estufas 4 --taxa 50
+"""
+
+import argparse
+import heapq
+import json
+import math
+import random
+import re
+import time
+import urllib.request
+from datetime import datetime
+
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:
+    mqtt = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from payload import Decodificador
+
+# grandeza: (chave no payload, valor inicial, passo, mínimo, máximo)
+GRANDEZAS = [
+    ("temperature", 25.0, 0.2, 5.0, 45.0),
+    ("humidity", 65.0, 0.5, 10.0, 100.0),
+    ("light", 400.0, 20.0, 0.0, 2000.0),
+    ("soil_moisture", 45.0, 0.3, 0.0, 100.0),
+    ("nivel_alto", 1.0, 0.0, 0.0, 1.0),
+]
+
+
+class Sensor:
+    def __init__(self, estufa, indice, seed):
+        self.estufa = estufa
+        self.indice = indice
+        self.id = f"estufa{estufa:02d}_s{indice:02d}"
+        self.rnd = random.Random(seed)
+        self.chave, self.valor, self.passo, self.minimo, self.maximo = GRANDEZAS[indice % len(GRANDEZAS)]
+
+    def ler(self):
+        if self.chave == "nivel_alto":
+            # Boia: muda de estado raramente
+            if self.rnd.random() < 0.01:
+                self.valor = 1.0 - self.valor
+            return bool(self.valor)
+        self.valor = min(self.maximo, max(self.minimo, self.valor + self.rnd.gauss(0, self.passo)))
+        return round(self.valor, 2)
+
+
+def payload_aninhado(sensor, valor, ts):
+    # Formato do estufa_opcua_simulate.py / NodeMCU
+    return json.dumps({
+        "sensor_id": sensor.id,
+        "estufa_id": f"estufa{sensor.estufa:02d}",
+        "sensor_data": {sensor.chave: valor},
+        "timestamp": datetime.fromtimestamp(ts).isoformat(),
+        "ts_envio": ts,
+    })
+
+
+def payload_plano(sensor, valor, ts):
+    return json.dumps({sensor.chave: valor, "sensor_id": sensor.id, "ts_envio": ts})
+
+
+def payload_msgpack(sensor, valor, ts):
+    return msgpack.packb({sensor.chave: valor, "sensor_id": sensor.id, "ts_envio": ts})
+
+
+_decodificador = None
+
+def payload_binario(sensor, valor, ts):
+    # Quadro fixo do payload.py (campos do config/mapping.csv)
+    global _decodificador
+    if _decodificador is None:
+        _decodificador = Decodificador()
+    return _decodificador.codificar_binario({sensor.chave: valor}, ts)
+
+
+FORMATOS = {
+    "aninhado": payload_aninhado,
+    "plano": payload_plano,
+    "msgpack": payload_msgpack,
+    "binario": payload_binario,
+}
+
+
+def intervalos(padrao, taxa, rnd, rajada):
+    """Gerador dos intervalos entre envios de um sensor."""
+    while True:
+        if padrao == "constante":
+            yield 1.0 / taxa
+        elif padrao == "poisson":
+            yield rnd.expovariate(taxa)
+        else:
+            for _ in range(rajada - 1):
+                yield 0.0
+            yield rajada / taxa
+
+
+def ler_metricas(url):
+    """{(nome, rótulos): valor} do texto do Prometheus; None se o bridge não responder."""
+    try:
+        with urllib.request.urlopen(url, timeout=5) as resp:
+            texto = resp.read().decode()
+    except OSError:
+        return None
+    valores = {}
+    for linha in texto.splitlines():
+        if not linha or linha.startswith("#"):
+            continue
+        achado = re.match(r"^([a-zA-Z_:][\w:]*)(\{[^}]*\})?\s+(\S+)$", linha)
+        if achado:
+            valores[(achado.group(1), achado.group(2) or "")] = float(achado.group(3))
+    return valores
+
+
+def quantil_histograma(baldes, q):
+    """Quantil por interpolação linear nos baldes cumulativos (como o histogram_quantile)."""
+    baldes = sorted(baldes)
+    total = baldes[-1][1] if baldes else 0
+    if not total:
+        return None
+    alvo = q * total
+    anterior_le, anterior_n = 0.0, 0
+    for le, n in baldes:
+        if n >= alvo:
+            if math.isinf(le):
+                return anterior_le
+            if n == anterior_n:
+                return le
+            return anterior_le + (le - anterior_le) * (alvo - anterior_n) / (n - anterior_n)
+        anterior_le, anterior_n = le, n
+    return anterior_le
+
+
+def diferenca_ingestao(antes, depois):
+    nome = "estufa_bridge_ingestao_latencia_segundos"
+    baldes = []
+    for (metrica, rotulos), valor in depois.items():
+        if metrica == f"{nome}_bucket":
+            le = re.search(r'le="([^"]+)"', rotulos).group(1)
+            baldes.append((math.inf if le == "+Inf" else float(le), valor - antes.get((metrica, rotulos), 0)))
+    soma = depois.get((f"{nome}_sum", ""), 0) - antes.get((f"{nome}_sum", ""), 0)
+    n = depois.get((f"{nome}_count", ""), 0) - antes.get((f"{nome}_count", ""), 0)
+    ok = 'estufa_bridge_mqtt_mensagens_total'
+    ingeridas = depois.get((ok, '{resultado="ok"}'), 0) - antes.get((ok, '{resultado="ok"}'), 0)
+    return {
+        "ingeridas": int(ingeridas),
+        "com_latencia": int(n),
+        "latencia_media_ms": soma / n * 1000 if n else None,
+        "p50_ms": _ms(quantil_histograma(baldes, 0.50)),
+        "p95_ms": _ms(quantil_histograma(baldes, 0.95)),
+        "p99_ms": _ms(quantil_histograma(baldes, 0.99)),
+    }
+
+
+def _ms(v):
+    return None if v is None else v * 1000
+
+
+def simular(publicar, sensores, args):
+    """Publica até acabar a duração; devolve o número de mensagens por segundo decorrido."""
+    formatar = FORMATOS[args.formato]
+    fila = []
+    geradores = []
+    inicio = time.perf_counter()
+    for i, s in enumerate(sensores):
+        g = intervalos(args.padrao, args.taxa, random.Random(args.seed * 7919 + i), args.rajada)
+        geradores.append(g)
+        # Defasagem inicial para os sensores não publicarem todos no mesmo instante
+        heapq.heappush(fila, (inicio + s.rnd.random() / args.taxa, i))
+    fim = inicio + args.duracao
+    por_segundo = [0] * (int(math.ceil(args.duracao)) or 1)
+    while fila:
+        quando, i = heapq.heappop(fila)
+        if quando >= fim:
+            break
+        espera = quando - time.perf_counter()
+        if espera > 0:
+            time.sleep(espera)
+        sensor = sensores[i]
+        publicar(args.topico.format(estufa=f"estufa{sensor.estufa:02d}"),
+                 formatar(sensor, sensor.ler(), time.time()))
+        por_segundo[min(len(por_segundo) - 1, int(time.perf_counter() - inicio))] += 1
+        heapq.heappush(fila, (quando + next(geradores[i]), i))
+    return por_segundo, time.perf_counter() - inicio
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--broker", default="localhost")
+    ap.add_argument("--porta", type=int, default=1883)
+    ap.add_argument("--topico", default="estufa/sensores",
+                    help="pode usar {estufa}, ex.: estufa/{estufa}/sensores")
+    ap.add_argument("--estufas", type=int, default=1)
+    ap.add_argument("--sensores", type=int, default=5, help="sensores por estufa")
+    ap.add_argument("--taxa", type=float, default=1.0, help="mensagens/s por sensor")
+    ap.add_argument("--padrao", choices=("constante", "poisson", "rajada"), default="constante")
+    ap.add_argument("--rajada", type=int, default=50, help="mensagens por rajada (padrão rajada)")
+    ap.add_argument("--formato", choices=sorted(FORMATOS), default="aninhado")
+    ap.add_argument("--qos", type=int, choices=(0, 1), default=0)
+    ap.add_argument("--duracao", type=float, default=30.0)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--metricas", default="http://localhost:9101/metrics",
+                    help="/metrics do bridge, para a latência de ingestão ('' para não ler)")
+    ap.add_argument("--espera-final", type=float, default=2.0,
+                    help="segundos para o bridge drenar a fila antes da leitura final")
+    ap.add_argument("--saida", help="grava o relatório em JSON")
+    args = ap.parse_args()
+
+    if mqtt is None:
+        raise SystemExit("paho-mqtt não instalado. Ative o venv e 'pip install paho-mqtt'")
+    if args.formato == "msgpack" and msgpack is None:
+        raise SystemExit("msgpack não instalado. Ative o venv e 'pip install msgpack'")
+
+    sensores = [Sensor(e, s, args.seed * 1000003 + e * 1000 + s)
+                for e in range(1, args.estufas + 1) for s in range(args.sensores)]
+    cliente = mqtt.Client(client_id=f"simulador_carga_{args.seed}")
+    cliente.connect(args.broker, args.porta, 60)
+    cliente.loop_start()
+
+    antes = ler_metricas(args.metricas) if args.metricas else None
+    alvo = len(sensores) * args.taxa
+    print(f"[CARGA] {args.estufas} estufa(s) x {args.sensores} sensor(es), {args.taxa}/s cada "
+          f"({alvo:.0f} msg/s), {args.padrao}, formato {args.formato}, {args.duracao:.0f} s")
+
+    def publicar(topico, corpo):
+        cliente.publish(topico, corpo, qos=args.qos)
+
+    try:
+        por_segundo, decorrido = simular(publicar, sensores, args)
+    finally:
+        time.sleep(args.espera_final)
+        cliente.loop_stop()
+        cliente.disconnect()
+
+    publicadas = sum(por_segundo)
+    relatorio = {
+        "config": vars(args),
+        "alvo_msg_s": alvo,
+        "publicadas": publicadas,
+        "publicadas_msg_s": publicadas / decorrido,
+        "por_segundo": por_segundo,
+    }
+    print(f"publicadas: {publicadas} ({publicadas / decorrido:.0f} msg/s, alvo {alvo:.0f})")
+
+    depois = ler_metricas(args.metricas) if antes is not None else None
+    if depois is not None:
+        bridge = diferenca_ingestao(antes, depois)
+        relatorio["bridge"] = bridge
+        perdidas = publicadas - bridge["ingeridas"]
+        print(f"ingeridas pelo bridge: {bridge['ingeridas']} ({bridge['ingeridas'] / decorrido:.0f} msg/s), "
+              f"perdidas/atrasadas: {perdidas} ({perdidas / max(publicadas, 1):.1%})")
+        if bridge["com_latencia"]:
+            print("latência de ingestão: média {:.1f} ms, p50 {:.1f} ms, p95 {:.1f} ms, p99 {:.1f} ms".format(
+                bridge["latencia_media_ms"], bridge["p50_ms"], bridge["p95_ms"], bridge["p99_ms"]))
+    elif args.metricas:
+        print(f"bridge sem métricas em {args.metricas}: só a taxa publicada foi medida")
+
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump(relatorio, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Simulador da planta (estufa) em malha fechada, para avaliar o controle.
+
+O modelo é físico simplificado, com passo de Euler explícito:
+
+* calor: troca com o ar externo (passiva e pelos ventilador/exaustor),
+  ganho solar, calor da luminária e resfriamento pela evapotranspiração;
+* umidade: balanço da umidade absoluta (g/m³) com a troca de ar e a
+  evapotranspiração; a umidade relativa vem da pressão de saturação;
+* solo: a evapotranspiração consome, a bomba irriga enquanto o
+  reservatório tiver água, e o excesso drena;
+* reservatório: a bomba esvazia e a válvula enche (boias nivel_baixo e
+  nivel_alto);
+* luz: sol (dia a dia com nebulosidade aleatória) mais a luminária.
+
+O passo é vetorizado com numpy sobre N estufas independentes: cada uma
+tem clima, sementes e, se quiser, setpoints próprios. Rodar 1000 estufas
+por 100 h são 100 mil horas simuladas em segundos.
+
+Modos:
+
+* offline (padrão): `controlar()` reproduz o controle_automatico() do
+  estufa_opcua.py a cada --ciclo segundos simulados;
+* --mqtt: uma estufa em tempo real (ou --aceleracao vezes mais rápido).
+  Os relés vêm do bridge em estufa/acionamentos, e as leituras saem em
+  estufa/sensores no formato do NodeMCU. Para acelerar, rode o bridge
+  com CICLO_SEGUNDOS=60/aceleração.
+
+O relatório traz o erro em relação aos setpoints (MAE, RMS e fração do
+tempo dentro da tolerância), as comutações por relé por dia e a energia
+gasta por relé.
+
+    python3 simulador_planta.py --estufas 1000 --horas 100
+    python3 simulador_planta.py --mqtt --aceleracao 60
+"""
+
+import argparse
+import json
+import math
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:
+    mqtt = None
+
+RELES = ("bomba", "valvula", "luminaria", "ventilador", "exaustor", "emergencia")
+# Mesmos valores padrão do estufa_opcua.py
+SETPOINTS = {
+    "temperatura": 30.0,
+    "umidade": 70.0,
+    "luminosidade": 300.0,
+    "umidade_solo": 45.0,
+}
+TOLERANCIA = 1.0
+
+# Potência de cada carga (W), para a energia gasta
+POTENCIA_W = {
+    "bomba": 60.0,
+    "valvula": 8.0,
+    "luminaria": 200.0,
+    "ventilador": 50.0,
+    "exaustor": 80.0,
+    "emergencia": 0.0,
+}
+
+# Parâmetros do modelo (por segundo; unidades no comentário)
+K_PASSIVO = 1 / 1800.0       # troca passiva com o exterior (1/s)
+K_VENTILACAO = 1 / 400.0     # troca extra por ventilador/exaustor ligado (1/s)
+LUZ_SOL_MAX = 900.0          # leitura do sensor de luz ao meio-dia sem nuvens
+LUZ_LUMINARIA = 250.0
+GANHO_SOLAR = 8.0 * K_PASSIVO / LUZ_SOL_MAX  # ~8 °C acima da externa ao sol pleno
+GANHO_LUMINARIA = 1.0 * K_PASSIVO            # ~1 °C acima com a luminária
+ET_MAX = 0.003               # evapotranspiração ao sol pleno (g/m³/s)
+RESFRIAMENTO_ET = 0.15       # °C por g/m³ evaporado
+SOLO_POR_ET = 0.2            # % de umidade do solo por g/m³ evaporado
+SOLO_IRRIGACAO = 0.04        # %/s com a bomba ligada
+SOLO_CAPACIDADE = 60.0       # acima disso o solo drena
+K_DRENAGEM = 1 / 900.0
+RESERVATORIO_BOMBA = 0.0005  # fração/s consumida pela bomba
+RESERVATORIO_VALVULA = 0.002 # fração/s enchida pela válvula
+NIVEL_BAIXO, NIVEL_ALTO = 0.2, 0.9
+
+RUIDO = {"temperatura": 0.1, "umidade": 0.5, "luminosidade": 5.0, "umidade_solo": 0.3}
+
+
+def umidade_saturacao(temperatura):
+    """Umidade absoluta de saturação (g/m³) pela fórmula de Magnus."""
+    pressao = 6.112 * np.exp(17.67 * temperatura / (temperatura + 243.5))
+    return 216.74 * pressao / (273.15 + temperatura)
+
+
+def _limitar(vetor, minimo, maximo):
+    # np.clip no lugar, sem o custo do wrapper (chamado a cada passo)
+    np.maximum(vetor, minimo, out=vetor)
+    np.minimum(vetor, maximo, out=vetor)
+
+
+class Planta:
+    """Estado de N estufas; `avancar()` avança todas de uma vez."""
+
+    def __init__(self, n, seed=0, hora_inicial=6.0, cenarios=None):
+        """
+        Com `cenarios`, só esse número de climas (e de sequências de ruído dos
+        sensores) é sorteado e a estufa i usa o cenário i % cenarios:
+        configurações diferentes (ex.: na sintonia) são comparadas sob as
+        mesmas condições, qualquer que seja a divisão entre processos.
+        """
+        self.n = n
+        self._m = m = cenarios or n
+        self._indice = np.arange(n) % m if m != n else None
+        self._clima_rnd = np.random.default_rng(seed)
+        self.rnd = np.random.default_rng([seed, 1])  # ruído dos sensores
+        self.t = hora_inicial * 3600.0
+        # Clima de cada cenário: média e amplitude diária da temperatura externa
+        self._temp_media = self._clima_rnd.uniform(16.0, 28.0, m)
+        self._temp_amplitude = self._clima_rnd.uniform(3.0, 8.0, m)
+        self._nuvens = {}
+        self.temperatura = self._expandir(self._temp_media).copy()
+        self.umidade_abs = 0.7 * umidade_saturacao(self.temperatura)
+        self.umidade_solo = self._expandir(self._clima_rnd.uniform(35.0, 55.0, m)).copy()
+        self.reservatorio = np.full(n, 0.6)
+
+    def _expandir(self, por_cenario):
+        return por_cenario if self._indice is None else por_cenario[self._indice]
+
+    def nebulosidade(self, dia):
+        # Fator de sol do dia (0.3 = nublado, 1 = limpo), sorteado quando o dia chega
+        if dia not in self._nuvens:
+            self._nuvens[dia] = self._clima_rnd.uniform(0.3, 1.0, self._m)
+            self._nuvens.pop(dia - 2, None)
+        return self._nuvens[dia]
+
+    def clima(self):
+        """Temperatura externa, umidade absoluta externa e luz do sol no instante atual."""
+        hora = (self.t / 3600.0) % 24
+        # Mínima às 3 h e máxima às 15 h; calculado por cenário e só então expandido
+        temp_ext = self._temp_media + self._temp_amplitude * math.sin(2 * math.pi * (hora - 9) / 24)
+        ur_ext = 80.0 - 20.0 * math.sin(2 * math.pi * (hora - 9) / 24)
+        sol = max(0.0, math.sin(math.pi * (hora - 6) / 12)) * LUZ_SOL_MAX * self.nebulosidade(int(self.t // 86400))
+        umid_ext = ur_ext / 100.0 * umidade_saturacao(temp_ext)
+        return self._expandir(temp_ext), self._expandir(umid_ext), self._expandir(sol)
+
+    def luz(self, reles, sol=None):
+        if sol is None:
+            sol = self.clima()[2]
+        return sol + LUZ_LUMINARIA * reles["luminaria"]
+
+    def umidade_relativa(self):
+        return np.minimum(100.0, 100.0 * self.umidade_abs / umidade_saturacao(self.temperatura))
+
+    def avancar(self, reles, dt, passos=1):
+        """Avança `passos` passos de `dt` segundos com os relés fixos; retorna a luz do sol final."""
+        ventilacao = K_VENTILACAO * (reles["ventilador"].astype(float) + reles["exaustor"])
+        calor_luminaria = GANHO_LUMINARIA * reles["luminaria"]
+        valvula = RESERVATORIO_VALVULA * reles["valvula"]
+        bomba = reles["bomba"]
+        for _ in range(passos):
+            temp_ext, umid_ext, sol = self.clima()
+            troca = K_PASSIVO + ventilacao
+            disponivel = np.minimum(self.umidade_solo * (1 / 40.0), 1.0)
+            et = (ET_MAX * (sol / LUZ_SOL_MAX + 0.05)) * disponivel
+
+            self.temperatura += dt * (troca * (temp_ext - self.temperatura) + GANHO_SOLAR * sol
+                                      + calor_luminaria - RESFRIAMENTO_ET * et)
+            self.umidade_abs += dt * (troca * (umid_ext - self.umidade_abs) + et)
+            # Acima da saturação condensa
+            np.minimum(self.umidade_abs, umidade_saturacao(self.temperatura), out=self.umidade_abs)
+
+            irrigando = bomba & (self.reservatorio > 0.0)
+            self.umidade_solo += dt * (SOLO_IRRIGACAO * irrigando - SOLO_POR_ET * et
+                                       - K_DRENAGEM * np.maximum(self.umidade_solo - SOLO_CAPACIDADE, 0.0))
+            _limitar(self.umidade_solo, 0.0, 100.0)
+            self.reservatorio += dt * (valvula - RESERVATORIO_BOMBA * irrigando)
+            _limitar(self.reservatorio, 0.0, 1.0)
+            self.t += dt
+        return self.clima()[2]
+
+    def valores(self, reles, sol=None):
+        """Variáveis reais (sem ruído de sensor)."""
+        return {
+            "temperatura": self.temperatura,
+            "umidade": self.umidade_relativa(),
+            "luminosidade": self.luz(reles, sol),
+            "umidade_solo": self.umidade_solo,
+        }
+
+    def sensores(self, reles, sol=None, ruido=True):
+        """Leituras como o bridge recebe (com ruído de sensor)."""
+        leituras = {k: v.copy() for k, v in self.valores(reles, sol).items()}
+        if ruido:
+            for k, sigma in RUIDO.items():
+                leituras[k] = leituras[k] + self._expandir(self.rnd.normal(0.0, sigma, self._m))
+        leituras["nivel_baixo"] = self.reservatorio < NIVEL_BAIXO
+        leituras["nivel_alto"] = self.reservatorio > NIVEL_ALTO
+        return leituras
+
+
+def reles_desligados(n):
+    return {r: np.zeros(n, dtype=bool) for r in RELES}
+
+
+def _histerese(valor, ligar_abaixo, desligar_acima, atual):
+    return np.where(valor < ligar_abaixo, True, np.where(valor > desligar_acima, False, atual))
+
+
+def controlar(leituras, reles, setpoints=None, tolerancia=TOLERANCIA):
+    """
+    Mesma lógica do controle_automatico() do estufa_opcua.py, para N estufas.
+    `setpoints` e `tolerancia` aceitam escalares ou vetores (um por estufa).
+    Retorna os novos estados dos relés.
+    """
+    sp = dict(SETPOINTS, **(setpoints or {}))
+    novo = dict(reles)
+    novo["bomba"] = _histerese(leituras["umidade_solo"], sp["umidade_solo"] - tolerancia,
+                               sp["umidade_solo"] + tolerancia, reles["bomba"])
+    novo["valvula"] = np.where(leituras["nivel_baixo"], True,
+                               np.where(leituras["nivel_alto"], False, reles["valvula"]))
+    novo["luminaria"] = _histerese(leituras["luminosidade"], sp["luminosidade"] - tolerancia,
+                                   sp["luminosidade"] + tolerancia, reles["luminaria"])
+    # Ventilação liga acima do setpoint (histerese invertida)
+    ventilar = _histerese(-leituras["temperatura"], -(sp["temperatura"] + tolerancia),
+                          -(sp["temperatura"] - tolerancia), reles["ventilador"])
+    novo["ventilador"] = ventilar
+    novo["exaustor"] = ventilar.copy()
+    return novo
+
+
+class Indicadores:
+    """Acumula erro de rastreamento, comutações e energia, por estufa."""
+
+    VARIAVEIS = ("temperatura", "umidade", "luminosidade", "umidade_solo")
+
+    def __init__(self, n, setpoints=None, tolerancia=TOLERANCIA, faixas=None):
+        """`faixas`: {variável: (mínimo, máximo)} da faixa ideal, além do erro ao setpoint."""
+        self.n = n
+        self.setpoints = dict(SETPOINTS, **(setpoints or {}))
+        self.tolerancia = tolerancia
+        self.faixas = faixas or {}
+        self.tempo = 0.0
+        self.erro_abs = {v: np.zeros(n) for v in self.VARIAVEIS}
+        self.erro_quad = {v: np.zeros(n) for v in self.VARIAVEIS}
+        self.dentro = {v: np.zeros(n) for v in self.VARIAVEIS}
+        self.ideal = {v: np.zeros(n) for v in self.faixas}
+        self.comutacoes = {r: np.zeros(n, dtype=np.int64) for r in RELES}
+        self.ligado_s = {r: np.zeros(n) for r in RELES}
+
+    def acumular(self, valores, reles, dt):
+        """`valores`: variáveis reais da planta (sem ruído) durante `dt` segundos."""
+        self.tempo += dt
+        for v in self.VARIAVEIS:
+            erro = valores[v] - self.setpoints[v]
+            self.erro_abs[v] += np.abs(erro) * dt
+            self.erro_quad[v] += erro * erro * dt
+            self.dentro[v] += (np.abs(erro) <= self.tolerancia) * dt
+        for v, (minimo, maximo) in self.faixas.items():
+            self.ideal[v] += ((valores[v] >= minimo) & (valores[v] <= maximo)) * dt
+        for r in RELES:
+            self.ligado_s[r] += reles[r] * dt
+
+    def comutar(self, antes, depois):
+        for r in RELES:
+            self.comutacoes[r] += antes[r] != depois[r]
+
+    def por_estufa(self):
+        """Vetores por estufa (para comparar configurações, ex.: sintonia)."""
+        t = max(self.tempo, 1e-9)
+        dias = t / 86400.0
+        vetores = {
+            "mae": {v: self.erro_abs[v] / t for v in self.VARIAVEIS},
+            "rms": {v: np.sqrt(self.erro_quad[v] / t) for v in self.VARIAVEIS},
+            "dentro": {v: self.dentro[v] / t for v in self.VARIAVEIS},
+            "comutacoes_dia": {r: self.comutacoes[r] / dias for r in RELES},
+            "ciclo_trabalho": {r: self.ligado_s[r] / t for r in RELES},
+            "energia_kwh_dia": {r: self.ligado_s[r] * POTENCIA_W[r] / 3.6e6 / dias for r in RELES},
+        }
+        if self.faixas:
+            vetores["ideal"] = {v: self.ideal[v] / t for v in self.faixas}
+        return vetores
+
+    def resumo(self):
+        """Médias entre as estufas, prontas para imprimir ou gravar em JSON."""
+        vetores = self.por_estufa()
+        resumo = {grupo: {k: float(np.mean(v)) for k, v in itens.items()} for grupo, itens in vetores.items()}
+        resumo["energia_kwh_dia"]["total"] = float(sum(np.mean(v) for v in vetores["energia_kwh_dia"].values()))
+        resumo["horas_simuladas"] = self.tempo / 3600.0 * self.n
+        return resumo
+
+
+def simular(n=100, horas=24.0, dt=10.0, ciclo=60.0, setpoints=None, tolerancia=TOLERANCIA,
+            seed=0, hora_inicial=6.0, cenarios=None, faixas=None):
+    """
+    Malha fechada offline: planta + controlar() a cada `ciclo` segundos.
+    Retorna o objeto Indicadores.
+    """
+    planta = Planta(n, seed, hora_inicial, cenarios)
+    reles = reles_desligados(n)
+    indicadores = Indicadores(n, setpoints, tolerancia, faixas)
+    passos_por_ciclo = max(1, int(round(ciclo / dt)))
+    sol = planta.clima()[2]
+    for _ in range(int(math.ceil(horas * 3600 / (passos_por_ciclo * dt)))):
+        novo = controlar(planta.sensores(reles, sol), reles, setpoints, tolerancia)
+        indicadores.comutar(reles, novo)
+        reles = novo
+        # Os relés ficam fixos no ciclo; o erro é amostrado uma vez por ciclo
+        indicadores.acumular(planta.valores(reles, sol), reles, passos_por_ciclo * dt)
+        sol = planta.avancar(reles, dt, passos_por_ciclo)
+    return indicadores
+
+
+def imprimir(resumo):
+    print(f"{'variável':<14} {'MAE':>8} {'RMS':>8} {'na faixa':>9}")
+    for v in Indicadores.VARIAVEIS:
+        print(f"{v:<14} {resumo['mae'][v]:>8.2f} {resumo['rms'][v]:>8.2f} {resumo['dentro'][v]:>8.1%}")
+    print(f"{'relé':<14} {'comut./dia':>10} {'kWh/dia':>9}")
+    for r in RELES:
+        print(f"{r:<14} {resumo['comutacoes_dia'][r]:>10.1f} {resumo['energia_kwh_dia'][r]:>9.3f}")
+    print(f"{'total':<14} {'':>10} {resumo['energia_kwh_dia']['total']:>9.3f}")
+
+
+def rodar_mqtt(args):
+    """Uma estufa em tempo real (x aceleração), com os relés vindos do bridge."""
+    if mqtt is None:
+        raise SystemExit("paho-mqtt não instalado. Ative o venv e 'pip install paho-mqtt'")
+    planta = Planta(1, args.seed, args.hora_inicial)
+    reles = reles_desligados(1)
+    indicadores = Indicadores(1)
+    inicio_simulado = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def on_connect(client, userdata, flags, rc):
+        client.subscribe(args.topico_acionamentos)
+
+    def on_message(client, userdata, msg):
+        try:
+            estado = json.loads(msg.payload.decode())
+        except ValueError:
+            return
+        novo = dict(reles)
+        for r in RELES:
+            if r in estado:
+                novo[r] = np.array([bool(estado[r])])
+        indicadores.comutar(reles, novo)
+        reles.update(novo)
+
+    cliente = mqtt.Client(client_id=f"simulador_planta_{args.seed}")
+    cliente.on_connect = on_connect
+    cliente.on_message = on_message
+    cliente.connect(args.broker, args.porta, 60)
+    cliente.loop_start()
+    print(f"[PLANTA] {args.broker}:{args.porta}: relés de {args.topico_acionamentos}, "
+          f"leituras em {args.topico_sensores} a cada {args.intervalo} s, {args.aceleracao}x")
+
+    relogio = time.perf_counter()
+    proxima_publicacao = relogio
+    fim = relogio + args.duracao if args.duracao else None
+    pendente = 0.0
+    try:
+        while fim is None or time.perf_counter() < fim:
+            agora = time.perf_counter()
+            pendente += (agora - relogio) * args.aceleracao
+            relogio = agora
+            while pendente >= args.dt:
+                atuais = dict(reles)
+                indicadores.acumular(planta.valores(atuais), atuais, args.dt)
+                planta.avancar(atuais, args.dt)
+                pendente -= args.dt
+            if agora >= proxima_publicacao:
+                leituras = planta.sensores(reles)
+                cliente.publish(args.topico_sensores, json.dumps({
+                    "sensor_id": "planta_simulada",
+                    "sensor_data": {
+                        "temperature": round(float(leituras["temperatura"][0]), 2),
+                        "humidity": round(float(leituras["umidade"][0]), 2),
+                        "light": round(float(leituras["luminosidade"][0]), 1),
+                        "soil_moisture": round(float(leituras["umidade_solo"][0]), 2),
+                        "nivel_baixo": bool(leituras["nivel_baixo"][0]),
+                        "nivel_alto": bool(leituras["nivel_alto"][0]),
+                    },
+                    "timestamp": (inicio_simulado + timedelta(seconds=planta.t)).isoformat(),
+                    "ts_envio": time.time(),
+                }))
+                proxima_publicacao = agora + args.intervalo
+            time.sleep(min(0.1, max(0.0, proxima_publicacao - time.perf_counter())))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cliente.loop_stop()
+        cliente.disconnect()
+    return indicadores
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--estufas", type=int, default=100, help="estufas simuladas em paralelo (offline)")
+    ap.add_argument("--horas", type=float, default=48.0, help="horas simuladas por estufa (offline)")
+    ap.add_argument("--dt", type=float, default=10.0, help="passo do modelo (segundos simulados)")
+    ap.add_argument("--ciclo", type=float, default=60.0, help="período do controle (offline), como o loop do bridge")
+    ap.add_argument("--hora-inicial", type=float, default=6.0)
+    ap.add_argument("--seed", type=int, default=0)
+    for var, valor in SETPOINTS.items():
+        ap.add_argument(f"--sp-{var.replace('_', '-')}", type=float, default=valor, dest=f"sp_{var}")
+    ap.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    ap.add_argument("--mqtt", action="store_true", help="malha fechada com o bridge via broker")
+    ap.add_argument("--broker", default="localhost")
+    ap.add_argument("--porta", type=int, default=1883)
+    ap.add_argument("--topico-sensores", default="estufa/sensores")
+    ap.add_argument("--topico-acionamentos", default="estufa/acionamentos")
+    ap.add_argument("--intervalo", type=float, default=5.0, help="segundos (reais) entre publicações")
+    ap.add_argument("--aceleracao", type=float, default=1.0, help="segundos simulados por segundo real")
+    ap.add_argument("--duracao", type=float, default=0.0, help="segundos reais no modo --mqtt (0 = até Ctrl+C)")
+    ap.add_argument("--saida", help="grava o resumo em JSON")
+    args = ap.parse_args()
+
+    if args.mqtt:
+        indicadores = rodar_mqtt(args)
+    else:
+        setpoints = {var: getattr(args, f"sp_{var}") for var in SETPOINTS}
+        inicio = time.perf_counter()
+        indicadores = simular(args.estufas, args.horas, args.dt, args.ciclo, setpoints,
+                              args.tolerancia, args.seed, args.hora_inicial)
+        decorrido = time.perf_counter() - inicio
+        print(f"[PLANTA] {args.estufas} estufa(s) x {args.horas:g} h = "
+              f"{args.estufas * args.horas:,.0f} h simuladas em {decorrido:.1f} s")
+    resumo = indicadores.resumo()
+    imprimir(resumo)
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump(resumo, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sintonia offline dos setpoints e da TOLERANCIA do controle_automatico().
+
+Avalia uma grade de configurações (setpoints de temperatura, luminosidade
+e umidade do solo e a tolerância) de uma vez. Cada configuração é uma
+posição dos vetores do simulador_planta.py, e a grade é dividida entre
+processos. Fontes:
+
+* simulada (padrão): malha fechada com o modelo da planta. Todas as
+  configurações passam pelos mesmos --cenarios de clima, então a
+  comparação é justa;
+* --historico dados_estufa.csv|registros.ndjson: as regras rodam sobre as
+  leituras gravadas (malha aberta). As leituras não respondem aos relés,
+  então o tempo na faixa é o mesmo para todas; o que muda são as
+  comutações e o ciclo de trabalho.
+
+O ranking ordena pela fração do tempo dentro da faixa ideal do
+get_estufa_parameters() (média das variáveis, arredondada em
+--resolucao). Os empates são desfeitos pelo menor número de comutações por
+dia e, em seguida, pelo menor ciclo de trabalho somado dos relés. A
+configuração atual do bridge entra sempre na grade, e sua posição aparece
+no fim.
+
+    python3 sintonia.py --horas 48 --cenarios 4
+    python3 sintonia.py --temperatura 22:28:0.5 --tolerancia 0.5,1,2 --top 20
+    python3 sintonia.py --historico dados_estufa.csv
+"""
+
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+import simulador_planta as planta
+from replay import ler_registros
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from parametros import get_estufa_parameters  # noqa: E402
+
+# Parâmetros da grade: setpoints do controle e a tolerância (única, como no bridge)
+GRADE_PADRAO = {
+    "temperatura": "20:30:1",
+    "luminosidade": "200:400:50",
+    "umidade_solo": "20:45:5",
+    "tolerancia": "0.5,1,2,5",
+}
+# Intervalos gravados maiores que isso são falhas de coleta (como no graus_dia)
+MAX_INTERVALO_S = 2 * 3600
+
+
+def valores_grade(texto):
+    """'a:b:passo' (inclusivo) ou lista 'x,y,z'."""
+    if ":" in texto:
+        inicio, fim, passo = (float(p) for p in texto.split(":"))
+        n = int(math.floor((fim - inicio) / passo + 1e-9)) + 1
+        return [round(inicio + i * passo, 6) for i in range(n)]
+    return [float(p) for p in texto.split(",")]
+
+
+def montar_grade(especificacao):
+    """{parâmetro: vetor}, uma posição por configuração; a atual do bridge vai no fim se faltar."""
+    nomes = list(especificacao)
+    combinacoes = list(itertools.product(*(valores_grade(especificacao[n]) for n in nomes)))
+    atual = tuple(planta.TOLERANCIA if n == "tolerancia" else planta.SETPOINTS[n] for n in nomes)
+    if atual not in combinacoes:
+        combinacoes.append(atual)
+    vetores = np.array(combinacoes, dtype=float)
+    return {n: vetores[:, i] for i, n in enumerate(nomes)}, combinacoes.index(atual)
+
+
+def faixas_ideais():
+    params = get_estufa_parameters()
+    return {v: (params[v]["ideal_min"], params[v]["ideal_max"]) for v in planta.Indicadores.VARIAVEIS}
+
+
+def _fatiar(grade, inicio, fim):
+    return {k: v[inicio:fim] for k, v in grade.items()}
+
+
+def _separar(fatia):
+    setpoints = {k: v for k, v in fatia.items() if k != "tolerancia"}
+    return setpoints, fatia["tolerancia"]
+
+
+def avaliar_simulado(tarefa):
+    """Roda no processo filho: uma fatia da grade x todos os cenários."""
+    fatia, opcoes = tarefa
+    cenarios = opcoes["cenarios"]
+    k = len(fatia["tolerancia"])
+    # Estufa j = configuração j // cenarios sob o clima j % cenarios
+    repetida = {nome: np.repeat(v, cenarios) for nome, v in fatia.items()}
+    setpoints, tolerancia = _separar(repetida)
+    indicadores = planta.simular(k * cenarios, opcoes["horas"], opcoes["dt"], opcoes["ciclo"],
+                                 setpoints, tolerancia, opcoes["seed"], opcoes["hora_inicial"],
+                                 cenarios, opcoes["faixas"])
+    return _media_por_configuracao(indicadores.por_estufa(), k, cenarios)
+
+
+def avaliar_historico(tarefa):
+    """Roda no processo filho: as regras sobre o histórico gravado, para uma fatia da grade."""
+    fatia, opcoes = tarefa
+    setpoints, tolerancia = _separar(fatia)
+    k = len(tolerancia)
+    indicadores = planta.Indicadores(k, setpoints, tolerancia, opcoes["faixas"])
+    reles = planta.reles_desligados(k)
+    # Último valor conhecido de cada variável, como o dict `dados` do bridge
+    dados = {v: np.nan for v in planta.Indicadores.VARIAVEIS}
+    dados.update(nivel_baixo=False, nivel_alto=False)
+    anterior = None
+    for registro in ler_registros(opcoes["historico"]):
+        for v in planta.Indicadores.VARIAVEIS:
+            try:
+                dados[v] = float(registro[v])
+            except (KeyError, TypeError, ValueError):
+                pass
+        for v in ("nivel_baixo", "nivel_alto"):
+            if registro.get(v) not in (None, ""):
+                dados[v] = str(registro[v]).strip() in ("1", "True", "true")
+        try:
+            ts = datetime.fromisoformat(str(registro.get("timestamp", "")).strip()).timestamp()
+        except ValueError:
+            continue
+        if anterior is not None and 0 < ts - anterior <= MAX_INTERVALO_S:
+            # O estado decidido no registro anterior vale até este
+            indicadores.acumular(valores, reles, ts - anterior)
+        anterior = ts
+        # NaN nunca é < nem >: sem leitura, a histerese mantém o relé (como o `is not None` do bridge)
+        leituras = {v: np.full(k, x) for v, x in dados.items()}
+        novo = planta.controlar(leituras, reles, setpoints, tolerancia)
+        indicadores.comutar(reles, novo)
+        reles = novo
+        valores = {v: dados[v] for v in planta.Indicadores.VARIAVEIS}
+    return _media_por_configuracao(indicadores.por_estufa(), k, 1)
+
+
+def _media_por_configuracao(vetores, k, cenarios):
+    return {grupo: {nome: v.reshape(k, cenarios).mean(axis=1) for nome, v in itens.items()}
+            for grupo, itens in vetores.items()}
+
+
+def juntar(partes):
+    return {grupo: {nome: np.concatenate([p[grupo][nome] for p in partes]) for nome in partes[0][grupo]}
+            for grupo in partes[0]}
+
+
+def ranquear(resultado, resolucao):
+    """Índices das configurações, da melhor para a pior."""
+    ideal = np.mean(list(resultado["ideal"].values()), axis=0)
+    comutacoes = np.sum([v for r, v in resultado["comutacoes_dia"].items() if r != "emergencia"], axis=0)
+    ciclo = np.sum([v for r, v in resultado["ciclo_trabalho"].items() if r != "emergencia"], axis=0)
+    # np.lexsort ordena pela última chave primeiro
+    ordem = np.lexsort((ciclo, comutacoes, -np.round(ideal / resolucao)))
+    return ordem, ideal, comutacoes, ciclo
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for nome, padrao in GRADE_PADRAO.items():
+        ap.add_argument(f"--{nome.replace('_', '-')}", default=padrao, dest=nome,
+                        help=f"valores 'início:fim:passo' ou 'a,b,c' (padrão {padrao})")
+    ap.add_argument("--historico", help="avalia sobre um histórico gravado em vez do simulador")
+    ap.add_argument("--horas", type=float, default=48.0, help="horas simuladas por cenário")
+    ap.add_argument("--cenarios", type=int, default=4, help="climas diferentes por configuração")
+    # Passo maior que o do simulador: o controle só age a cada --ciclo e o ranking não muda
+    ap.add_argument("--dt", type=float, default=30.0)
+    ap.add_argument("--ciclo", type=float, default=60.0)
+    ap.add_argument("--hora-inicial", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--processos", type=int, default=os.cpu_count())
+    ap.add_argument("--resolucao", type=float, default=0.005,
+                    help="diferença de tempo na faixa tratada como empate (0.005 = 0,5 ponto)")
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--saida", help="grava todas as configurações ranqueadas em JSON")
+    args = ap.parse_args()
+
+    grade, indice_atual = montar_grade({n: getattr(args, n) for n in GRADE_PADRAO})
+    total = len(grade["tolerancia"])
+    opcoes = {
+        "horas": args.horas, "cenarios": args.cenarios, "dt": args.dt, "ciclo": args.ciclo,
+        "hora_inicial": args.hora_inicial, "seed": args.seed, "faixas": faixas_ideais(),
+        "historico": args.historico,
+    }
+    # Algumas fatias por processo equilibram a carga sem perder a vetorização
+    fatias = max(1, min(total, args.processos * 4)) if args.processos > 1 else 1
+    limites = np.linspace(0, total, fatias + 1).astype(int)
+    tarefas = [(_fatiar(grade, a, b), opcoes) for a, b in zip(limites[:-1], limites[1:]) if b > a]
+    avaliar = avaliar_historico if args.historico else avaliar_simulado
+
+    inicio = time.perf_counter()
+    if args.processos > 1:
+        with multiprocessing.Pool(args.processos) as pool:
+            partes = pool.map(avaliar, tarefas)
+    else:
+        partes = [avaliar(t) for t in tarefas]
+    decorrido = time.perf_counter() - inicio
+    resultado = juntar(partes)
+
+    fonte = args.historico or f"simulador ({args.cenarios} cenário(s) x {args.horas:g} h)"
+    print(f"[SINTONIA] {total} configurações, fonte: {fonte}, {decorrido:.1f} s em {args.processos} processo(s)")
+    if not args.historico:
+        print(f"           {total * args.cenarios * args.horas:,.0f} h simuladas")
+
+    ordem, ideal, comutacoes, ciclo = ranquear(resultado, args.resolucao)
+    nomes = list(GRADE_PADRAO)
+    faixa = list(resultado["ideal"])
+    cabecalho = " ".join(f"{n[:12]:>12}" for n in nomes) + " " + " ".join(f"{v[:9]:>9}" for v in faixa)
+    print(f"{'#':>4} {cabecalho} {'ideal':>7} {'comut/d':>8} {'ciclo':>6}")
+
+    def linha(posicao, i):
+        parametros = " ".join(f"{grade[n][i]:>12g}" for n in nomes)
+        faixas = " ".join(f"{resultado['ideal'][v][i]:>9.1%}" for v in faixa)
+        return f"{posicao:>4} {parametros} {faixas} {ideal[i]:>7.1%} {comutacoes[i]:>8.1f} {ciclo[i]:>6.2f}"
+
+    for posicao, i in enumerate(ordem[:args.top], 1):
+        print(linha(posicao, i))
+    posicao_atual = int(np.nonzero(ordem == indice_atual)[0][0]) + 1
+    print("configuração atual do bridge:")
+    print(linha(posicao_atual, indice_atual))
+
+    if args.saida:
+        ranking = []
+        for i in ordem:
+            item = {n: float(grade[n][i]) for n in nomes}
+            item.update(ideal=float(ideal[i]), comutacoes_dia=float(comutacoes[i]), ciclo_trabalho=float(ciclo[i]))
+            for grupo in ("ideal", "comutacoes_dia", "ciclo_trabalho", "energia_kwh_dia"):
+                item[f"{grupo}_por_item"] = {nome: float(v[i]) for nome, v in resultado[grupo].items()}
+            ranking.append(item)
+        with open(args.saida, "w") as f:
+            json.dump({"fonte": fonte, "ranking": ranking}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Confere que os módulos copiados entre backend/ e infraestrutura/ estão
+iguais. Os dois lados são implantados separadamente (contêiner e
+Raspberry Pi), então cada um leva a sua cópia; alterou uma, copie para a
+outra e rode:
+
+    python verificar_copias.py
+
+Sai com código 1 e mostra o diff se alguma cópia divergiu.
+"""
+
+import difflib
+import sys
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent
+COPIAS = ("metricas.py", "diagnostico.py")
+
+
+def divergencias():
+    """Diff (linhas) de cada módulo em COPIAS cujas duas cópias diferem."""
+    diffs = []
+    for nome in COPIAS:
+        backend = RAIZ / "backend" / nome
+        infra = RAIZ / "infraestrutura" / nome
+        a = backend.read_text(encoding="utf-8")
+        b = infra.read_text(encoding="utf-8")
+        if a != b:
+            diffs.extend(difflib.unified_diff(
+                a.splitlines(keepends=True), b.splitlines(keepends=True),
+                str(backend.relative_to(RAIZ)), str(infra.relative_to(RAIZ))))
+    return diffs
+
+
+if __name__ == "__main__":
+    diffs = divergencias()
+    if diffs:
+        sys.stdout.writelines(diffs)
+        sys.exit(1)
+    print(f"OK: {', '.join(COPIAS)} iguais em backend/ e infraestrutura/")